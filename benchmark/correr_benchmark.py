@@ -0,0 +1,218 @@
+"""
+Benchmark offline del pipeline, sin BigQuery ni la API real de Shopee.
+
+Para cada escala genera un catálogo sintético de tiendas (nombres con acentos, &, puntuación, sufijos y errores
+de tipeo), corre el crawler contra un servidor local que imita get_shops_by_category y mide cada etapa:
+crawler, normalización, UNIC_ID, preparación de Meli, match exacto, filtro léxico, BERT, verticales y la
+serialización de la subida. Al final escribe un reporte JSON en BENCH_DIR_REPORTES.
+
+    python benchmark/correr_benchmark.py
+    BENCH_ESCALAS=1000,100000,1000000 python benchmark/correr_benchmark.py
+
+Las etapas con modelo (BERT y verticales) necesitan sentence-transformers; si no está instalado quedan como
+"omitida" en el reporte y el resto se mide igual.
+"""
+import importlib.util
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RAIZ = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(RAIZ))
+sys.path.insert(0, str(RAIZ / "scraper"))
+
+from benchmark.datos_sinteticos import CATEGORIAS_SINTETICAS, generar_meli, generar_tiendas, respuestas_api
+from benchmark.servidor_shopee import ServidorShopee
+from common.cache_embeddings import CacheEmbeddings
+from common.esquema import RENOMBRE_MATCH, activar_copy_on_write, compactar, para_esquema
+from common.indice_ann import IndiceIVF
+from common.instrumentacion import Instrumentador
+from common.match_exato import NAO_ENCONTRADO, aplicar_matches, match_exato
+from common.match_semantico import candidatos_bert, candidatos_meli, match_lexico, matches_bert
+from common.modelos import MODELO_MATCH, MODELO_VERTICAL, Codificador
+from common.normalizacion import limpiar_cache, normalizar_nomes, normalizar_tabla_shopee
+from common.registro_unic_ids import RegistroUnicIds
+from common.tiendas_meli import deduplicar_tiendas
+from common.unic_id import atribuir_unic_ids
+from common.vertical import MAPEAMENTO_MANUAL, classificar_verticais
+from crawler_python_version import iterar_categorias
+from escritor_brands import EscritorBrands, cargar_brands
+
+# Cantidad de tiendas de Shopee de cada corrida (separadas por coma)
+ESCALAS = [int(n) for n in os.environ.get("BENCH_ESCALAS", "1000,10000").split(",") if n.strip()]
+SEMILLA = int(os.environ.get("BENCH_SEMILLA", "0"))
+DIR_REPORTES = os.environ.get("BENCH_DIR_REPORTES", "reportes_benchmark")
+
+
+def hay_modelos():
+    return importlib.util.find_spec("sentence_transformers") is not None
+
+
+def calidad(df_resultado, verdad_shopee, verdad_meli):
+    """Precisión y recall del matching por tienda, contra la tienda real de cada TO sintética."""
+    por_tienda = (
+        df_resultado.assign(BASE=df_resultado['SHOPID'].map(verdad_shopee))
+        .dropna(subset=['OFS_OFFICIAL_STORE_ID'])
+        .drop_duplicates('SHOPID')
+    )
+    correctas = (por_tienda['OFS_OFFICIAL_STORE_ID'].map(verdad_meli) == por_tienda['BASE']).sum()
+    en_meli = df_resultado['SHOPID'].map(verdad_shopee).isin(set(verdad_meli)).groupby(df_resultado['SHOPID']).any()
+    return {
+        'tiendas_con_match': int(len(por_tienda)),
+        'precision': round(correctas / len(por_tienda), 4) if len(por_tienda) else None,
+        'recall': round(correctas / en_meli.sum(), 4) if en_meli.sum() else None,
+    }
+
+
+def correr_escala(n_tiendas, dir_trabajo, semilla=SEMILLA):
+    print(f"\n📏 Escala: {n_tiendas} tiendas")
+    # Las mismas métricas que las corridas reales (tiempo, CPU, pico de memoria, filas), pero solo para el reporte
+    medidor = Instrumentador(f'benchmark_{n_tiendas}', archivo=None, tabla=None)
+    dir_trabajo = Path(dir_trabajo)
+
+    tiendas = generar_tiendas(n_tiendas, semilla)
+    respuestas = respuestas_api(tiendas)
+    df_meli = generar_meli(tiendas, semilla=semilla)
+    verdad_shopee = pd.Series(tiendas['NOME_BASE'].values, index=tiendas['SHOPID'].values)
+    verdad_meli = df_meli.drop_duplicates('OFS_OFFICIAL_STORE_ID').set_index('OFS_OFFICIAL_STORE_ID')['NOME_BASE']
+    df_meli = df_meli.drop(columns='NOME_BASE')
+    categorias = {cid: CATEGORIAS_SINTETICAS[cid] for cid in respuestas}
+
+    # Crawler contra el servidor local: mismo pool de hilos, sesión y escritura en Parquet que la corrida real
+    with medidor.etapa('crawler') as etapa, ServidorShopee(respuestas) as servidor:
+        with EscritorBrands(str(dir_trabajo / "brands_shopee.parquet")) as escritor:
+            for _, filas in iterar_categorias(categorias, url=servidor.url, max_req_por_segundo=0):
+                escritor.escribir(filas)
+        etapa['filas_salida'] = escritor.total_filas
+
+    df_shopee = cargar_brands(escritor.ruta, renombrar=True)
+
+    # Normalización desde cero (sin el memo de nombres de una escala anterior)
+    limpiar_cache()
+    with medidor.etapa('normalizacion', filas_entrada=len(df_shopee)) as etapa:
+        df_shopee = normalizar_tabla_shopee(df_shopee)
+        etapa['filas_salida'] = len(df_shopee)
+
+    with medidor.etapa('unic_id', filas_entrada=len(df_shopee)) as etapa:
+        registro = RegistroUnicIds(str(dir_trabajo / "registro_unic_ids.sqlite3"))
+        df_shopee['UNIC_ID'], novas = atribuir_unic_ids(df_shopee, registro)
+        registro.cerrar()
+        etapa.update(filas_salida=len(df_shopee), ids_nuevos=len(novas))
+
+    # Lo mismo que los pasos 3 y 4 del matching
+    with medidor.etapa('preparacion_meli', filas_entrada=len(df_meli)) as etapa:
+        df_meli = compactar(df_meli)
+        for col in ('OFS_NAME', 'OFS_FANTASY_NAME'):
+            df_meli[col] = normalizar_nomes(df_meli[col].str.replace(r'[._-]', ' ', regex=True), variante='meli')
+        df_meli = deduplicar_tiendas(df_meli)
+        etapa['filas_salida'] = len(df_meli)
+
+    with medidor.etapa('match_exato', filas_entrada=len(df_shopee)) as etapa:
+        df_resultado = match_exato(compactar(df_shopee), df_meli)
+        etapa['filas_salida'] = len(df_resultado)
+        etapa['filas_con_match'] = int((df_resultado['VALOR_ENCONTRADO'] != NAO_ENCONTRADO).sum())
+
+    pendientes = df_resultado.loc[df_resultado['VALOR_ENCONTRADO'] == NAO_ENCONTRADO, 'USERNAME_SHOPEE']
+    nomes = pendientes.dropna().drop_duplicates().tolist()
+    with medidor.etapa('match_fuzzy', nombres=len(nomes)) as etapa:
+        df_textos_meli, claves_candidatos = candidatos_meli(df_meli)
+        df_matches_fuzzy, nomes, bloques = match_lexico(nomes, df_meli, df_textos_meli)
+        etapa['matches'] = len(df_matches_fuzzy)
+
+    df_matches = [df_matches_fuzzy]
+    if hay_modelos():
+        with medidor.etapa('match_bert', nombres=len(nomes)) as etapa:
+            encode_match = Codificador(MODELO_MATCH).preparar(nomes + df_textos_meli['MATCH_MELI'].tolist())
+            cache_embeddings = CacheEmbeddings(encode_match.clave, dir_cache=str(dir_trabajo / "cache_embeddings"))
+            indice_meli = IndiceIVF(f"meli_MLB/{encode_match.clave}", dir_indice=str(dir_trabajo / "indice_ann"))
+            df_candidatos = candidatos_bert(
+                nomes, bloques, df_textos_meli, claves_candidatos, encode_match, cache_embeddings, indice_meli
+            )
+            cache_embeddings.cerrar()
+            df_matches.append(matches_bert(df_candidatos, df_meli))
+            etapa['matches'] = len(df_matches[-1])
+    else:
+        medidor.omitir('match_bert', "sentence-transformers no está instalado")
+
+    with medidor.etapa('aplicar_matches'):
+        df_resultado = aplicar_matches(df_resultado, pd.concat(df_matches, ignore_index=True))
+
+    categorias_resultado = df_resultado['CATEGORY_NAME']
+    if hay_modelos() or categorias_resultado.dropna().isin(list(MAPEAMENTO_MANUAL)).all():
+        with medidor.etapa('vertical', filas_entrada=len(df_resultado)):
+            df_resultado['VERTICAL_MELI'] = classificar_verticais(
+                categorias_resultado, Codificador(MODELO_VERTICAL), ruta=str(dir_trabajo / "verticais.json")
+            )
+    else:
+        medidor.omitir('vertical', "sentence-transformers no está instalado")
+
+    # Lo que hace la subida antes de mandar los datos: esquema final y Parquet en memoria
+    resultado_calidad = calidad(df_resultado, verdad_shopee, verdad_meli)
+    with medidor.etapa('serializacion_subida', filas_entrada=len(df_resultado)) as etapa:
+        df_subida = para_esquema(df_resultado.rename(columns=RENOMBRE_MATCH))
+        buffer = io.BytesIO()
+        df_subida.to_parquet(buffer, index=False)
+        etapa.update(filas_salida=len(df_subida), bytes=buffer.tell())
+
+    return {
+        'n_tiendas': n_tiendas,
+        'filas_shopee': len(df_shopee),
+        'filas_meli': len(df_meli),
+        'etapas': medidor.etapas,
+        'segundos_total': round(sum(e.get('segundos', 0) for e in medidor.etapas.values()), 4),
+        'calidad': resultado_calidad,
+    }
+
+
+def commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def guardar_reporte(reporte, dir_reportes=DIR_REPORTES):
+    os.makedirs(dir_reportes, exist_ok=True)
+    ruta = os.path.join(dir_reportes, f"benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(ruta + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, ensure_ascii=False, indent=2)
+    os.replace(ruta + ".tmp", ruta)
+    return ruta
+
+
+if __name__ == "__main__":
+    activar_copy_on_write()
+
+    reporte = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit_actual(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'cpus': os.cpu_count(),
+        'semilla': SEMILLA,
+        'escalas': [],
+    }
+    for n_tiendas in ESCALAS:
+        with tempfile.TemporaryDirectory(prefix="bench_shopee_") as dir_trabajo:
+            reporte['escalas'].append(correr_escala(n_tiendas, dir_trabajo))
+
+    ruta = guardar_reporte(reporte)
+
+    print("\n📊 Resumen (segundos por etapa):")
+    resumen = pd.DataFrame({
+        escala['n_tiendas']: {nombre: e.get('segundos') for nombre, e in escala['etapas'].items()}
+        for escala in reporte['escalas']
+    })
+    print(resumen)
+    print(f"\nReporte guardado en {ruta}")
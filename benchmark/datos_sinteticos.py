@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+
+# Categorías de la API (mismos IDs que el crawler) con nombres como los de Shopee Brasil: algunas están en el
+# mapeo manual de verticales y otras no, así la clasificación también tiene trabajo para BERT
+CATEGORIAS_SINTETICAS = {
+    11059998: "Roupas Femininas",
+    11059983: "Casa e Construção",
+    11059974: "Beleza e Cuidado Pessoal",
+    11059988: "Celulares e Dispositivos",
+    11059992: "Esportes e Lazer",
+    11059982: "Brinquedos e Hobbies",
+    11059972: "Automóveis",
+    11059981: "Saúde",
+    11059991: "Pets",
+    11059979: "Alimentos e Bebidas",
+}
+
+CATEGORIAS_L1_MELI = [
+    (1430, "Calçados, Roupas e Bolsas"), (1574, "Casa, Móveis e Decoração"), (1246, "Beleza e Cuidado Pessoal"),
+    (1051, "Celulares e Telefones"), (1276, "Esportes e Fitness"), (1132, "Brinquedos e Hobbies"),
+    (1743, "Carros, Motos e Outros"), (264586, "Saúde"), (1071, "Animais"), (1403, "Alimentos e Bebidas"),
+]
+
+SILABAS = [
+    "ma", "ri", "to", "la", "be", "ca", "so", "ne", "vi", "ra", "lu", "pe", "no", "ta", "gi", "mo", "za", "fi",
+    "do", "ke", "ba", "ro", "li", "se", "tu", "va", "co", "me", "xa", "nu",
+]
+ACENTOS = str.maketrans({"a": "á", "e": "é", "o": "ô", "c": "ç", "i": "í", "u": "ú"})
+SUFIXOS = ["OFICIAL", "OFFICIAL", "STORE", "SHOP", "BR", "BRASIL", "KIT"]
+PONTUACAO = [".", "-", "_", "'", "!"]
+
+
+def _nome_base(rng):
+    palabras = rng.integers(1, 4)
+    return " ".join(
+        "".join(rng.choice(SILABAS, size=rng.integers(2, 4))) for _ in range(palabras)
+    )
+
+
+def _con_ruido(nome, rng, prob=0.3):
+    """Variante del nombre como la escribiría una persona: acentos, &, puntuación, sufijos y mayúsculas al azar."""
+    if rng.random() < prob:
+        nome = nome.translate(ACENTOS)
+    if rng.random() < prob and " " in nome:
+        nome = nome.replace(" ", " & ", 1)
+    if rng.random() < prob:
+        nome = nome.replace(" ", rng.choice(PONTUACAO), 1) if " " in nome else nome + rng.choice(PONTUACAO)
+    if rng.random() < prob:
+        nome = f"{nome} {rng.choice(SUFIXOS)}"
+    if rng.random() < prob / 3 and len(nome) > 4:
+        i = rng.integers(1, len(nome) - 1)  # un error de tipeo
+        nome = nome[:i] + nome[i + 1:]
+    return nome.upper() if rng.random() < 0.5 else nome.title()
+
+
+def generar_tiendas(n_tiendas, semilla=0):
+    """
+    Catálogo de `n_tiendas` tiendas oficiales distintas, con un nombre base único cada una y sus variantes con
+    ruido para Shopee (username y brand_name). Cada tienda aparece en 1 a 3 categorías.
+    """
+    rng = np.random.default_rng(semilla)
+    bases = set()
+    while len(bases) < n_tiendas:
+        bases.add(_nome_base(rng))
+    bases = sorted(bases)
+    rng.shuffle(bases)
+
+    tiendas = pd.DataFrame({
+        'NOME_BASE': bases,
+        'SHOPID': rng.choice(10 ** 9, size=n_tiendas, replace=False) + 10 ** 8,
+    })
+    tiendas['USERNAME'] = [b.lower().replace(" ", rng.choice([".", "_", ""])) + rng.choice(["", "oficial", "br"])
+                           for b in bases]
+    tiendas['BRAND_NAME'] = [_con_ruido(b, rng) for b in bases]
+    tiendas['CATEGORIAS'] = [
+        rng.choice(list(CATEGORIAS_SINTETICAS), size=rng.integers(1, 4), replace=False).tolist()
+        for _ in range(n_tiendas)
+    ]
+    return tiendas
+
+
+def respuestas_api(tiendas):
+    """Respuesta de get_shops_by_category para cada categoría: marcas agrupadas por inicial, como la API real."""
+    filas = tiendas.explode('CATEGORIAS')
+    respuestas = {}
+    for category_id, grupo in filas.groupby('CATEGORIAS'):
+        iniciales = grupo['BRAND_NAME'].str[0].str.upper()
+        brands = []
+        for inicial, por_letra in grupo.groupby(iniciales, sort=True):
+            brands.append({
+                'index': inicial,
+                'total': len(por_letra),
+                'brand_ids': [
+                    {
+                        'username': t.USERNAME,
+                        'brand_name': t.BRAND_NAME,
+                        'shopid': int(t.SHOPID),
+                        'logo': f"https://cf.shopee.com.br/file/{t.SHOPID:032x}",
+                        'logo_pc': f"https://cf.shopee.com.br/file/{t.SHOPID:032x}_pc",
+                        'shop_collection_id': int(t.SHOPID % 100000),
+                        'ctime': 1600000000 + int(t.SHOPID % 10 ** 8),
+                        'brand_label': 1,
+                        'shop_type': 1,
+                        'redirect_url': f"https://shopee.com.br/{t.USERNAME}",
+                        'entity_id': int(t.SHOPID),
+                    }
+                    for t in por_letra.itertuples()
+                ],
+            })
+        respuestas[int(category_id)] = {'error': 0, 'data': {'brands': brands}}
+    return respuestas
+
+
+def generar_meli(tiendas, fraccion_en_meli=0.6, fraccion_solo_meli=0.3, fraccion_duplicadas=0.05, semilla=0):
+    """
+    Tiendas oficiales de Meli (mismas columnas que la consulta de LK_OFS_OFFICIAL_STORES): una parte de las
+    tiendas de Shopee con otras variantes del nombre (las que tiene que encontrar el matching), TOs que solo
+    existen en Meli y algunos registros repetidos con distinta fecha (para la deduplicación). NOME_BASE dice a
+    qué tienda corresponde cada TO.
+    """
+    rng = np.random.default_rng(semilla + 1)
+    en_meli = tiendas['NOME_BASE'].sample(frac=fraccion_en_meli, random_state=semilla).tolist()
+    solo_meli = set()
+    while len(solo_meli) < int(len(tiendas) * fraccion_solo_meli):
+        solo_meli.add(_nome_base(rng))
+    bases = en_meli + sorted(solo_meli - set(tiendas['NOME_BASE']))
+
+    n = len(bases)
+    categorias = rng.integers(0, len(CATEGORIAS_L1_MELI), size=n)
+    df = pd.DataFrame({
+        'OFS_OFFICIAL_STORE_ID': np.arange(1, n + 1) + 10 ** 5,
+        'SIT_SITE_ID': 'MLB',
+        'OFS_NAME': [_con_ruido(b, rng) if rng.random() < 0.5 else f"{b.upper()} COMERCIO LTDA" for b in bases],
+        'OFS_FANTASY_NAME': [_con_ruido(b, rng) for b in bases],
+        'OFS_STATUS': rng.choice(['active', 'inactive'], size=n, p=[0.9, 0.1]),
+        'AUD_UPD_DTTM': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 365 * 24, size=n), unit='h'),
+        'Category_ID': rng.integers(1000, 999999, size=n),
+        'CAT_CATEG_ID_L1': [CATEGORIAS_L1_MELI[i][0] for i in categorias],
+        'CAT_CATEG_NAME_L1': [CATEGORIAS_L1_MELI[i][1] for i in categorias],
+        'NOME_BASE': bases,  # la verdad, para medir la calidad del matching (no es una columna de Meli)
+    })
+
+    duplicadas = df.sample(frac=fraccion_duplicadas, random_state=semilla)
+    duplicadas = duplicadas.assign(AUD_UPD_DTTM=duplicadas['AUD_UPD_DTTM'] - pd.Timedelta(days=30))
+    return pd.concat([df, duplicadas], ignore_index=True)
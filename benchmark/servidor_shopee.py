@@ -0,0 +1,55 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+RUTA_API = "/api/v4/official_shop/get_shops_by_category"
+
+
+class ServidorShopee:
+    """
+    Servidor HTTP local que imita get_shops_by_category: responde el JSON de `respuestas[category_id]`
+    (ver datos_sinteticos.respuestas_api) y {"error": 0, "data": {"brands": []}} para las demás categorías.
+    Corre en un hilo, en un puerto libre de 127.0.0.1; usarlo con `with`.
+    """
+
+    def __init__(self, respuestas):
+        cuerpos = {cid: json.dumps(r, ensure_ascii=False).encode('utf-8') for cid, r in respuestas.items()}
+        vacio = json.dumps({'error': 0, 'data': {'brands': []}}).encode('utf-8')
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, como la sesión del crawler
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != RUTA_API:
+                    self.send_error(404)
+                    return
+                category_id = int(parse_qs(url.query).get('category_id', ['0'])[0])
+                cuerpo = cuerpos.get(category_id, vacio)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, *args):
+                pass
+
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+        self._servidor.daemon_threads = True
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, puerto = self._servidor.server_address
+        return f"http://{host}:{puerto}{RUTA_API}"
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+        return False
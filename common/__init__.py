@@ -0,0 +1 @@
+"""Código compartido entre el scraper y el matching (normalización, IDs, acceso a BigQuery)."""
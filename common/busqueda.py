@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+
+# Tamaño de los bloques de la multiplicación: la memoria de trabajo queda acotada en
+# BLOQUE_CONSULTAS x BLOQUE_CANDIDATOS floats, sin importar el tamaño de Shopee o de Meli
+BLOQUE_CONSULTAS = int(os.environ.get("BUSQUEDA_BLOQUE_CONSULTAS", "1024"))
+BLOQUE_CANDIDATOS = int(os.environ.get("BUSQUEDA_BLOQUE_CANDIDATOS", "65536"))
+
+
+def normalizar_filas(matriz):
+    """Vectores a norma 1 (float32), para que el producto punto sea la similitud coseno."""
+    matriz = np.asarray(matriz, dtype=np.float32)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    return matriz / np.maximum(normas, 1e-12)
+
+
+def mejores_k(scores, indices, k):
+    """Se queda con las k columnas de mayor score de cada fila, ordenadas de mayor a menor."""
+    if scores.shape[1] > k:
+        parte = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, parte, axis=1)
+        indices = np.take_along_axis(indices, parte, axis=1)
+    orden = np.argsort(-scores, axis=1, kind='stable')
+    return np.take_along_axis(indices, orden, axis=1), np.take_along_axis(scores, orden, axis=1)
+
+
+def top_k(consultas, candidatos, k=1, bloque_consultas=BLOQUE_CONSULTAS, bloque_candidatos=BLOQUE_CANDIDATOS,
+          normalizados=False):
+    """
+    Los k candidatos más parecidos (similitud coseno) a cada consulta.
+
+    Normaliza una sola vez y recorre las dos matrices por bloques con una multiplicación de matrices, en vez de
+    un cos_sim por consulta. Devuelve (indices, scores), ambos de forma (n_consultas, k) y ordenados de mayor a
+    menor score; si hay menos de k candidatos, k se achica.
+    """
+    if not normalizados:
+        consultas, candidatos = normalizar_filas(consultas), normalizar_filas(candidatos)
+    k = min(k, len(candidatos))
+    indices = np.empty((len(consultas), k), dtype=np.int64)
+    scores = np.empty((len(consultas), k), dtype=np.float32)
+    if k == 0:
+        return indices, scores
+
+    for i in range(0, len(consultas), bloque_consultas):
+        bloque = consultas[i:i + bloque_consultas]
+        mejores_idx = np.empty((len(bloque), 0), dtype=np.int64)
+        mejores_scores = np.empty((len(bloque), 0), dtype=np.float32)
+
+        # Top-k parcial por bloque de candidatos, combinado con el que ya se tenía
+        for j in range(0, len(candidatos), bloque_candidatos):
+            sim = bloque @ candidatos[j:j + bloque_candidatos].T
+            idx = np.broadcast_to(np.arange(j, j + sim.shape[1]), sim.shape)
+            idx, sim = mejores_k(sim, idx, k)
+            mejores_idx, mejores_scores = mejores_k(
+                np.hstack([mejores_scores, sim]), np.hstack([mejores_idx, idx]), k
+            )
+
+        indices[i:i + len(bloque)] = mejores_idx
+        scores[i:i + len(bloque)] = mejores_scores
+
+    return indices, scores
+
+
+def top_k_en_bloques(consultas, candidatos, bloques, k=1, bloque_consultas=BLOQUE_CONSULTAS, normalizados=False):
+    """
+    Como top_k, pero cada consulta solo se compara con sus propios candidatos: `bloques` es una matriz
+    (n_consultas, b) con posiciones de `candidatos`, completada con -1. Devuelve (indices, scores) de forma
+    (n_consultas, k), con -1 / -inf donde el bloque tenía menos de k candidatos.
+    """
+    if not normalizados:
+        consultas, candidatos = normalizar_filas(consultas), normalizar_filas(candidatos)
+    bloques = np.asarray(bloques, dtype=np.int64)
+    indices = np.full((len(consultas), k), -1, dtype=np.int64)
+    scores = np.full((len(consultas), k), -np.inf, dtype=np.float32)
+    if len(consultas) == 0 or bloques.shape[1] == 0:
+        return indices, scores
+
+    for i in range(0, len(consultas), bloque_consultas):
+        bloque = bloques[i:i + bloque_consultas]
+        sim = np.einsum('nd,nbd->nb', consultas[i:i + bloque_consultas], candidatos[np.maximum(bloque, 0)])
+        sim = np.where(bloque >= 0, sim, -np.inf).astype(np.float32)
+        idx, sc = mejores_k(sim, bloque, min(k, bloque.shape[1]))
+        indices[i:i + len(bloque), :idx.shape[1]] = np.where(np.isfinite(sc), idx, -1)
+        scores[i:i + len(bloque), :sc.shape[1]] = sc
+
+    return indices, scores
@@ -0,0 +1,157 @@
+import os
+import re
+import sqlite3
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+# Carpeta del caché de embeddings y tipo con que se guardan los vectores (float16 ocupa la mitad y alcanza
+# para similitud coseno; float32 si se quiere exactamente lo mismo que devuelve el modelo)
+DIR_CACHE_EMBEDDINGS = os.environ.get("EMBEDDINGS_CACHE_DIR", "cache_embeddings")
+DTYPE_CACHE = os.environ.get("EMBEDDINGS_CACHE_DTYPE", "float16")
+
+# Textos que no se pidieron en este tiempo se borran al compactar
+DIAS_SIN_USO = int(os.environ.get("EMBEDDINGS_CACHE_DIAS_SIN_USO", "90"))
+
+_TAMANO_LOTE = 900
+
+
+def clave_texto(texto):
+    """Clave del caché: el texto sin espacios de más (los nombres ya llegan normalizados)."""
+    return " ".join(str(texto).split())
+
+
+class CacheEmbeddings:
+    """
+    Caché en disco de embeddings por (modelo, texto).
+
+    Los vectores van en una matriz cruda (una fila por texto) que se lee con memmap, y el índice texto -> fila
+    en SQLite, como el registro de UNIC_IDs. En cada corrida solo se codifican los textos que no estaban.
+    """
+
+    def __init__(self, modelo, dir_cache=DIR_CACHE_EMBEDDINGS, dtype=DTYPE_CACHE):
+        self.modelo = modelo
+        self.dtype = np.dtype(dtype)
+        self.carpeta = Path(dir_cache) / re.sub(r'[^A-Za-z0-9._-]', '_', modelo)
+        self.carpeta.mkdir(parents=True, exist_ok=True)
+        self.ruta_matriz = self.carpeta / f"vectores.{self.dtype.name}"
+
+        self.conn = sqlite3.connect(self.carpeta / "indice.sqlite3")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                clave  TEXT PRIMARY KEY,
+                valor  TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS textos (
+                texto  TEXT PRIMARY KEY,
+                fila   INTEGER NOT NULL,
+                visto  TEXT NOT NULL
+            );
+        """)
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM textos").fetchone()[0]
+
+    @property
+    def dim(self):
+        fila = self.conn.execute("SELECT valor FROM meta WHERE clave = 'dim'").fetchone()
+        return int(fila[0]) if fila else None
+
+    def _matriz(self):
+        """Matriz completa del caché, mapeada en memoria (solo lectura)."""
+        n = len(self)
+        if n == 0:
+            return np.empty((0, self.dim or 0), dtype=self.dtype)
+        return np.memmap(self.ruta_matriz, dtype=self.dtype, mode='r', shape=(n, self.dim))
+
+    def _filas(self, claves):
+        filas = {}
+        for i in range(0, len(claves), _TAMANO_LOTE):
+            lote = claves[i:i + _TAMANO_LOTE]
+            filas.update(self.conn.execute(
+                f"SELECT texto, fila FROM textos WHERE texto IN ({', '.join('?' * len(lote))})", lote
+            ).fetchall())
+        return filas
+
+    def _agregar(self, claves, vectores):
+        vectores = np.asarray(vectores, dtype=np.float32)
+        if self.dim is None:
+            with self.conn:
+                self.conn.execute("INSERT INTO meta (clave, valor) VALUES ('dim', ?)", (str(vectores.shape[1]),))
+        elif vectores.shape[1] != self.dim:
+            raise ValueError(f"El modelo devolvió vectores de {vectores.shape[1]} dimensiones y el caché tiene {self.dim}")
+
+        n = len(self)
+        bytes_por_fila = self.dim * self.dtype.itemsize
+        with open(self.ruta_matriz, 'ab') as f:
+            # Si una corrida anterior se cortó después de escribir vectores pero antes de indexarlos,
+            # se descartan esas filas huérfanas para que las nuevas queden en la posición correcta
+            f.truncate(n * bytes_por_fila)
+            f.write(vectores.astype(self.dtype).tobytes())
+
+        hoy = date.today().isoformat()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO textos (texto, fila, visto) VALUES (?, ?, ?)",
+                [(clave, n + i, hoy) for i, clave in enumerate(claves)],
+            )
+
+    def _marcar_vistos(self, claves):
+        hoy = date.today().isoformat()
+        with self.conn:
+            self.conn.executemany("UPDATE textos SET visto = ? WHERE texto = ?", [(hoy, c) for c in claves])
+
+    def codificar(self, textos, encode):
+        """
+        Devuelve los embeddings de `textos` (float32, en el mismo orden). `encode` es la función del modelo
+        (por ejemplo model.encode) y solo se llama con los textos que todavía no están en el caché.
+        """
+        claves = [clave_texto(t) for t in textos]
+        unicas = list(dict.fromkeys(claves))
+
+        filas = self._filas(unicas)
+        nuevas = [c for c in unicas if c not in filas]
+        if nuevas:
+            print(f"🧠 Caché de embeddings ({self.modelo}): {len(unicas) - len(nuevas)} textos ya estaban, "
+                  f"se codifican {len(nuevas)} nuevos.")
+            self._agregar(nuevas, encode(nuevas))
+            filas.update(self._filas(nuevas))
+        self._marcar_vistos(unicas)
+
+        if not claves:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.asarray(self._matriz()[[filas[c] for c in claves]], dtype=np.float32)
+
+    def compactar(self, dias_sin_uso=DIAS_SIN_USO):
+        """
+        Borra los textos que no se pidieron en los últimos `dias_sin_uso` días y reescribe la matriz sin huecos.
+        Devuelve cuántos textos se borraron.
+        """
+        limite = (date.today() - timedelta(days=dias_sin_uso)).isoformat()
+        quedan = self.conn.execute(
+            "SELECT texto, fila FROM textos WHERE visto >= ? ORDER BY fila", (limite,)
+        ).fetchall()
+        borrados = len(self) - len(quedan)
+        if borrados == 0:
+            return 0
+
+        matriz = self._matriz()
+        tmp = self.ruta_matriz.with_name(self.ruta_matriz.name + ".tmp")
+        with open(tmp, 'wb') as f:
+            for i in range(0, len(quedan), 65536):
+                f.write(np.ascontiguousarray(matriz[[fila for _, fila in quedan[i:i + 65536]]]).tobytes())
+        del matriz
+
+        with self.conn:
+            self.conn.execute("DELETE FROM textos WHERE visto < ?", (limite,))
+            self.conn.executemany(
+                "UPDATE textos SET fila = ? WHERE texto = ?", [(i, texto) for i, (texto, _) in enumerate(quedan)]
+            )
+            os.replace(tmp, self.ruta_matriz)
+
+        print(f"🧹 Caché de embeddings ({self.modelo}) compactado: {borrados} textos sin uso borrados, quedan {len(quedan)}.")
+        return borrados
+
+    def cerrar(self):
+        self.conn.close()
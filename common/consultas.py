@@ -0,0 +1,228 @@
+import sqlite3
+from dataclasses import dataclass, replace
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from common.instrumentacion import anotar_consulta_bq
+
+DME_NAME = "DME_ATTACH_DME000418"
+
+TABLA_BRANDS = 'ddme000418-dn88p8g386x-furyid.TBL.DM_SHOPEE_OFFICIAL_BRANDS'
+TABLA_MATCH = 'ddme000418-dn88p8g386x-furyid.TBL.DM_SHOPEE_OFFICIAL_BRANDS_MATCH_AT'
+TABLA_SHEETS = 'ddme000418-dn88p8g386x-furyid.TBL.DM_STEP_PLAN_ACTION_TO_SHOPEE_PH'
+
+# Tipos de pandas de las columnas de DM_SHOPEE_OFFICIAL_BRANDS (los mismos que espera el matching).
+# Las fechas van sin zona horaria: la carga siempre las mandó así, y en la tabla son DATETIME (no TIMESTAMP)
+TIPOS_BRANDS = {
+    'USERNAME_SHOPEE':    'object',
+    'BRAND_NAME_SHOPEE':  'object',
+    'SHOPID':             'Int64',
+    'LOGO':               'object',
+    'LOGO_PC':            'object',
+    'SHOP_COLLECTION_ID': 'Int64',
+    'CTIME':              'Int64',
+    'BRAND_LABEL':        'Int64',
+    'SHOP_TYPE':          'Int64',
+    'REDIRECT_URL':       'object',
+    'ENTITY_ID':          'Int64',
+    'CATEGORY_ID':        'Int64',
+    'CATEGORY_NAME':      'object',
+    'TO_URL':             'object',
+    'UNIC_ID':            'object',
+    'FIRST_APPEARENCE':   'datetime64[ns]',
+    'DATE_SCRAPING':      'datetime64[ns]',
+    'AUD_INS_DTTM':       'datetime64[ns]',
+    'AUD_UPD_DTTM':       'datetime64[ns]',
+}
+
+
+def _a_fecha(valor):
+    if valor is None or isinstance(valor, date) and not isinstance(valor, datetime):
+        return valor
+    return pd.Timestamp(valor).date()
+
+
+def literal_fecha(tipo):
+    """Literal de BigQuery para comparar con una columna de fecha: TIMESTAMP si se declaró con zona horaria y
+    DATETIME si no (BigQuery no compara un DATETIME con un TIMESTAMP)."""
+    return "TIMESTAMP('{}')" if 'UTC' in tipo else "DATETIME('{}')"
+
+
+@dataclass(frozen=True)
+class Consulta:
+    """
+    Lo que una etapa necesita de una tabla: qué columnas (con su tipo) y qué rango de DATE_SCRAPING.
+    Con eso se arma el SQL con solo esas columnas y con el filtro de partición, en vez de un SELECT *.
+    `desde` y `hasta` son fechas inclusivas; None deja ese lado abierto. El tipo de los literales del filtro sale
+    del tipo declarado para `columna_fecha` en `tipos`.
+    """
+    tabla: str
+    tipos: dict
+    desde: date = None
+    hasta: date = None
+    columna_fecha: str = 'DATE_SCRAPING'
+
+    def con_fechas(self, desde=None, hasta=None):
+        return replace(self, desde=_a_fecha(desde), hasta=_a_fecha(hasta))
+
+    def en_fecha(self, dia):
+        return self.con_fechas(dia, dia)
+
+    def sql(self, dialecto='bigquery'):
+        columnas = ",\n    ".join(self.tipos)
+        if dialecto == 'bigquery':
+            tabla = f"`{self.tabla}`"
+            literal = literal_fecha(self.tipos.get(self.columna_fecha, 'datetime64[ns]'))
+        else:
+            # En el backend local cada tabla se llama solo por su último nombre (sin proyecto ni dataset)
+            tabla = self.tabla.split('.')[-1]
+            literal = "'{}'"
+
+        # Rango semiabierto sobre la columna cruda (sin DATE(...) encima) para que BigQuery pode particiones
+        filtros = []
+        if self.desde is not None:
+            filtros.append(f"{self.columna_fecha} >= {literal.format(self.desde.isoformat())}")
+        if self.hasta is not None:
+            siguiente = self.hasta + timedelta(days=1)
+            filtros.append(f"{self.columna_fecha} < {literal.format(siguiente.isoformat())}")
+
+        sql = f"SELECT\n    {columnas}\nFROM {tabla}"
+        if filtros:
+            sql += "\nWHERE " + "\n  AND ".join(filtros)
+        return sql
+
+
+def aplicar_tipos(df, tipos):
+    """Castea las columnas del resultado a los tipos declarados (las fechas con o sin zona horaria)."""
+    df = df.copy()
+    for col, tipo in tipos.items():
+        if col not in df.columns:
+            continue
+        if tipo.startswith('datetime64'):
+            df[col] = pd.to_datetime(df[col], utc='UTC' in tipo, errors='coerce')
+            if 'UTC' not in tipo and getattr(df[col].dtype, 'tz', None) is not None:
+                df[col] = df[col].dt.tz_convert('UTC').dt.tz_localize(None)
+        else:
+            df[col] = df[col].astype(tipo)
+    return df
+
+
+class BackendBigQuery:
+    """Backend real: un solo cliente del DME (se construye la primera vez que se usa) para todas las consultas."""
+    dialecto = 'bigquery'
+
+    def __init__(self, dme_name=DME_NAME, env='DEV'):
+        # env=None usa el ambiente por defecto del DME (como hacían las cargas a la tabla)
+        self.dme_name = dme_name
+        self.env = env
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from melitk.bigquery import BigQueryDatameshClientBuilder
+
+            builder = BigQueryDatameshClientBuilder()
+            if self.env is None:
+                builder = builder.with_dme_name(self.dme_name)
+            else:
+                builder = builder.with_dme_name(self.dme_name, env=self.env)
+            self._client = builder.build()
+            print("✅ Conexión con BigQuery establecida!")
+        return self._client
+
+    def consultar(self, sql):
+        resultado = self.client.query_to_df(sql)
+        anotar_consulta_bq()
+        return resultado.df
+
+    def ejecutar(self, sql):
+        """Sentencias sin resultado (MERGE, DROP, ...): se mandan por el mismo query_to_df del cliente."""
+        self.client.query_to_df(sql)
+        anotar_consulta_bq()
+
+    def escribir(self, df, tabla, **job_config_attributes):
+        self.client.df_to_gbq(df, tabla, **job_config_attributes)
+
+
+# Un backend por (DME, ambiente) para todo el proceso: los scripts que corren juntos (ver correr_pipeline.py)
+# comparten el mismo cliente de BigQuery en vez de armar uno por consulta
+_BACKENDS = {}
+
+
+def backend_compartido(env='DEV', dme_name=DME_NAME):
+    if (dme_name, env) not in _BACKENDS:
+        _BACKENDS[(dme_name, env)] = BackendBigQuery(dme_name, env=env)
+    return _BACKENDS[(dme_name, env)]
+
+
+class BackendLocal:
+    """
+    Backend de prueba en SQLite, para correr las etapas sin BigQuery.
+    Las tablas se cargan con cargar_tabla usando el mismo nombre completo que en BigQuery.
+    """
+    dialecto = 'sqlite'
+
+    def __init__(self, ruta=':memory:'):
+        self.conn = sqlite3.connect(ruta)
+
+    def cargar_tabla(self, tabla, df, mode='replace'):
+        df = df.copy()
+        # SQLite no tiene tipo fecha: se guardan como texto ISO, que se compara bien como string
+        for col in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[col]):
+                df[col] = df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
+        df.to_sql(tabla.split('.')[-1], self.conn, if_exists=mode, index=False)
+
+    def consultar(self, sql):
+        return pd.read_sql_query(sql, self.conn)
+
+    def ejecutar(self, sql):
+        with self.conn:
+            self.conn.execute(sql)
+
+    def escribir(self, df, tabla, mode='append', **_):
+        self.cargar_tabla(tabla, df, mode='replace' if mode == 'replace' else 'append')
+
+
+def leer(backend, consulta):
+    """Corre la consulta en el backend y devuelve el DataFrame ya tipado."""
+    sql = consulta.sql(backend.dialecto)
+    return aplicar_tipos(backend.consultar(sql), consulta.tipos)
+
+
+# Lo que necesita cada etapa
+# UNIC_ID: solo marca, SHOPID e ID, de todo el histórico (para sembrar el registro local)
+CONSULTA_UNIC_IDS = Consulta(TABLA_BRANDS, {
+    col: TIPOS_BRANDS[col] for col in ('BRAND_NAME_SHOPEE', 'SHOPID', 'UNIC_ID', 'DATE_SCRAPING')
+})
+
+# Matching: la foto de un día del scraper, con las columnas que terminan en la tabla del match
+CONSULTA_SHOPEE_MATCH = Consulta(TABLA_BRANDS, {
+    col: tipo for col, tipo in TIPOS_BRANDS.items() if col not in ('AUD_INS_DTTM', 'AUD_UPD_DTTM')
+})
+
+# Validación manual de Sheets: solo la tienda y las dos marcas de revisión
+CONSULTA_SHEETS = Consulta(TABLA_SHEETS, {
+    'LOJA_OFICIAL_SHOPEE': 'object',
+    'MATCH_SELECTION':     'object',
+    'MATCH_COMERCIAL':     'object',
+})
+
+# Matching incremental: lo que la corrida anterior dejó en la tabla del match (tienda, nombres y a qué TO
+# de Meli quedó unida), para arrastrar las coincidencias que siguen valiendo
+CONSULTA_MATCH_ANTERIOR = Consulta(TABLA_MATCH, {
+    'UNIC_ID_SHOPEE':         'object',
+    'USERNAME_SHOPEE':        'object',
+    'BRAND_NAME_SHOPEE':      'object',
+    'MATCH_VALUE_USED':       'object',
+    'MATCH_COLUMN_MELI':      'object',
+    'FOUND_BY_AI':            'boolean',
+    'OFFICIAL_STORE_ID_MELI': 'object',
+    'OFS_STATUS_MELI':        'object',
+    'LOJA_OFICIAL_MELI':      'object',
+    'FANTASY_NAME_MELI':      'object',
+    'DATE_SCRAPING':          'datetime64[ns]',
+    'AUD_INS_DTTM':           'datetime64[ns]',
+})
@@ -0,0 +1,120 @@
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    TIPO_TEXTO = "string[pyarrow]"
+except ImportError:  # Sin pyarrow, el string de pandas (igual sin el costo de un objeto Python por valor repetido)
+    TIPO_TEXTO = "string"
+
+# PANDAS_TIPOS_COMPACTOS=0 deja las columnas como las devuelve BigQuery (object)
+TIPOS_COMPACTOS = os.environ.get("PANDAS_TIPOS_COMPACTOS", "1") == "1"
+
+# Columnas de texto con pocos valores distintos que se repiten en cada fila: se guardan una vez, como categoría
+COLUNAS_CATEGORICAS = {
+    'CATEGORY_NAME_SHOPEE', 'CATEGORY_NAME_L1_MELI', 'OFS_STATUS_MELI', 'SIT_SITE_ID_MELI',
+}
+
+# Nombres de las columnas de Shopee y Meli en la tabla del match
+RENOMBRE_MATCH = {
+    'SHOPID': 'SHOPID_SHOPEE',
+    'LOGO': 'LOGO_SHOPEE',
+    'LOGO_PC': 'LOGO_PC_SHOPEE',
+    'SHOP_COLLECTION_ID': 'SHOP_COLLECTION_ID_SHOPEE',
+    'CTIME': 'CTIME_SHOPEE',
+    'BRAND_LABEL': 'BRAND_LABEL_SHOPEE',
+    'SHOP_TYPE': 'SHOP_TYPE_SHOPEE',
+    'REDIRECT_URL': 'REDIRECT_URL_SHOPEE',
+    'ENTITY_ID': 'ENTITY_ID_SHOPEE',
+    'CATEGORY_ID': 'CATEGORY_ID_SHOPEE',
+    'CATEGORY_NAME': 'CATEGORY_NAME_SHOPEE',
+    'TO_URL': 'TO_URL_SHOPEE',
+    'UNIC_ID': 'UNIC_ID_SHOPEE',
+    'FIRST_APPEARENCE': 'FIRST_APPEARENCE_SHOPEE',
+    'OFS_OFFICIAL_STORE_ID': 'OFFICIAL_STORE_ID_MELI',
+    'SIT_SITE_ID': 'SIT_SITE_ID_MELI',
+    'OFS_NAME': 'LOJA_OFICIAL_MELI',
+    'OFS_FANTASY_NAME': 'FANTASY_NAME_MELI',
+    'OFS_STATUS': 'OFS_STATUS_MELI',
+    'Category_ID': 'CATEGORIES_MELI_ID',
+    'CAT_CATEG_ID_L1': 'CATEGORY_ID_L1_MELI',
+    'CAT_CATEG_NAME_L1': 'CATEGORY_NAME_L1_MELI'
+}
+
+# Esquema de DM_SHOPEE_OFFICIAL_BRANDS_MATCH_AT (nombre_columna: tipo_pandas)
+ESQUEMA_MATCH = {
+    'USERNAME_SHOPEE':              'object',
+    'BRAND_NAME_SHOPEE':            'object',
+    'SHOPID_SHOPEE':                'Int64',
+    'LOGO_SHOPEE':                  'object',
+    'LOGO_PC_SHOPEE':               'object',
+    'SHOP_COLLECTION_ID_SHOPEE':    'Int64',
+    'CTIME_SHOPEE':                 'Int64',
+    'BRAND_LABEL_SHOPEE':           'Int64',
+    'SHOP_TYPE_SHOPEE':             'Int64',
+    'REDIRECT_URL_SHOPEE':          'object',
+    'ENTITY_ID_SHOPEE':             'Int64',
+    'CATEGORY_ID_SHOPEE':           'Int64',
+    'CATEGORY_NAME_SHOPEE':         'object',
+    'TO_URL_SHOPEE':                'object',
+    'LOJA_NOVA_SHOPEE':             'bool',
+    'FIRST_APPEARENCE_SHOPEE':      'datetime64[ns]',
+    'UNIC_ID_SHOPEE':               'object',
+    'DATE_SCRAPING':                'datetime64[ns]',
+    'DATE_MATCH':                   'datetime64[ns]',
+    'FOUND_BY_AI':                  'bool',
+    'LOJA_OFICIAL_MELI':            'object',
+    'FANTASY_NAME_MELI':            'object',
+    'OFFICIAL_STORE_ID_MELI':       'object',
+    'CATEGORIES_MELI_ID':           'Int64',
+    'MAIN_CATEGORIES_MELI_ID':      'Float64',
+    'VERTICAL_MELI':                'object',
+    'SIT_SITE_ID_MELI':             'object',
+    'MATCH_VALUE_USED':             'object',  # Nombre actualizado
+    'MATCH_COLUMN_MELI':            'object',  # Nombre actualizado
+    'OFS_STATUS_MELI':              'object',
+    'CATEGORY_ID_L1_MELI':          'Int64',
+    'CATEGORY_NAME_L1_MELI':        'object'
+}
+
+
+def activar_copy_on_write():
+    """Copy-on-write de pandas: los .copy() y los recortes comparten memoria hasta que alguien escribe."""
+    if int(pd.__version__.split('.')[0]) < 3:  # desde pandas 3 es el único modo
+        pd.set_option("mode.copy_on_write", True)
+
+
+def tipo_de_trabajo(col, esquema=ESQUEMA_MATCH, renombre=RENOMBRE_MATCH):
+    """
+    Tipo compacto para una columna de origen (nombre antes del renombre), según su tipo en el esquema final:
+    texto repetido -> category, resto del texto -> string de Arrow; enteros, fechas, etc. quedan como están.
+    """
+    final = renombre.get(col, col)
+    tipo = esquema.get(final)
+    if tipo != 'object':
+        return tipo
+    return 'category' if final in COLUNAS_CATEGORICAS else TIPO_TEXTO
+
+
+def compactar(df, esquema=ESQUEMA_MATCH, renombre=RENOMBRE_MATCH):
+    """
+    Pasa las columnas de texto de df a los tipos de trabajo (solo las que de verdad tienen texto: un ID numérico
+    que llega como object queda igual). Las columnas fuera del esquema no se tocan.
+    """
+    if not TIPOS_COMPACTOS:
+        return df
+    tipos = {}
+    for col in df.columns:
+        tipo = tipo_de_trabajo(col, esquema, renombre)
+        if tipo in ('category', TIPO_TEXTO) and df[col].dtype == object and pd.api.types.is_string_dtype(df[col]):
+            tipos[col] = tipo
+    return df.astype(tipos) if tipos else df
+
+
+def para_esquema(df, esquema=ESQUEMA_MATCH):
+    """Vuelve las columnas de texto compactas a object (con None como nulo), como las espera la carga a BigQuery."""
+    for col, tipo in esquema.items():
+        if tipo == 'object' and col in df.columns and df[col].dtype != object:
+            df[col] = df[col].astype(object).where(df[col].notna(), None)
+    return df
@@ -0,0 +1,162 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from common.busqueda import mejores_k, normalizar_filas, top_k
+
+# Carpeta donde se guardan los índices (uno por conjunto de candidatos, p. ej. las TOs de un sitio)
+DIR_INDICE_ANN = os.environ.get("INDICE_ANN_DIR", "indice_ann")
+
+# Cuántas listas se revisan por consulta: más listas = más recall y más lento (n_listas lo vuelve exacto)
+NPROBE = int(os.environ.get("INDICE_ANN_NPROBE", "8"))
+
+# Por debajo de este tamaño no vale la pena agrupar: una sola lista (búsqueda exacta)
+MIN_VECTORES_IVF = int(os.environ.get("INDICE_ANN_MIN_VECTORES", "20000"))
+
+# Si desde el último entrenamiento cambió más que esta fracción del índice, se recalculan los centroides
+FRACCION_REENTRENAR = 0.2
+
+
+def _guardar_npy(ruta, arreglo):
+    with open(str(ruta) + ".tmp", 'wb') as f:
+        np.save(f, arreglo)
+    os.replace(str(ruta) + ".tmp", ruta)
+
+
+class IndiceIVF:
+    """
+    Índice de vecinos aproximados (IVF, solo CPU) sobre los embeddings de los candidatos de Meli.
+
+    Los vectores se agrupan con k-means en `n_listas` listas; cada consulta mira solo las `nprobe` listas con
+    centroide más parecido. Se guarda en disco y se sincroniza de a poco: solo se codifican los candidatos
+    nuevos o con texto cambiado, y los que desaparecieron de LK_OFS_OFFICIAL_STORES se borran.
+    """
+
+    def __init__(self, nombre, dir_indice=DIR_INDICE_ANN):
+        self.carpeta = Path(dir_indice) / nombre
+        self.carpeta.mkdir(parents=True, exist_ok=True)
+
+        ruta_meta = self.carpeta / "claves.json"
+        if ruta_meta.exists():
+            with open(ruta_meta, encoding='utf-8') as f:
+                meta = json.load(f)
+            self.claves, self.textos = meta['claves'], meta['textos']
+            self.cambios_desde_entrenamiento = meta['cambios_desde_entrenamiento']
+            self.vectores = np.load(self.carpeta / "vectores.npy")
+            self.listas = np.load(self.carpeta / "listas.npy")
+            self.centroides = np.load(self.carpeta / "centroides.npy")
+        else:
+            self.claves, self.textos = [], []
+            self.cambios_desde_entrenamiento = 0
+            self.vectores = self.listas = self.centroides = None
+
+    def __len__(self):
+        return len(self.claves)
+
+    def _guardar(self):
+        _guardar_npy(self.carpeta / "vectores.npy", self.vectores)
+        _guardar_npy(self.carpeta / "listas.npy", self.listas)
+        _guardar_npy(self.carpeta / "centroides.npy", self.centroides)
+        # El JSON va último: si la corrida se corta antes, el índice anterior sigue siendo el que vale
+        ruta_meta = self.carpeta / "claves.json"
+        with open(str(ruta_meta) + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({
+                'claves': self.claves, 'textos': self.textos,
+                'cambios_desde_entrenamiento': self.cambios_desde_entrenamiento,
+            }, f, ensure_ascii=False)
+        os.replace(str(ruta_meta) + ".tmp", ruta_meta)
+
+    def _entrenar(self):
+        """Recalcula los centroides (k-means sobre los vectores normalizados) y reparte todo de nuevo."""
+        n = len(self.vectores)
+        n_listas = 1 if n < MIN_VECTORES_IVF else int(4 * np.sqrt(n))
+        if n == 0:
+            centroides = np.empty((0, self.vectores.shape[1]), dtype=np.float32)
+        elif n_listas == 1:
+            centroides = normalizar_filas(self.vectores.mean(axis=0, keepdims=True))
+        else:
+            from sklearn.cluster import MiniBatchKMeans
+
+            # Para los centroides alcanza con una muestra; después se asignan todos los vectores
+            muestra = np.random.default_rng(0).choice(n, size=min(n, 64 * n_listas), replace=False)
+            kmeans = MiniBatchKMeans(n_clusters=n_listas, random_state=0, n_init=1, batch_size=4096)
+            kmeans.fit(self.vectores[np.sort(muestra)])
+            centroides = normalizar_filas(kmeans.cluster_centers_)
+        self.centroides = centroides
+        self.listas = self._asignar(self.vectores)
+        self.cambios_desde_entrenamiento = 0
+        print(f"🗂️ Índice ANN {self.carpeta.name}: {n} vectores en {n_listas} listas.")
+
+    def _asignar(self, vectores):
+        if self.centroides is None or len(self.centroides) == 0 or len(vectores) == 0:
+            return np.zeros(len(vectores), dtype=np.int32)
+        return top_k(vectores, self.centroides, k=1, normalizados=True)[0][:, 0].astype(np.int32)
+
+    def sincronizar(self, claves, textos, codificar):
+        """
+        Deja el índice igual a los candidatos actuales (`claves` únicas, con su `texto`). `codificar(textos)`
+        devuelve los embeddings y solo se llama para los candidatos nuevos o cuyo texto cambió.
+        """
+        actuales = dict(zip(claves, textos))
+        if len(actuales) != len(claves):
+            raise ValueError("Las claves del índice ANN tienen que ser únicas")
+
+        guardados = dict(zip(self.claves, self.textos))
+        siguen = [i for i, clave in enumerate(self.claves) if actuales.get(clave) == self.textos[i]]
+        nuevas = [clave for clave in claves if guardados.get(clave) != actuales[clave]]
+        borradas = sum(clave not in actuales for clave in self.claves)
+        if not nuevas and not borradas and self.centroides is not None:
+            return
+
+        vectores_nuevos = normalizar_filas(codificar([actuales[c] for c in nuevas])) if nuevas else None
+        partes = [self.vectores[siguen]] if siguen else []
+        if vectores_nuevos is not None:
+            partes.append(vectores_nuevos)
+        self.vectores = np.vstack(partes) if partes else np.empty((0, 0), dtype=np.float32)
+        self.claves = [self.claves[i] for i in siguen] + nuevas
+        self.textos = [self.textos[i] for i in siguen] + [actuales[c] for c in nuevas]
+        self.cambios_desde_entrenamiento += len(nuevas) + borradas
+
+        if self.centroides is None or self.cambios_desde_entrenamiento > FRACCION_REENTRENAR * len(self):
+            self._entrenar()
+        else:
+            # Cambio chico: los centroides siguen sirviendo, los vectores nuevos van a su lista más cercana
+            self.listas = np.concatenate([
+                self.listas[siguen],
+                self._asignar(vectores_nuevos) if vectores_nuevos is not None else np.zeros(0, dtype=np.int32),
+            ])
+
+        print(f"🗂️ Índice ANN {self.carpeta.name} sincronizado: {len(nuevas)} candidatos nuevos o cambiados, "
+              f"{borradas} borrados, {len(self)} en total.")
+        self._guardar()
+
+    def buscar(self, consultas, k=1, nprobe=NPROBE):
+        """
+        Los k candidatos más parecidos a cada consulta, mirando solo las `nprobe` listas más cercanas.
+        Devuelve (indices, scores) de forma (n_consultas, k), ordenados de mayor a menor; los índices apuntan
+        a self.claves y valen -1 (con score -inf) si las listas revisadas tenían menos de k vectores.
+        """
+        consultas = normalizar_filas(consultas)
+        indices = np.full((len(consultas), k), -1, dtype=np.int64)
+        scores = np.full((len(consultas), k), -np.inf, dtype=np.float32)
+        if len(consultas) == 0 or len(self) == 0:
+            return indices, scores
+
+        listas_consulta = top_k(consultas, self.centroides, k=nprobe, normalizados=True)[0]
+        orden = np.argsort(self.listas, kind='stable')
+        inicios = np.searchsorted(self.listas[orden], np.arange(len(self.centroides) + 1))
+
+        # Se recorre cada lista una vez, con todas las consultas que la eligieron
+        for lista in np.unique(listas_consulta):
+            miembros = orden[inicios[lista]:inicios[lista + 1]]
+            filas = np.flatnonzero((listas_consulta == lista).any(axis=1))
+            if len(miembros) == 0:
+                continue
+            idx, sim = top_k(consultas[filas], self.vectores[miembros], k=k, normalizados=True)
+            indices[filas], scores[filas] = mejores_k(
+                np.hstack([scores[filas], sim]), np.hstack([indices[filas], miembros[idx]]), k
+            )
+
+        return indices, scores
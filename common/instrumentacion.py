@@ -0,0 +1,191 @@
+import atexit
+import json
+import os
+import resource
+import sqlite3
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+# Archivo JSON Lines donde cada etapa deja una línea con sus métricas ("" para no escribir nada)
+ARCHIVO_METRICAS = os.environ.get("METRICAS_ARCHIVO", "metricas_etapas.jsonl")
+
+# Tabla local opcional (SQLite) con las mismas métricas, para consultarlas con SQL; vacío = desactivada
+TABLA_METRICAS = os.environ.get("METRICAS_TABLA", "")
+
+# Identificador de la corrida, uno por proceso: con correr_pipeline.py el crawler, la carga y el matching
+# comparten el mismo (METRICAS_CORRIDA para fijarlo a mano)
+CORRIDA = os.environ.get("METRICAS_CORRIDA") or f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+COLUMNAS_TABLA = [
+    'corrida', 'proceso', 'etapa', 'inicio', 'estado', 'segundos', 'cpu_segundos', 'memoria_pico_mb',
+    'filas_entrada', 'filas_salida', 'consultas_bq', 'error', 'extra',
+]
+
+# Consultas a BigQuery del proceso (ver consultas.BackendBigQuery): cada etapa se queda con la diferencia entre
+# el principio y el final. Los bytes escaneados no se anotan: el cliente del DME no los expone
+_BQ = {'consultas': 0}
+
+
+def anotar_consulta_bq():
+    _BQ['consultas'] += 1
+
+
+def marcar_error(etapa, error):
+    """Para los errores que el script atrapa y sigue: la etapa queda como error en las métricas."""
+    etapa['estado'] = 'error'
+    etapa['error'] = f"{type(error).__name__}: {error}"
+
+
+def _reiniciar_pico_memoria():
+    """En Linux, escribir 5 en clear_refs baja el pico de RSS (VmHWM) al uso actual: así el pico es el de la etapa."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _pico_memoria_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith("VmHWM:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    # Sin /proc: el pico de todo el proceso (ru_maxrss viene en KB en Linux y en bytes en macOS)
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class Instrumentador:
+    """
+    Métricas por etapa de un script: tiempo de reloj y de CPU, pico de memoria, filas de entrada y salida y
+    cantidad de consultas a BigQuery. Cada etapa termina en una línea de `archivo` (JSON Lines) y, si se pasa
+    `tabla`, en la tabla metricas_etapas de ese SQLite. Las etapas quedan además en `etapas`, por nombre.
+
+    Dos formas de marcar una etapa:
+      - `with metricas.etapa('nombre') as etapa:` para un bloque;
+      - `etapa = metricas.paso('nombre')` en los scripts que van de arriba abajo: cierra la etapa anterior y abre
+        la siguiente (la última se cierra con `terminar()`, o al salir del proceso como "interrumpida").
+    En las dos, lo que se agregue al dict `etapa` (filas_salida, ...) va al registro.
+
+    El pico de memoria es el RSS máximo desde que empezó la etapa; con etapas anidadas (el pipeline alrededor de
+    los pasos de cada script) la de afuera se queda con el pico de su última etapa interna.
+    """
+
+    def __init__(self, proceso, archivo=ARCHIVO_METRICAS, tabla=TABLA_METRICAS, corrida=CORRIDA):
+        self.proceso = proceso
+        self.archivo = archivo
+        self.tabla = tabla
+        self.corrida = corrida
+        self.etapas = {}
+        self._abierta = None
+        self._atexit = False
+
+    def _abrir(self, nombre, datos):
+        registro = {'estado': 'ok', **datos}
+        self.etapas[nombre] = registro
+        pico_por_etapa = _reiniciar_pico_memoria()
+        return {
+            'nombre': nombre,
+            'registro': registro,
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'reloj': time.perf_counter(),
+            'cpu': time.process_time(),
+            'bq': dict(_BQ),
+            'pico_por_etapa': pico_por_etapa,
+        }
+
+    def _cerrar(self, inicio, estado=None):
+        registro = inicio['registro']
+        # Una etapa que ya quedó como error no pasa a "interrumpida" cuando el error corta el proceso
+        if estado and registro['estado'] != 'error':
+            registro['estado'] = estado
+        registro['segundos'] = round(time.perf_counter() - inicio['reloj'], 4)
+        registro['cpu_segundos'] = round(time.process_time() - inicio['cpu'], 4)
+        registro['memoria_pico_mb'] = round(_pico_memoria_mb(), 1)
+        if not inicio['pico_por_etapa']:
+            registro['memoria_pico_proceso'] = True  # el pico no se pudo reiniciar: es el de todo el proceso
+        registro['consultas_bq'] = _BQ['consultas'] - inicio['bq']['consultas']
+
+        filas = ""
+        if registro.get('filas_entrada') is not None or registro.get('filas_salida') is not None:
+            filas = f", filas {registro.get('filas_entrada', '-')} -> {registro.get('filas_salida', '-')}"
+        print(f"⏱️ {inicio['nombre']}: {registro['segundos']:.3f} s (CPU {registro['cpu_segundos']:.3f} s, "
+              f"pico {registro['memoria_pico_mb']:.0f} MB{filas})")
+        self._emitir(inicio['nombre'], inicio['fecha'], registro)
+
+    @contextmanager
+    def etapa(self, nombre, **datos):
+        inicio = self._abrir(nombre, datos)
+        try:
+            yield inicio['registro']
+        except BaseException as e:
+            marcar_error(inicio['registro'], e)
+            self._cerrar(inicio)
+            raise
+        self._cerrar(inicio)
+
+    def paso(self, nombre, **datos):
+        self.terminar()
+        if not self._atexit:
+            atexit.register(self.terminar, 'interrumpida')
+            self._atexit = True
+        self._abierta = self._abrir(nombre, datos)
+        return self._abierta['registro']
+
+    def terminar(self, estado=None):
+        if self._abierta is not None:
+            abierta, self._abierta = self._abierta, None
+            self._cerrar(abierta, estado)
+
+    def omitir(self, nombre, motivo):
+        self.etapas[nombre] = {'estado': 'omitida', 'motivo': motivo}
+        print(f"⏭️ {nombre}: omitida ({motivo})")
+
+    def _emitir(self, nombre, fecha, registro):
+        fila = {'corrida': self.corrida, 'proceso': self.proceso, 'etapa': nombre, 'inicio': fecha, **registro}
+        # Las métricas nunca deberían tumbar la corrida: si no se pueden guardar, se avisa y se sigue
+        try:
+            if self.archivo:
+                with open(self.archivo, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(fila, ensure_ascii=False, default=str) + "\n")
+            if self.tabla:
+                guardar_en_tabla(self.tabla, [fila])
+        except (OSError, sqlite3.Error) as e:
+            print(f"No se pudieron guardar las métricas de {nombre}: {e}")
+
+
+def guardar_en_tabla(ruta, filas):
+    """Agrega filas de métricas a la tabla metricas_etapas (lo que no es una columna fija va como JSON en extra)."""
+    valores = []
+    for fila in filas:
+        extra = {k: v for k, v in fila.items() if k not in COLUMNAS_TABLA}
+        extra = json.dumps(extra, ensure_ascii=False, default=str) if extra else None
+        valores.append([fila.get(col) for col in COLUMNAS_TABLA[:-1]] + [extra])
+
+    conn = sqlite3.connect(ruta)
+    try:
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS metricas_etapas (
+                    corrida TEXT, proceso TEXT, etapa TEXT, inicio TEXT, estado TEXT,
+                    segundos REAL, cpu_segundos REAL, memoria_pico_mb REAL,
+                    filas_entrada INTEGER, filas_salida INTEGER, consultas_bq INTEGER,
+                    error TEXT, extra TEXT
+                )
+            """)
+            # Con las columnas nombradas, para que sirva también con tablas creadas con columnas de más
+            conn.executemany(
+                f"INSERT INTO metricas_etapas ({', '.join(COLUMNAS_TABLA)}) "
+                f"VALUES ({', '.join('?' * len(COLUMNAS_TABLA))})",
+                valores,
+            )
+    finally:
+        conn.close()
+
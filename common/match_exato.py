@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+NAO_ENCONTRADO = 'NÃO_ENCONTRADO'
+
+# Columnas de Mercado Libre que se copian al resultado cuando hay coincidencia
+COLUNAS_MELI = [
+    'OFS_OFFICIAL_STORE_ID', 'SIT_SITE_ID', 'OFS_NAME', 'OFS_FANTASY_NAME',
+    'OFS_STATUS', 'Category_ID', 'CAT_CATEG_ID_L1', 'CAT_CATEG_NAME_L1'
+]
+
+# Orden de búsqueda de siempre: primero el nombre de la marca y después el usuario de Shopee;
+# dentro de cada uno, primero el nombre de fantasía de Meli y después el nombre oficial
+CHAVES_SHOPEE = ('BRAND_NAME_SHOPEE', 'USERNAME_SHOPEE')
+COLUNAS_INDICE_MELI = ('OFS_FANTASY_NAME', 'OFS_NAME')
+
+
+def construir_indice(df_meli, colunas=COLUNAS_INDICE_MELI):
+    """
+    Índice hash nombre normalizado -> (posición de la fila en df_meli, columna donde está, prioridad de la columna).
+    Si un nombre aparece en las dos columnas gana la de mayor prioridad, y si se repite en la misma columna gana
+    la primera fila, así cada nombre apunta a una sola fila de Meli (sin multiplicar filas en el resultado).
+    """
+    partes = []
+    for prioridade, col in enumerate(colunas):
+        nomes = df_meli[col].reset_index(drop=True).dropna()
+        partes.append(pd.DataFrame({
+            'NOME': nomes.values,
+            'POS_MELI': nomes.index.values,
+            'COLUNA': col,
+            'PRIORIDADE': prioridade,
+        }))
+    return (
+        pd.concat(partes, ignore_index=True)
+        .drop_duplicates('NOME', keep='first')
+        .set_index('NOME')
+    )
+
+
+def linhas_meli(df_meli, pos, colunas_meli=COLUNAS_MELI):
+    """
+    Columnas de Meli de las filas `pos` de df_meli (-1 = sin coincidencia, con las columnas vacías). Las columnas
+    con tipo compacto (category, string, enteros nullable) lo mantienen; las demás salen como object, como antes.
+    """
+    achou = pos >= 0
+    if not len(df_meli):
+        return pd.DataFrame({col: pd.Series(pd.NA, index=range(len(pos)), dtype=object) for col in colunas_meli})
+    linhas = df_meli[colunas_meli].iloc[np.where(achou, pos, 0)].reset_index(drop=True)
+    for col in colunas_meli:
+        if not isinstance(linhas[col].dtype, pd.api.extensions.ExtensionDtype):
+            linhas[col] = linhas[col].astype(object)
+        linhas[col] = linhas[col].where(achou, pd.NA)
+    return linhas
+
+
+def match_exato(df_api, df_meli, chaves=CHAVES_SHOPEE, colunas_meli=COLUNAS_MELI):
+    """
+    Coincidencia exacta Shopee x Meli en una sola pasada sobre un único índice hash.
+
+    Para cada fila se busca primero BRAND_NAME_SHOPEE y, si no aparece, USERNAME_SHOPEE, con la misma prioridad
+    de columnas que la cascada de merges de antes. Como antes, el resultado se resuelve por UNIC_ID: todas las
+    filas de un UNIC_ID reciben la mejor coincidencia encontrada para cualquiera de ellas.
+
+    Devuelve df_api con VALOR_ENCONTRADO (la columna de Shopee que coincidió), COLUNA_ENCONTRADA_EM (la columna
+    de Meli) y las columnas de Meli; las filas sin coincidencia quedan con NÃO_ENCONTRADO y las columnas de Meli
+    vacías.
+    """
+    indice = construir_indice(df_meli)
+    n_colunas = len(COLUNAS_INDICE_MELI)
+
+    # Mejor coincidencia por fila: rank = prioridad de la clave de Shopee * n_colunas + prioridad de la columna
+    rank = np.full(len(df_api), np.iinfo(np.int64).max, dtype=np.int64)
+    pos_meli = np.full(len(df_api), -1, dtype=np.int64)
+    valor = np.full(len(df_api), NAO_ENCONTRADO, dtype=object)
+    coluna = np.full(len(df_api), NAO_ENCONTRADO, dtype=object)
+
+    for prioridade_chave, chave in enumerate(chaves):
+        achados = indice.reindex(df_api[chave].values)
+        encontrado = achados['POS_MELI'].notna().to_numpy()
+        rank_chave = prioridade_chave * n_colunas + achados['PRIORIDADE'].to_numpy()
+        melhor = encontrado & (rank_chave < rank)
+
+        rank[melhor] = rank_chave[melhor]
+        pos_meli[melhor] = achados['POS_MELI'].to_numpy()[melhor]
+        valor[melhor] = chave
+        coluna[melhor] = achados['COLUNA'].to_numpy()[melhor]
+
+    # Resolver por UNIC_ID: todas las filas del mismo UNIC_ID se quedan con la mejor coincidencia (la primera
+    # fila gana en caso de empate), igual que cuando el resultado se volvía a unir a df_api por UNIC_ID
+    por_fila = pd.DataFrame({
+        'UNIC_ID': df_api['UNIC_ID'].values, 'RANK': rank, 'POS_MELI': pos_meli,
+        'VALOR_ENCONTRADO': valor, 'COLUNA_ENCONTRADA_EM': coluna,
+    })
+    melhor_por_id = (
+        por_fila[por_fila['POS_MELI'] >= 0]
+        .sort_values('RANK', kind='stable')
+        .drop_duplicates('UNIC_ID', keep='first')
+        .set_index('UNIC_ID')
+    )
+    tem_id = por_fila['UNIC_ID'].isin(melhor_por_id.index).to_numpy() & por_fila['UNIC_ID'].notna().to_numpy()
+    if tem_id.any():
+        resolvido = melhor_por_id.reindex(por_fila.loc[tem_id, 'UNIC_ID'])
+        for col in ('POS_MELI', 'VALOR_ENCONTRADO', 'COLUNA_ENCONTRADA_EM'):
+            por_fila.loc[tem_id, col] = resolvido[col].to_numpy()
+
+    # Armar el resultado: columnas de Shopee + info del match + columnas de Meli (en ese orden, como antes)
+    df_resultado = df_api.reset_index(drop=True).copy()
+    df_resultado['VALOR_ENCONTRADO'] = por_fila['VALOR_ENCONTRADO'].to_numpy()
+    df_resultado['COLUNA_ENCONTRADA_EM'] = por_fila['COLUNA_ENCONTRADA_EM'].to_numpy()
+
+    meli_linhas = linhas_meli(df_meli, por_fila['POS_MELI'].to_numpy(dtype=np.int64), colunas_meli)
+    for col in colunas_meli:
+        df_resultado[col] = meli_linhas[col]
+
+    colunas_api = [col for col in df_api.columns if col not in colunas_meli]
+    return df_resultado[colunas_api + ['VALOR_ENCONTRADO', 'COLUNA_ENCONTRADA_EM'] + list(colunas_meli)]
+
+
+def aplicar_matches(df_resultado, df_matches):
+    """
+    Vuelca en df_resultado las coincidencias de las etapas siguientes (fuzzy/BERT) de una sola vez.
+
+    `df_matches` trae USERNAME_SHOPEE, MATCH_MELI, COLUNA_ENCONTRADA_EM y las columnas de Meli. Como antes,
+    cada coincidencia va a la primera fila todavía sin coincidencia de esa tienda (si una tienda trae varias
+    coincidencias, la segunda va a la segunda fila pendiente, y así). Devuelve una copia actualizada.
+    """
+    df_resultado = df_resultado.copy()
+    pendientes = df_resultado[
+        (df_resultado['VALOR_ENCONTRADO'] == NAO_ENCONTRADO) &
+        (df_resultado['COLUNA_ENCONTRADA_EM'] == NAO_ENCONTRADO)
+    ]
+    filas = pendientes[['USERNAME_SHOPEE']].assign(
+        N=pendientes.groupby('USERNAME_SHOPEE').cumcount(), FILA=pendientes.index
+    )
+    matches = df_matches.assign(N=df_matches.groupby('USERNAME_SHOPEE').cumcount())
+    destino = filas.merge(matches, on=['USERNAME_SHOPEE', 'N'], how='inner')
+
+    origen_destino = {'MATCH_MELI': 'VALOR_ENCONTRADO', 'COLUNA_ENCONTRADA_EM': 'COLUNA_ENCONTRADA_EM'}
+    origen_destino.update({col: col for col in COLUNAS_MELI})
+    for origen, col in origen_destino.items():
+        df_resultado.loc[destino['FILA'].to_numpy(), col] = destino[origen].to_numpy()
+    return df_resultado
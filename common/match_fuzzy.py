@@ -0,0 +1,76 @@
+import os
+import re
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+# Palabras que Shopee y Meli agregan al nombre de la tienda y que no distinguen una marca de otra
+SUFIXOS = ('OFICIAL', 'OFFICIAL', 'LOJA', 'STORE', 'SHOP', 'KIT', 'BRASIL', 'BR')
+RE_SUFIXOS = re.compile(r'\b(?:' + '|'.join(SUFIXOS) + r')\b')
+
+# Score (0-100, fuzz.ratio sobre la clave compacta) desde el que un candidato se acepta sin pasar por BERT
+CORTE_MATCH_FUZZY = int(os.environ.get("FUZZY_CORTE_MATCH", "90"))
+
+# Score mínimo para que un candidato entre al bloque que después puntúa BERT, y tamaño máximo del bloque
+CORTE_BLOQUE_FUZZY = int(os.environ.get("FUZZY_CORTE_BLOQUE", "70"))
+TAMANO_BLOQUE_FUZZY = int(os.environ.get("FUZZY_TAMANO_BLOQUE", "20"))
+
+# Nombres de Shopee por llamada a cdist (la matriz de scores es de uint8: lote x candidatos bytes)
+_LOTE = 1000
+
+
+def clave_fuzzy(nome):
+    """Nombre sin sufijos genéricos ni espacios: 'LOJA XYZ KIT' y 'XYZ' quedan iguales, 'X Y Z' también."""
+    nome = str(nome).upper()
+    sin_sufixos = RE_SUFIXOS.sub(' ', nome)
+    compacta = ''.join(sin_sufixos.split())
+    return compacta or ''.join(nome.split())
+
+
+def match_fuzzy(nomes, textos_candidatos, grupos=None, corte_match=CORTE_MATCH_FUZZY,
+                corte_bloque=CORTE_BLOQUE_FUZZY, tamano_bloque=TAMANO_BLOQUE_FUZZY):
+    """
+    Etapa léxica barata entre el match exacto y BERT.
+
+    Compara las claves compactas de `nomes` contra las de `textos_candidatos` con rapidfuzz.process.cdist
+    (en lotes, con todos los núcleos) y devuelve:
+      - pos_match: posición del candidato aceptado directamente (score >= corte_match y sin empate con otro
+        candidato de un grupo distinto, p. ej. otra TO), o -1;
+      - score_match: su score (0-100);
+      - bloque: (len(nomes), tamano_bloque) con las posiciones de los mejores candidatos con score >= corte_bloque,
+        de mayor a menor y completado con -1; es lo único que BERT necesita puntuar para ese nombre.
+    `grupos` indica a qué tienda pertenece cada candidato (por defecto cada candidato es su propio grupo).
+    """
+    claves_nomes = [clave_fuzzy(n) for n in nomes]
+    claves_candidatos = [clave_fuzzy(t) for t in textos_candidatos]
+    grupos = np.asarray(grupos if grupos is not None else np.arange(len(textos_candidatos)), dtype=object)
+
+    n, b = len(claves_nomes), min(tamano_bloque, len(claves_candidatos))
+    bloque = np.full((n, tamano_bloque), -1, dtype=np.int64)
+    scores_bloque = np.zeros((n, tamano_bloque), dtype=np.uint8)
+    if n == 0 or b == 0:
+        return np.full(n, -1, dtype=np.int64), np.zeros(n, dtype=np.uint8), bloque
+
+    for i in range(0, n, _LOTE):
+        scores = process.cdist(
+            claves_nomes[i:i + _LOTE], claves_candidatos, scorer=fuzz.ratio,
+            score_cutoff=corte_bloque, dtype=np.uint8, workers=-1,
+        )
+        parte = np.argpartition(-scores.astype(np.int16), b - 1, axis=1)[:, :b]
+        parte_scores = np.take_along_axis(scores, parte, axis=1)
+        orden = np.argsort(-parte_scores.astype(np.int16), axis=1, kind='stable')
+        parte, parte_scores = np.take_along_axis(parte, orden, axis=1), np.take_along_axis(parte_scores, orden, axis=1)
+
+        bloque[i:i + _LOTE, :b] = np.where(parte_scores > 0, parte, -1)
+        scores_bloque[i:i + _LOTE, :b] = parte_scores
+
+    mejor = bloque[:, 0]
+    score_match = scores_bloque[:, 0]
+    # Empate: otro candidato con el mismo score pero de un grupo distinto -> se deja para BERT
+    empate = np.zeros(n, dtype=bool)
+    for j in range(1, b):
+        mismo_score = (scores_bloque[:, j] == score_match) & (bloque[:, j] >= 0)
+        empate |= mismo_score & (grupos[np.maximum(bloque[:, j], 0)] != grupos[np.maximum(mejor, 0)])
+
+    aceptado = (mejor >= 0) & (score_match >= corte_match) & ~empate
+    return np.where(aceptado, mejor, -1), np.where(aceptado, score_match, 0).astype(np.uint8), bloque
@@ -0,0 +1,114 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from common.match_exato import COLUNAS_MELI, NAO_ENCONTRADO, linhas_meli
+
+# MATCH_INCREMENTAL=0 vuelve a cruzar toda la foto desde cero (por ejemplo después de cambiar el modelo o los cortes)
+MATCH_INCREMENTAL = os.environ.get("MATCH_INCREMENTAL", "1") == "1"
+
+# Hasta cuántos días antes de la foto actual se busca la corrida anterior de cada tienda
+DIAS_MATCH_ANTERIOR = int(os.environ.get("MATCH_INCREMENTAL_DIAS", "62"))
+
+# Con qué se reconoce la TO de Meli en las dos tablas: si cambió el estado o el nombre, la tienda se vuelve a cruzar
+CLAVE_TO_MELI = ['OFS_OFFICIAL_STORE_ID', 'OFS_STATUS', 'OFS_NAME', 'OFS_FANTASY_NAME']
+CLAVE_TO_MATCH = ['OFFICIAL_STORE_ID_MELI', 'OFS_STATUS_MELI', 'LOJA_OFICIAL_MELI', 'FANTASY_NAME_MELI']
+
+NOMES_SHOPEE = ['USERNAME_SHOPEE', 'BRAND_NAME_SHOPEE']
+
+
+def ultimo_match(df_anterior):
+    """Las filas de la última corrida de cada UNIC_ID (una corrida = un mismo AUD_INS_DTTM)."""
+    df = df_anterior[df_anterior['UNIC_ID_SHOPEE'].notna()]
+    ultima = df.groupby('UNIC_ID_SHOPEE')['AUD_INS_DTTM'].transform('max')
+    return df[df['AUD_INS_DTTM'] == ultima].reset_index(drop=True)
+
+
+def _texto(df, colunas):
+    # Claves comparables entre las dos tablas (IDs como texto, nulos como vacío)
+    return df[colunas].astype(object).where(df[colunas].notna(), '').astype(str)
+
+
+def _fila_por_nome(df, col_id):
+    # Cada fila se identifica por tienda + nombres + número de repetición (una tienda aparece en varias categorías)
+    return df[[col_id] + NOMES_SHOPEE].assign(N=df.groupby([col_id] + NOMES_SHOPEE, dropna=False).cumcount())
+
+
+def _firma_nomes(df, col_id):
+    # Los nombres de todas las filas de la tienda, ordenados: si algo cambió, la firma cambia
+    nomes = _texto(df, NOMES_SHOPEE)
+    return (nomes['USERNAME_SHOPEE'] + '\x1f' + nomes['BRAND_NAME_SHOPEE']).groupby(df[col_id]).agg(
+        lambda s: '\x1e'.join(sorted(s))
+    )
+
+
+def separar_arrastrados(df_api, df_anterior, df_meli, colunas_meli=COLUNAS_MELI):
+    """
+    Divide la foto actual de Shopee entre lo que se arrastra de la corrida anterior y lo que hay que cruzar.
+
+    Una tienda (UNIC_ID) se arrastra si en su última corrida quedó con alguna coincidencia automática, sus
+    nombres normalizados son exactamente los mismos y cada TO de Meli con la que coincidió sigue en df_meli con
+    el mismo estado y nombres. El resto (tiendas nuevas, renombradas, sin coincidencia o cuya TO cambió) pasa
+    por la cascada exacto / fuzzy / BERT. Lo manual de Sheets no se arrastra: se vuelve a aplicar en cada corrida.
+
+    Devuelve (df_arrastrado, pos_pendientes): df_arrastrado tiene el formato de match_exato (columnas de
+    df_api + VALOR_ENCONTRADO, COLUNA_ENCONTRADA_EM y las columnas de Meli, estas tomadas del df_meli actual) e
+    índice = posición de la fila en df_api; pos_pendientes son las posiciones de df_api que hay que cruzar.
+    """
+    df_api = df_api.reset_index(drop=True)
+    todas = np.arange(len(df_api))
+    colunas_api = [col for col in df_api.columns if col not in colunas_meli]
+    colunas_resultado = colunas_api + ['VALOR_ENCONTRADO', 'COLUNA_ENCONTRADA_EM'] + list(colunas_meli)
+    if df_anterior is None or df_anterior.empty:
+        return df_api.iloc[:0].reindex(columns=colunas_resultado), todas
+
+    anterior = ultimo_match(df_anterior)
+    automatico = anterior['FOUND_BY_AI'].fillna(False).astype(bool)
+
+    # TO de Meli de cada coincidencia anterior -> fila del df_meli actual (si sigue igual)
+    clave_meli = pd.Series(np.arange(len(df_meli)), index=pd.MultiIndex.from_frame(_texto(df_meli, CLAVE_TO_MELI)))
+    clave_meli = clave_meli[~clave_meli.index.duplicated()]
+    pos_meli = clave_meli.reindex(pd.MultiIndex.from_frame(_texto(anterior, CLAVE_TO_MATCH))).to_numpy()
+    pos_meli = np.where(automatico, pos_meli, np.nan)
+
+    to_sumiu = pd.Series(automatico.to_numpy() & np.isnan(pos_meli)).groupby(anterior['UNIC_ID_SHOPEE']).any()
+    con_match = automatico.groupby(anterior['UNIC_ID_SHOPEE']).any()
+
+    actual = df_api[df_api['UNIC_ID'].notna()]
+    mismos_nomes = (
+        _firma_nomes(actual, 'UNIC_ID').reindex(con_match.index) ==
+        _firma_nomes(anterior, 'UNIC_ID_SHOPEE').reindex(con_match.index)
+    )
+    arrastrables = con_match.index[con_match & ~to_sumiu & mismos_nomes]
+
+    # Fila actual <-> fila anterior de las tiendas arrastrables (mismos nombres, misma repetición)
+    filas_actuales = _fila_por_nome(actual, 'UNIC_ID').rename(columns={'UNIC_ID': 'UNIC_ID_SHOPEE'})
+    filas_actuales['POS_API'] = actual.index.to_numpy()
+    filas_anteriores = _fila_por_nome(anterior, 'UNIC_ID_SHOPEE').assign(
+        POS_MELI=pos_meli,
+        VALOR_ENCONTRADO=np.where(automatico, anterior['MATCH_VALUE_USED'], NAO_ENCONTRADO),
+        COLUNA_ENCONTRADA_EM=np.where(automatico, anterior['MATCH_COLUMN_MELI'], NAO_ENCONTRADO),
+    )
+    pares = filas_actuales[filas_actuales['UNIC_ID_SHOPEE'].isin(arrastrables)].merge(
+        filas_anteriores, on=['UNIC_ID_SHOPEE'] + NOMES_SHOPEE + ['N'], how='inner'
+    )
+
+    df_arrastrado = df_api.iloc[pares['POS_API'].to_numpy()].copy()
+    df_arrastrado['VALOR_ENCONTRADO'] = pares['VALOR_ENCONTRADO'].to_numpy()
+    df_arrastrado['COLUNA_ENCONTRADA_EM'] = pares['COLUNA_ENCONTRADA_EM'].to_numpy()
+    pos = np.nan_to_num(pares['POS_MELI'].to_numpy(), nan=-1).astype(np.int64)
+    meli_linhas = linhas_meli(df_meli, pos, colunas_meli).set_axis(df_arrastrado.index)
+    for col in colunas_meli:
+        df_arrastrado[col] = meli_linhas[col]
+
+    pos_pendientes = np.setdiff1d(todas, pares['POS_API'].to_numpy())
+    return df_arrastrado[colunas_resultado], pos_pendientes
+
+
+def juntar_con_arrastrados(df_resultado, pos_pendientes, df_arrastrado):
+    """Une lo recién cruzado (filas en el orden de pos_pendientes) con lo arrastrado, en el orden de df_api."""
+    df_resultado = df_resultado.set_axis(pos_pendientes)
+    if df_arrastrado.empty:
+        return df_resultado.reset_index(drop=True)
+    return pd.concat([df_resultado, df_arrastrado]).sort_index(kind='stable').reset_index(drop=True)
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+from common.busqueda import top_k_en_bloques
+from common.match_exato import COLUNAS_MELI
+from common.match_fuzzy import match_fuzzy
+
+# Similitud mínima de BERT para aceptar el mejor candidato (0.80 es un buen punto de partida)
+LIMIAR_SIMILARIDADE = 0.80
+
+# Cuántos candidatos se guardan por tienda: el primero decide el match, los demás quedan para revisión manual
+K_CANDIDATOS_BERT = 3
+
+
+def candidatos_meli(df_meli):
+    """
+    Textos candidatos de Meli: el nombre oficial y el de fantasía de cada TO. Devuelve df_textos_meli
+    (MATCH_MELI, IDX_MELI = índice en df_meli, COLUNA_ENCONTRADA_EM) y la clave "TO|columna" de cada candidato,
+    con la que el índice ANN se puede actualizar entre corridas.
+    """
+    candidatos = []
+    for col in ['OFS_NAME', 'OFS_FANTASY_NAME']:
+        for idx, val in df_meli[col].dropna().astype(str).items():
+            candidatos.append((val.strip(), idx, col))  # Almacenar texto, índice original y la columna
+
+    df_textos_meli = pd.DataFrame(candidatos, columns=['MATCH_MELI', 'IDX_MELI', 'COLUNA_ENCONTRADA_EM'])
+    claves_candidatos = [f"{df_meli.at[idx, 'OFS_OFFICIAL_STORE_ID']}|{col}" for _, idx, col in candidatos]
+    return df_textos_meli, claves_candidatos
+
+
+def match_lexico(nomes, df_meli, df_textos_meli):
+    """
+    Filtro léxico antes de BERT: errores de tipeo, espacios y sufijos (KIT, OFICIAL, ...) se resuelven acá mismo,
+    y para el resto se arma un bloque chico de candidatos parecidos, que es lo único que BERT tiene que puntuar.
+
+    Devuelve (df_matches_fuzzy, nomes sin resolver, bloques de esos nomes).
+    """
+    pos_fuzzy, score_fuzzy, bloques_fuzzy = match_fuzzy(
+        nomes, df_textos_meli['MATCH_MELI'].tolist(),
+        grupos=df_meli.loc[df_textos_meli['IDX_MELI'], 'OFS_OFFICIAL_STORE_ID'].to_numpy(),
+    )
+    resuelto_fuzzy = pos_fuzzy >= 0
+
+    mejores_fuzzy = df_textos_meli.iloc[pos_fuzzy[resuelto_fuzzy]].reset_index(drop=True)
+    df_matches_fuzzy = (
+        pd.DataFrame({
+            'USERNAME_SHOPEE': np.asarray(nomes, dtype=object)[resuelto_fuzzy],
+            'MATCH_MELI': mejores_fuzzy['MATCH_MELI'],
+            'SIMILARITY': score_fuzzy[resuelto_fuzzy] / 100,
+            'COLUNA_ENCONTRADA_EM': mejores_fuzzy['COLUNA_ENCONTRADA_EM'],
+        })
+        .join(df_meli.loc[mejores_fuzzy['IDX_MELI'], COLUNAS_MELI].reset_index(drop=True))
+    )
+    restantes = np.asarray(nomes, dtype=object)[~resuelto_fuzzy].tolist()
+    return df_matches_fuzzy, restantes, bloques_fuzzy[~resuelto_fuzzy]
+
+
+def candidatos_bert(nomes, bloques, df_textos_meli, claves_candidatos, encode, cache_embeddings, indice_meli,
+                    k=K_CANDIDATOS_BERT):
+    """
+    Los k mejores candidatos de Meli por similitud de embeddings para cada nombre (df_candidatos_bert: nombre,
+    RANK, SIMILARITY y el candidato de df_textos_meli).
+
+    Los embeddings pasan por `cache_embeddings` (solo se codifican los textos nuevos) y los candidatos de Meli se
+    sincronizan con `indice_meli` (IndiceIVF). Los nombres con bloque léxico se puntúan solo contra su bloque;
+    los que no tienen ningún candidato parecido por texto, contra todo el índice.
+    """
+    embeddings_shopee = cache_embeddings.codificar(nomes, encode)
+
+    posicao_candidato = pd.Series(np.arange(len(claves_candidatos)), index=claves_candidatos)
+    posicao_candidato = posicao_candidato[~posicao_candidato.index.duplicated()]
+    textos = df_textos_meli['MATCH_MELI'].to_numpy(dtype=object)
+    indice_meli.sincronizar(
+        posicao_candidato.index.tolist(),
+        textos[posicao_candidato.to_numpy()].tolist(),
+        lambda nuevos: cache_embeddings.codificar(nuevos, encode),
+    )
+
+    # (INDICE_ANN_NPROBE regula recall vs. velocidad; con pocos candidatos la búsqueda es exacta)
+    fila_no_indice = pd.Index(indice_meli.claves).get_indexer(claves_candidatos)
+    bloques_indice = np.where(bloques >= 0, fila_no_indice[np.maximum(bloques, 0)], -1)
+    com_bloque = (bloques_indice >= 0).any(axis=1)
+
+    indices_ann = np.full((len(nomes), k), -1, dtype=np.int64)
+    scores_top = np.full((len(nomes), k), -np.inf, dtype=np.float32)
+    indices_ann[com_bloque], scores_top[com_bloque] = top_k_en_bloques(
+        embeddings_shopee[com_bloque], indice_meli.vectores, bloques_indice[com_bloque], k=k
+    )
+    indices_ann[~com_bloque], scores_top[~com_bloque] = indice_meli.buscar(embeddings_shopee[~com_bloque], k=k)
+    print(f"BERT: {com_bloque.sum()} tiendas puntuadas solo contra su bloque, {(~com_bloque).sum()} contra todo el índice.")
+
+    encontrado = indices_ann.ravel() >= 0
+    indices_top = posicao_candidato.reindex(
+        np.asarray(indice_meli.claves, dtype=object)[indices_ann.ravel()[encontrado]]
+    ).to_numpy()
+
+    return pd.DataFrame({
+        'USERNAME_SHOPEE': np.repeat(np.asarray(nomes, dtype=object), k)[encontrado],
+        'RANK': np.tile(np.arange(1, k + 1), len(nomes))[encontrado],
+        'SIMILARITY': scores_top.ravel()[encontrado].astype(float),
+    }).join(df_textos_meli.iloc[indices_top].reset_index(drop=True))
+
+
+def matches_bert(df_candidatos_bert, df_meli, limiar=LIMIAR_SIMILARIDADE):
+    """Si la mejor similitud está por encima del umbral, es una coincidencia (con la fila completa de Meli)."""
+    mejores_bert = df_candidatos_bert[
+        (df_candidatos_bert['RANK'] == 1) & (df_candidatos_bert['SIMILARITY'] >= limiar)
+    ]
+    return (
+        mejores_bert[['USERNAME_SHOPEE', 'MATCH_MELI', 'SIMILARITY', 'COLUNA_ENCONTRADA_EM']]
+        .reset_index(drop=True)
+        .join(df_meli.loc[mejores_bert['IDX_MELI'], COLUNAS_MELI].reset_index(drop=True))
+    )
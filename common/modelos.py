@@ -0,0 +1,201 @@
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Modelos de cada etapa. Si MODELO_VERTICAL es el mismo que MODELO_MATCH, las dos etapas comparten una sola carga.
+MODELO_MATCH = os.environ.get("MODELO_MATCH", "paraphrase-MiniLM-L6-v2")
+MODELO_VERTICAL = os.environ.get("MODELO_VERTICAL", "paraphrase-multilingual-MiniLM-L12-v2")
+
+# Cómo se corre la inferencia en CPU: "torch" (fp32, como siempre), "int8" (cuantización dinámica de las capas
+# lineales) u "onnx" (ONNX Runtime, necesita sentence-transformers[onnx])
+BACKEND_MODELOS = os.environ.get("MODELOS_BACKEND", "torch")
+BACKENDS = ("torch", "int8", "onnx")
+
+# Antes de usar int8/onnx se compara contra torch con una muestra de los textos: si algún embedding queda por
+# debajo de esta similitud coseno con el original, se vuelve a torch
+MIN_COSENO_PARIDAD = float(os.environ.get("MODELOS_MIN_COSENO_PARIDAD", "0.99"))
+TAMANO_MUESTRA_PARIDAD = 64
+
+# Codificación en varios procesos: cantidad de procesos (1 = todo en este proceso), hilos de torch por proceso
+# (0 = los núcleos repartidos entre los procesos, así entre todos no piden más hilos que núcleos) y tamaño de lote
+# de model.encode
+PROCESOS_ENCODE = int(os.environ.get("MODELOS_PROCESOS", "1"))
+HILOS_POR_PROCESO = int(os.environ.get("MODELOS_HILOS_POR_PROCESO", "0"))
+TAMANO_LOTE_ENCODE = int(os.environ.get("MODELOS_TAMANO_LOTE", "32"))
+
+# Con menos textos que esto no compensa repartirlos: van enteros a un solo proceso del pool
+MIN_TEXTOS_PARALELO = int(os.environ.get("MODELOS_MIN_TEXTOS_PARALELO", "5000"))
+
+# Modelos ya cargados, por (nombre, backend)
+_MODELOS = {}
+
+# Modelo de cada proceso del pool (se carga una vez por proceso, en el initializer)
+_MODELO_PROCESO = None
+
+# Pools de procesos ya levantados, por (nombre, backend, procesos, hilos)
+_POOLS = {}
+
+
+def _cargar(nombre, backend):
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        return SentenceTransformer(nombre, backend="onnx")
+
+    modelo = SentenceTransformer(nombre, device="cpu")
+    if backend == "int8":
+        import torch
+
+        modelo = torch.quantization.quantize_dynamic(modelo, {torch.nn.Linear}, dtype=torch.qint8)
+    return modelo
+
+
+def obtener_modelo(nombre, backend=BACKEND_MODELOS):
+    """Devuelve el modelo, cargándolo la primera vez que se pide (después se reutiliza en todo el proceso)."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de modelos desconocido: {backend!r} (opciones: {', '.join(BACKENDS)})")
+    if (nombre, backend) not in _MODELOS:
+        print(f"🧠 Cargando el modelo {nombre} (backend {backend})...")
+        _MODELOS[(nombre, backend)] = _cargar(nombre, backend)
+    return _MODELOS[(nombre, backend)]
+
+
+def verificar_paridad(nombre, backend, textos, min_coseno=MIN_COSENO_PARIDAD):
+    """
+    Compara los embeddings de `backend` con los de torch (fp32) para los mismos textos.
+    Devuelve la similitud coseno mínima entre pares y si pasa el umbral.
+    """
+    referencia = np.asarray(obtener_modelo(nombre, "torch").encode(textos), dtype=np.float32)
+    candidato = np.asarray(obtener_modelo(nombre, backend).encode(textos), dtype=np.float32)
+    coseno = (referencia * candidato).sum(axis=1) / (
+        np.linalg.norm(referencia, axis=1) * np.linalg.norm(candidato, axis=1) + 1e-12
+    )
+    minimo = float(coseno.min()) if len(coseno) else 1.0
+    return minimo, minimo >= min_coseno
+
+
+def hilos_por_proceso(procesos, hilos=HILOS_POR_PROCESO):
+    """Hilos de torch de cada proceso del pool: los pedidos o, con 0, los núcleos repartidos entre los procesos."""
+    return hilos or max(1, (os.cpu_count() or 1) // procesos)
+
+
+def _iniciar_proceso(nombre, backend, hilos):
+    global _MODELO_PROCESO
+    import torch
+
+    torch.set_num_threads(hilos)
+    _MODELO_PROCESO = _cargar(nombre, backend)
+    # Así la verificación de paridad en este proceso reutiliza el modelo ya cargado
+    _MODELOS[(nombre, backend)] = _MODELO_PROCESO
+
+
+def _codificar_en_proceso(textos, tamano_lote):
+    return np.asarray(_MODELO_PROCESO.encode(textos, batch_size=tamano_lote), dtype=np.float32)
+
+
+def _paridad_en_proceso(nombre, backend, textos, min_coseno):
+    return verificar_paridad(nombre, backend, textos, min_coseno)
+
+
+def pool_de_procesos(nombre, backend, procesos, hilos=HILOS_POR_PROCESO):
+    """
+    Pool de `procesos` procesos, cada uno con su copia del modelo y sus hilos de torch. Se levanta la primera vez
+    que se pide y después se reutiliza.
+
+    Usa fork: los scripts corren de arriba a abajo sin `if __name__ == "__main__"`, y con spawn cada proceso
+    volvería a ejecutar el script entero. Por eso, con varios procesos, el proceso padre nunca carga el modelo
+    (ni para la paridad, ver Codificador): un fork con torch ya inicializado hereda su estado de hilos.
+    """
+    hilos = hilos_por_proceso(procesos, hilos)
+    clave = (nombre, backend, procesos, hilos)
+    if clave not in _POOLS:
+        if "torch" in sys.modules:
+            print("⚠️ torch ya está cargado en este proceso: los procesos del pool lo heredan con el fork.")
+        _POOLS[clave] = ProcessPoolExecutor(
+            max_workers=procesos,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_iniciar_proceso,
+            initargs=(nombre, backend, hilos),
+        )
+    return _POOLS[clave]
+
+
+def cerrar_pools(nombre, backend):
+    for clave in [clave for clave in _POOLS if clave[:2] == (nombre, backend)]:
+        _POOLS.pop(clave).shutdown()
+
+
+def codificar_en_paralelo(nombre, backend, textos, procesos, hilos=HILOS_POR_PROCESO, tamano_lote=TAMANO_LOTE_ENCODE):
+    """
+    Codifica `textos` en el pool de procesos y junta los embeddings en el mismo orden de entrada. Con al menos
+    MIN_TEXTOS_PARALELO textos se reparten en partes contiguas entre los procesos; con menos, van enteros a uno.
+    """
+    if not textos:
+        return np.empty((0, 0), dtype=np.float32)
+    pool = pool_de_procesos(nombre, backend, procesos, hilos)
+    # Varias partes por proceso, para que ninguno quede esperando al más lento
+    n_partes = procesos * 4 if len(textos) >= MIN_TEXTOS_PARALELO else 1
+    tamano_parte = -(-len(textos) // n_partes)
+    partes = [textos[i:i + tamano_parte] for i in range(0, len(textos), tamano_parte)]
+
+    # map devuelve los resultados en el orden de las partes, sin importar cuál proceso termina primero
+    resultados = list(pool.map(_codificar_en_proceso, partes, [tamano_lote] * len(partes)))
+    return np.vstack(resultados)
+
+
+class Codificador:
+    """
+    Función encode perezosa para un modelo: no carga nada hasta que se le pasan textos, así una corrida en la
+    que todo coincidió por nombre no paga torch ni la carga del modelo.
+
+    Con backend int8/onnx, la primera vez verifica la paridad contra torch con una muestra de los propios textos
+    y, si no alcanza, sigue con torch. `clave` identifica modelo + backend (para el caché de embeddings y el índice
+    ANN): como la verificación puede cambiar el backend, hay que llamar a `preparar` antes de usarla.
+    """
+
+    def __init__(self, nombre, backend=BACKEND_MODELOS, procesos=PROCESOS_ENCODE, tamano_lote=TAMANO_LOTE_ENCODE):
+        self.nombre = nombre
+        self.backend = backend
+        self.procesos = procesos
+        self.tamano_lote = tamano_lote
+        self._verificado = backend == "torch"
+
+    @property
+    def clave(self):
+        return self.nombre if self.backend == "torch" else f"{self.nombre}@{self.backend}"
+
+    def preparar(self, textos):
+        """
+        Verifica la paridad ya (con una muestra de `textos`) en vez de esperar al primer encode, así `clave` queda
+        fija con el backend que de verdad se va a usar. Con torch no hace nada.
+        """
+        muestra = list(textos)[:TAMANO_MUESTRA_PARIDAD]
+        if not self._verificado and muestra:
+            if self.procesos > 1:
+                # En un proceso del pool, para no cargar torch en este
+                minimo, ok = pool_de_procesos(self.nombre, self.backend, self.procesos).submit(
+                    _paridad_en_proceso, self.nombre, self.backend, muestra, MIN_COSENO_PARIDAD
+                ).result()
+            else:
+                minimo, ok = verificar_paridad(self.nombre, self.backend, muestra)
+            print(f"Paridad {self.backend} vs torch de {self.nombre}: coseno mínimo {minimo:.4f}")
+            if not ok:
+                print(f"⚠️ El backend {self.backend} no llega a {MIN_COSENO_PARIDAD}; se usa torch.")
+                cerrar_pools(self.nombre, self.backend)
+                self.backend = "torch"
+            self._verificado = True
+        return self
+
+    def __call__(self, textos):
+        textos = list(textos)
+        self.preparar(textos)
+
+        if self.procesos > 1:
+            # Con varios procesos todo se codifica en el pool, también los lotes chicos: este proceso nunca carga torch
+            print(f"🧠 Codificando {len(textos)} textos en {self.procesos} procesos ({self.nombre}).")
+            return codificar_en_paralelo(self.nombre, self.backend, textos, self.procesos, tamano_lote=self.tamano_lote)
+        modelo = obtener_modelo(self.nombre, self.backend)
+        return np.asarray(modelo.encode(textos, batch_size=self.tamano_lote), dtype=np.float32)
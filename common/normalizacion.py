@@ -0,0 +1,106 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Caracteres que se sacan o se cambian por espacio antes de normalizar, según de dónde viene el nombre.
+# "shopee" es lo que usaba limpiar_nome_marca en input_tabla_scraper.py;
+# "meli" es la versión de input_e_match.py (Mercado Libre y Sheets), que además limpia ? + @ #
+VARIANTES = {
+    'shopee': {
+        'eliminar': "!()'|,/=><",
+        'espacio': "_",
+    },
+    'meli': {
+        'eliminar': "!?@()'|,/=",
+        'espacio': "+#_",
+    },
+}
+
+# Tablas de traducción precompiladas: un solo str.translate en vez de una cadena de str.replace
+TABLAS = {
+    variante: str.maketrans({
+        **{c: None for c in chars['eliminar']},
+        **{c: ' ' for c in chars['espacio']},
+    })
+    for variante, chars in VARIANTES.items()
+}
+
+RE_AMPERSAND = re.compile(r'\s*&\s*')
+RE_ESPACIOS = re.compile(r'\s+')
+
+# Memo por variante: el mismo nombre crudo aparece en muchas categorías y en varias fuentes
+_CACHE = {variante: {} for variante in VARIANTES}
+
+
+def limpiar_cache():
+    for cache in _CACHE.values():
+        cache.clear()
+
+
+def _normalizar_unicos(valores, variante):
+    """Normaliza de forma vectorizada una lista de strings (sin nulos ni repetidos)."""
+    serie = pd.Series(valores, dtype=object)
+    return (
+        serie
+        .str.translate(TABLAS[variante])
+        # Reemplazar " & " o variantes con espacio por " E "
+        .str.replace(RE_AMPERSAND, ' E ', regex=True)
+        # Sacar tildes y acentos en general
+        .str.normalize('NFKD')
+        .str.encode('ascii', 'ignore')
+        .str.decode('utf-8')
+        # Quitar espacios repetidos, los del principio y del final, y pasar todo a MAYÚSCULAS
+        .str.replace(RE_ESPACIOS, ' ', regex=True)
+        .str.strip()
+        .str.upper()
+        .tolist()
+    )
+
+
+def normalizar_nomes(serie, variante='shopee'):
+    """
+    Versión vectorizada de limpiar_nome_marca para una columna entera.
+    Cada nombre distinto se normaliza una sola vez (y queda en el memo para las próximas columnas);
+    los nulos se devuelven tal cual, igual que antes.
+    """
+    cache = _CACHE[variante]
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=True)
+
+    nuevos = [valor for valor in unicos if valor not in cache]
+    if nuevos:
+        cache.update(zip(nuevos, _normalizar_unicos(nuevos, variante)))
+
+    normalizados = np.array([cache[valor] for valor in unicos] + [None], dtype=object)
+    resultado = pd.Series(normalizados[codigos], index=serie.index, name=serie.name, dtype=object)
+
+    # Los nulos quedan con su valor original (None, NaN o pd.NA)
+    nulos = codigos == -1
+    if nulos.any():
+        resultado[nulos] = serie[nulos]
+
+    if isinstance(serie.dtype, pd.StringDtype):
+        resultado = resultado.astype(serie.dtype)
+    return resultado
+
+
+def normalizar_tabla_shopee(df_shopee):
+    """
+    Nombres del archivo del crawler como los guarda la tabla: USERNAME_SHOPEE y BRAND_NAME_SHOPEE en mayúsculas
+    y con ".", "_", "-" cambiados por espacio; BRAND_NAME_SHOPEE además pasa por el normalizador compartido.
+    Modifica y devuelve df_shopee.
+    """
+    for col in ('USERNAME_SHOPEE', 'BRAND_NAME_SHOPEE'):
+        df_shopee[col] = df_shopee[col].str.upper().str.replace(r'[._-]', ' ', regex=True)
+    df_shopee['BRAND_NAME_SHOPEE'] = normalizar_nomes(df_shopee['BRAND_NAME_SHOPEE'], variante='shopee')
+    return df_shopee
+
+
+def limpiar_nome_marca(nome, variante='shopee'):
+    """Normaliza un solo nombre (mismas reglas y mismo memo que normalizar_nomes)."""
+    if pd.isna(nome):
+        return nome
+    cache = _CACHE[variante]
+    if nome not in cache:
+        cache[nome] = _normalizar_unicos([nome], variante)[0]
+    return cache[nome]
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import runpy
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from common.instrumentacion import Instrumentador
+
+# Carpeta de los artefactos de cada etapa (Parquet) y de las marcas de etapas ya hechas
+DIR_ARTEFACTOS = os.environ.get("PIPELINE_ARTEFACTOS", "artefactos_pipeline")
+
+# Etapas que se recalculan aunque tengan artefacto (separadas por coma), p. ej. PIPELINE_FORZAR=meli,sheets
+FORZAR = {e.strip() for e in os.environ.get("PIPELINE_FORZAR", "").split(",") if e.strip()}
+
+
+def huella(valor):
+    """Hash estable de una entrada: los DataFrames por contenido (columnas + valores), el resto por su JSON."""
+    h = hashlib.sha256()
+    if isinstance(valor, pd.DataFrame):
+        h.update(json.dumps([str(c) for c in valor.columns]).encode())
+        h.update(pd.util.hash_pandas_object(valor, index=False).values.tobytes())
+    else:
+        h.update(json.dumps(valor, default=str, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def clave_etapa(etapa, *entradas):
+    return huella([etapa] + [huella(e) for e in entradas])[:16]
+
+
+def _guardar(df, ruta):
+    tmp = ruta.with_name(ruta.name + ".tmp")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, ruta)
+
+
+def en_cache(etapa, calcular, *entradas, dir_artefactos=DIR_ARTEFACTOS):
+    """
+    Resultado (DataFrame) de una etapa, guardado como Parquet bajo la clave de sus entradas.
+
+    Si ya hay un artefacto con la misma clave se lee de disco y `calcular` no se llama; si no, se calcula y se
+    guarda. Las entradas pueden ser DataFrames (se hashea el contenido) o cualquier valor serializable (la
+    consulta, la fecha de la corrida, ...).
+    """
+    carpeta = Path(dir_artefactos)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    ruta = carpeta / f"{etapa}-{clave_etapa(etapa, *entradas)}.parquet"
+
+    if ruta.exists() and etapa not in FORZAR:
+        print(f"♻️ Etapa {etapa}: se reutiliza {ruta}")
+        return pd.read_parquet(ruta)
+
+    df = calcular()
+    _guardar(df, ruta)
+    print(f"💾 Etapa {etapa}: resultado guardado en {ruta} ({len(df)} filas)")
+    return df
+
+
+def una_vez(etapa, accion, *entradas, dir_artefactos=DIR_ARTEFACTOS):
+    """
+    Corre `accion` (una etapa con efectos, como una carga que no es idempotente) solo si no se completó antes
+    con las mismas entradas. La marca se escribe recién cuando `accion` termina sin error.
+    """
+    carpeta = Path(dir_artefactos)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    marca = carpeta / f"{etapa}-{clave_etapa(etapa, *entradas)}.hecha"
+
+    if marca.exists() and etapa not in FORZAR:
+        print(f"♻️ Etapa {etapa}: ya se completó ({marca}), no se repite")
+        return None
+
+    resultado = accion()
+    marca.write_text(datetime.now().isoformat())
+    return resultado
+
+
+@dataclass
+class Etapa:
+    """Un script del pipeline. `hecha` (opcional) dice si ya no hace falta correrlo."""
+    nombre: str
+    script: str
+    hecha: object = None
+
+
+def correr_etapas(etapas, desde=None, hasta=None):
+    """
+    Corre los scripts en orden y en este mismo proceso (así comparten el cliente de BigQuery y los modelos ya
+    cargados). `desde` / `hasta` recortan la lista por nombre de etapa.
+    """
+    nombres = [e.nombre for e in etapas]
+    inicio = nombres.index(desde) if desde else 0
+    fin = nombres.index(hasta) + 1 if hasta else len(etapas)
+
+    metricas = Instrumentador('pipeline')
+    for etapa in etapas[inicio:fin]:
+        if etapa.hecha is not None and etapa.hecha() and etapa.nombre not in FORZAR:
+            print(f"\n⏭️ Etapa {etapa.nombre}: ya está hecha, se saltea.")
+            continue
+
+        print(f"\n▶️ Etapa {etapa.nombre} ({etapa.script})")
+        script = str(Path(etapa.script).resolve())
+        # Cada script importa sus módulos hermanos como si lo corrieran desde su carpeta
+        sys.path.insert(0, str(Path(script).parent))
+        try:
+            # El total de cada script (el detalle por paso lo deja cada script con su propio Instrumentador)
+            with metricas.etapa(etapa.nombre):
+                runpy.run_path(script, run_name="__main__")
+        finally:
+            sys.path.remove(str(Path(script).parent))
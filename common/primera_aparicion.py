@@ -0,0 +1,190 @@
+import sqlite3
+
+import pandas as pd
+
+from common.consultas import Consulta, TABLA_BRANDS, aplicar_tipos, leer
+from common.registro_unic_ids import RUTA_REGISTRO
+from common.upsert import upsert
+
+# Tabla lateral chiquita con la primera aparición de cada UNIC_ID (una fila por marca, no por scraping)
+TABLA_FIRST_APPEARENCE = 'ddme000418-dn88p8g386x-furyid.TBL.DM_SHOPEE_OFFICIAL_BRANDS_FIRST_APPEARENCE'
+
+# Sin zona horaria, como FIRST_APPEARENCE y DATE_SCRAPING en DM_SHOPEE_OFFICIAL_BRANDS (DATETIME)
+TIPOS_FIRST_APPEARENCE = {
+    'UNIC_ID':          'object',
+    'FIRST_APPEARENCE': 'datetime64[ns]',
+}
+
+CONSULTA_TABLA_LATERAL = Consulta(TABLA_FIRST_APPEARENCE, TIPOS_FIRST_APPEARENCE)
+
+# Solo para la primera vez: la primera aparición de cada marca calculada adentro de BigQuery a partir del histórico
+# (vuelve una fila por UNIC_ID, no se baja la tabla entera)
+SQL_SEMILLA = """
+SELECT
+    UNIC_ID,
+    MIN(COALESCE(FIRST_APPEARENCE, DATE_SCRAPING)) AS FIRST_APPEARENCE
+FROM {tabla}
+WHERE UNIC_ID IS NOT NULL
+GROUP BY UNIC_ID
+"""
+
+_FORMATO = '%Y-%m-%d %H:%M:%S'
+
+
+class IndicePrimeraAparicion:
+    """
+    Índice local UNIC_ID -> FIRST_APPEARENCE (en UTC), en el mismo archivo SQLite del registro de UNIC_IDs.
+    Con él, cada scraping nuevo se estampa al cargarlo mirando solo sus propias filas. Solo se puede estampar
+    después de sembrarlo una vez con el histórico (ver preparar_indice).
+
+    Las fechas nuevas o corregidas quedan como pendientes hasta que llegan a la tabla lateral (ver
+    sincronizar_tabla_lateral), así una sincronización que falla se reintenta en la corrida siguiente.
+    """
+
+    def __init__(self, ruta=RUTA_REGISTRO):
+        self.conn = sqlite3.connect(ruta)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS first_appearence (
+                unic_id           TEXT PRIMARY KEY,
+                first_appearence  TEXT NOT NULL,
+                pendiente         INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        # Índices creados antes de que existiera la columna de pendientes
+        columnas = {fila[1] for fila in self.conn.execute("PRAGMA table_info(first_appearence)")}
+        if 'pendiente' not in columnas:
+            self.conn.execute("ALTER TABLE first_appearence ADD COLUMN pendiente INTEGER NOT NULL DEFAULT 0")
+        # Marca de que el histórico ya se cargó: que el índice tenga filas no alcanza, porque una corrida sin la
+        # semilla podría haber dejado solo las fechas de su propio scraping
+        self.conn.execute("CREATE TABLE IF NOT EXISTS first_appearence_semilla (sembrado_en TEXT NOT NULL)")
+
+    def vacio(self):
+        return self.conn.execute("SELECT COUNT(*) FROM first_appearence").fetchone()[0] == 0
+
+    def sembrado(self):
+        return self.conn.execute("SELECT 1 FROM first_appearence_semilla LIMIT 1").fetchone() is not None
+
+    def _insertar(self, df, pendiente):
+        fechas = pd.to_datetime(df['FIRST_APPEARENCE'], utc=True).dt.strftime(_FORMATO)
+        # Solo queda pendiente si la fecha de verdad cambió (si ya había una más vieja, todo sigue igual)
+        self.conn.executemany("""
+            INSERT INTO first_appearence (unic_id, first_appearence, pendiente) VALUES (?, ?, ?)
+            ON CONFLICT (unic_id) DO UPDATE SET
+                pendiente = CASE WHEN excluded.first_appearence < first_appearence THEN excluded.pendiente ELSE pendiente END,
+                first_appearence = MIN(first_appearence, excluded.first_appearence)
+        """, [(unic_id, fecha, int(pendiente)) for unic_id, fecha in zip(df['UNIC_ID'], fechas)])
+
+    def registrar(self, df):
+        """
+        Guarda (UNIC_ID, FIRST_APPEARENCE), pendientes para la tabla lateral; si el UNIC_ID ya estaba, se queda con
+        la fecha más vieja. Se llama recién cuando esas fechas ya quedaron cargadas en la tabla de marcas.
+        """
+        with self.conn:
+            self._insertar(df, pendiente=True)
+
+    def pendientes(self):
+        """UNIC_ID/FIRST_APPEARENCE (sin zona horaria, como en la tabla lateral) que todavía no llegaron a la tabla lateral."""
+        df = pd.read_sql_query(
+            "SELECT unic_id AS UNIC_ID, first_appearence AS FIRST_APPEARENCE FROM first_appearence WHERE pendiente = 1",
+            self.conn,
+        )
+        df['FIRST_APPEARENCE'] = pd.to_datetime(df['FIRST_APPEARENCE'])
+        return df
+
+    def marcar_sincronizados(self, df):
+        """Saca de pendientes las filas enviadas (si la fecha no cambió mientras tanto)."""
+        fechas = pd.to_datetime(df['FIRST_APPEARENCE']).dt.strftime(_FORMATO)
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE first_appearence SET pendiente = 0 WHERE unic_id = ? AND first_appearence = ?",
+                list(zip(df['UNIC_ID'], fechas)),
+            )
+
+    def sembrar(self, df):
+        """Registra el histórico y marca el índice como sembrado, todo en la misma transacción."""
+        with self.conn:
+            self._insertar(df, pendiente=False)
+            self.conn.execute(
+                "INSERT INTO first_appearence_semilla (sembrado_en) VALUES (?)",
+                (pd.Timestamp.now(tz='UTC').strftime(_FORMATO),),
+            )
+
+    def buscar(self, unic_ids):
+        """Serie UNIC_ID -> FIRST_APPEARENCE (UTC) de los IDs que ya están en el índice."""
+        unic_ids = list(unic_ids)
+        filas = []
+        for i in range(0, len(unic_ids), 900):
+            lote = unic_ids[i:i + 900]
+            filas += self.conn.execute(
+                f"SELECT unic_id, first_appearence FROM first_appearence WHERE unic_id IN ({', '.join('?' * len(lote))})",
+                lote,
+            ).fetchall()
+        serie = pd.Series(dict(filas), dtype=object)
+        return pd.to_datetime(serie, utc=True) if not serie.empty else serie.astype('datetime64[ns, UTC]')
+
+    def estampar(self, df):
+        """
+        Calcula FIRST_APPEARENCE para las filas de un scraping nuevo, en O(filas nuevas).
+
+        Los UNIC_ID que ya estaban conservan su fecha; los nuevos toman su menor DATE_SCRAPING del lote (y si el
+        lote trae una fecha anterior a la guardada, gana la del lote). Devuelve (serie alineada con df, DataFrame
+        UNIC_ID/FIRST_APPEARENCE con lo que cambia en el índice).
+
+        No guarda nada: los cambios se pasan a registrar cuando la carga del scraping salió bien, así una carga
+        que falla no deja en el índice fechas que la tabla no tiene.
+        """
+        if not self.sembrado():
+            raise RuntimeError("El índice de FIRST_APPEARENCE no está sembrado con el histórico; no se estampa")
+
+        fechas = pd.to_datetime(df['DATE_SCRAPING'], utc=True)
+        minimo_lote = fechas.groupby(df['UNIC_ID']).min()
+        guardado = self.buscar(minimo_lote.index)
+
+        actual = guardado.reindex(minimo_lote.index)
+        nuevo = actual.where(actual.notna() & (actual <= minimo_lote), minimo_lote)
+        cambios = nuevo[(nuevo != actual) & nuevo.notna()].rename('FIRST_APPEARENCE').rename_axis('UNIC_ID').reset_index()
+
+        first = df['UNIC_ID'].map(nuevo)
+        # Mismo tipo de fecha que DATE_SCRAPING en el DataFrame (con o sin zona horaria)
+        if getattr(df['DATE_SCRAPING'].dtype, 'tz', None) is None:
+            first = first.dt.tz_localize(None)
+        return first, cambios
+
+    def cerrar(self):
+        self.conn.close()
+
+
+def preparar_indice(backend, indice):
+    """
+    Deja el índice local listo. Si todavía no se sembró lo llena desde la tabla lateral; si la tabla lateral todavía
+    no existe (o está vacía), se arma una sola vez agregando el histórico en BigQuery y se crea la tabla lateral.
+    Si la lectura del histórico falla, la excepción sigue de largo y el índice queda sin sembrar.
+    """
+    if indice.sembrado():
+        return
+
+    try:
+        df = leer(backend, CONSULTA_TABLA_LATERAL)
+    except Exception as e:
+        print(f"Tabla lateral de FIRST_APPEARENCE no disponible ({e}); se arma desde el histórico.")
+        df = pd.DataFrame(columns=list(TIPOS_FIRST_APPEARENCE))
+
+    if df.empty:
+        tabla = f"`{TABLA_BRANDS}`" if backend.dialecto == 'bigquery' else TABLA_BRANDS.split('.')[-1]
+        df = aplicar_tipos(backend.consultar(SQL_SEMILLA.format(tabla=tabla)), TIPOS_FIRST_APPEARENCE)
+        backend.escribir(df, TABLA_FIRST_APPEARENCE, create_disposition="CREATE_IF_NEEDED", mode="replace")
+
+    indice.sembrar(df.dropna(subset=['FIRST_APPEARENCE']))
+    print(f"Índice de FIRST_APPEARENCE cargado con {len(df)} UNIC_IDs.")
+
+
+def sincronizar_tabla_lateral(backend, indice):
+    """
+    Manda a la tabla lateral solo los UNIC_ID nuevos o con fecha corregida: los pendientes del índice, también los
+    que quedaron de una corrida en la que esto falló. Recién después de que el upsert sale bien dejan de estar
+    pendientes.
+    """
+    pendientes = indice.pendientes()
+    resultado = upsert(backend, pendientes, TABLA_FIRST_APPEARENCE, claves=('UNIC_ID',), tipos=TIPOS_FIRST_APPEARENCE)
+    indice.marcar_sincronizados(pendientes)
+    return resultado
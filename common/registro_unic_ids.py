@@ -0,0 +1,103 @@
+import os
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+# Archivo local con el registro marca -> UNIC_ID (se puede cambiar por variable de entorno)
+RUTA_REGISTRO = os.environ.get("UNIC_ID_REGISTRO", "registro_unic_ids.sqlite3")
+
+# SQLite no acepta más de 999 parámetros por consulta en versiones viejas
+_TAMANO_LOTE = 900
+
+
+class RegistroUnicIds:
+    """
+    Registro local y compacto de marca -> UNIC_ID en SQLite.
+
+    Reemplaza el SELECT * de DM_SHOPEE_OFFICIAL_BRANDS que se hacía en cada corrida solo para saber qué IDs
+    existían: se siembra una vez desde el histórico y después se actualiza de a poco con las marcas nuevas.
+    """
+
+    def __init__(self, ruta=RUTA_REGISTRO):
+        self.ruta = ruta
+        self.conn = sqlite3.connect(ruta)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS unic_ids (
+                brand    TEXT PRIMARY KEY,
+                unic_id  TEXT NOT NULL,
+                shopid   INTEGER,
+                creado   TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_unic_ids_unic_id ON unic_ids (unic_id);
+            CREATE TABLE IF NOT EXISTS unic_ids_historicos (
+                unic_id  TEXT PRIMARY KEY
+            );
+        """)
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM unic_ids").fetchone()[0]
+
+    def vacio(self):
+        return len(self) == 0
+
+    def historico_cargado(self):
+        return self.conn.execute("SELECT 1 FROM unic_ids_historicos LIMIT 1").fetchone() is not None
+
+    def necesita_semilla(self):
+        """Vacío, o de antes de que se guardaran todos los IDs del histórico como ocupados: hay que (re)sembrarlo."""
+        return self.vacio() or not self.historico_cargado()
+
+    def sembrar(self, df_historico):
+        """
+        Carga (o actualiza) el registro con las columnas BRAND_NAME_SHOPEE, SHOPID, UNIC_ID del histórico.
+        Si una marca tiene más de un ID en el histórico gana el último, igual que el dict(zip(...)) de antes, pero
+        todos los IDs del histórico quedan como ocupados, así el probing nunca reparte uno que ya se usó.
+        """
+        df = df_historico[['BRAND_NAME_SHOPEE', 'SHOPID', 'UNIC_ID']].dropna(subset=['UNIC_ID'])
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO unic_ids_historicos (unic_id) VALUES (?)",
+                [(unic_id,) for unic_id in df['UNIC_ID'].astype(str).unique()],
+            )
+        df = df.assign(BRAND_NAME_SHOPEE=df['BRAND_NAME_SHOPEE'].astype(object).fillna(''))
+        df = df.drop_duplicates('BRAND_NAME_SHOPEE', keep='last')
+        self.registrar(df['BRAND_NAME_SHOPEE'].tolist(), df['UNIC_ID'].tolist(), df['SHOPID'].tolist())
+        print(f"Registro de UNIC_IDs sembrado con {len(df)} marcas ({self.ruta})")
+
+    def registrar(self, brands, unic_ids, shopids):
+        creado = datetime.now().isoformat()
+        filas = [
+            (brand, unic_id, None if pd.isna(shopid) else int(shopid), creado)
+            for brand, unic_id, shopid in zip(brands, unic_ids, shopids)
+        ]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO unic_ids (brand, unic_id, shopid, creado) VALUES (?, ?, ?, ?)", filas
+            )
+
+    def _consultar_en_lotes(self, sql, valores):
+        valores = list(valores)
+        for i in range(0, len(valores), _TAMANO_LOTE):
+            lote = valores[i:i + _TAMANO_LOTE]
+            marcadores = ", ".join("?" * len(lote))
+            yield from self.conn.execute(sql.format(marcadores=marcadores), lote)
+
+    def buscar(self, brands):
+        """Serie brand -> UNIC_ID con las marcas que ya están registradas."""
+        filas = list(self._consultar_en_lotes(
+            "SELECT brand, unic_id FROM unic_ids WHERE brand IN ({marcadores})", brands
+        ))
+        return pd.Series(dict(filas), dtype=object)
+
+    def ocupados(self, candidatos):
+        """De un set de IDs candidatos, devuelve los que ya están en uso (en el registro o en el histórico)."""
+        candidatos = list(candidatos)
+        return {fila[0] for fila in self._consultar_en_lotes(
+            "SELECT unic_id FROM unic_ids WHERE unic_id IN ({marcadores})", candidatos
+        )} | {fila[0] for fila in self._consultar_en_lotes(
+            "SELECT unic_id FROM unic_ids_historicos WHERE unic_id IN ({marcadores})", candidatos
+        )}
+
+    def cerrar(self):
+        self.conn.close()
@@ -0,0 +1,15 @@
+import pandas as pd
+
+
+def deduplicar_tiendas(df_meli, columna_nome='OFS_FANTASY_NAME', columna_status='OFS_STATUS',
+                       columna_fecha='AUD_UPD_DTTM'):
+    """
+    Deja una sola fila por (nombre de fantasía, estado): la de AUD_UPD_DTTM más reciente. Los nombres con un
+    solo registro no se tocan.
+
+    Un solo sort + drop_duplicates. Igual que antes, las filas sin nombre de fantasía quedan afuera y el
+    resultado sale ordenado por nombre de fantasía (y, dentro del mismo nombre, de la más reciente a la más vieja).
+    """
+    df = df_meli[df_meli[columna_nome].notna()]
+    df = df.sort_values([columna_nome, columna_fecha], ascending=[True, False], kind='stable')
+    return df.drop_duplicates(subset=[columna_nome, columna_status], keep='first').reset_index(drop=True)
@@ -0,0 +1,102 @@
+import hashlib
+import hmac
+import os
+import string
+
+import numpy as np
+import pandas as pd
+
+# Los UNIC_ID son 5 caracteres de letras mayúsculas y dígitos
+ALFABETO = string.ascii_uppercase + string.digits
+LARGO_ID = 5
+TOTAL_IDS = len(ALFABETO) ** LARGO_ID
+
+# Clave del hash de los IDs determinísticos. Si se cambia, las marcas nuevas pasan a recibir otros IDs
+# (las que ya están en el registro no cambian)
+CLAVE_UNIC_ID = os.environ.get("UNIC_ID_CLAVE", "DM_SHOPEE_OFFICIAL_BRANDS").encode('utf-8')
+
+# Tope de probing por marca (con el espacio casi vacío casi siempre alcanza el primer intento)
+MAX_INTENTOS = 1000
+
+_ALFABETO_ARRAY = np.array(list(ALFABETO))
+_POTENCIAS = len(ALFABETO) ** np.arange(LARGO_ID - 1, -1, -1, dtype=np.int64)
+
+
+def numeros_a_ids(numeros):
+    """Pasa números del espacio de IDs (base 36) a sus 5 caracteres, vectorizado."""
+    numeros = np.asarray(numeros, dtype=np.int64)
+    digitos = (numeros[:, None] // _POTENCIAS) % len(ALFABETO)
+    return np.ascontiguousarray(_ALFABETO_ARRAY[digitos]).view(f'<U{LARGO_ID}').ravel()
+
+
+def numero_deterministico(brand, intento=0, clave=None):
+    """Hash con clave (HMAC-SHA256) del nombre normalizado + número de intento, llevado al espacio de 36^5 IDs."""
+    clave = clave if clave is not None else CLAVE_UNIC_ID
+    digest = hmac.new(clave, f"{brand}\x00{intento}".encode('utf-8'), hashlib.sha256).digest()
+    return int.from_bytes(digest[:8], 'big') % TOTAL_IDS
+
+
+def gerar_unic_ids(brands, buscar_ocupados, clave=None):
+    """
+    Genera el UNIC_ID de cada marca nueva de forma determinística: el ID es el hash de su nombre, y si ese ID ya
+    está ocupado se prueba con el intento 1, 2, ... (probing). La misma marca con el mismo registro siempre
+    recibe el mismo ID, sin sorteos.
+
+    `buscar_ocupados` recibe un set de IDs candidatos y devuelve cuáles ya están en uso; se llama una vez por
+    ronda con todos los candidatos juntos, no una vez por marca.
+    """
+    asignados = {}
+    reservados = set()
+    pendientes = list(dict.fromkeys(brands))
+    intento = 0
+    while pendientes:
+        if intento >= MAX_INTENTOS:
+            raise ValueError(f"No se encontró UNIC_ID libre para {len(pendientes)} marcas después de {MAX_INTENTOS} intentos")
+        candidatos = dict(zip(
+            pendientes,
+            numeros_a_ids([numero_deterministico(b, intento, clave) for b in pendientes]).tolist()
+        ))
+        ocupados = buscar_ocupados(set(candidatos.values()))
+
+        siguientes = []
+        for brand in pendientes:
+            candidato = candidatos[brand]
+            if candidato in ocupados or candidato in reservados:
+                siguientes.append(brand)  # Colisión: esta marca prueba el próximo intento
+            else:
+                asignados[brand] = candidato
+                reservados.add(candidato)
+        pendientes = siguientes
+        intento += 1
+
+    return [asignados[brand] for brand in brands]
+
+
+def atribuir_unic_ids(df_shopee, registro):
+    """
+    Asigna UNIC_ID a cada fila de df_shopee según BRAND_NAME_SHOPEE, usando el registro local de IDs.
+
+    Las marcas que ya están en el registro reutilizan su UNIC_ID (un solo join). Las marcas nuevas reciben su
+    ID determinístico, se guardan en el registro y, si una marca nueva se repite en varias categorías, todas sus
+    filas comparten el ID.
+
+    Devuelve (serie de UNIC_ID alineada con df_shopee, DataFrame de nuevas marcas con
+    BRAND_NAME_SHOPEE, SHOPID, UNIC_ID en el orden en que aparecieron por primera vez).
+    """
+    # Las marcas sin nombre van todas a la misma clave vacía (antes también compartían un único ID)
+    brands = df_shopee['BRAND_NAME_SHOPEE'].astype(object).fillna('')
+    unic_ids = brands.map(registro.buscar(brands.unique())).astype(object)
+
+    # Marcas nuevas: primera aparición de cada una (con su SHOPID, como antes)
+    sem_id = unic_ids.isna()
+    primeras = ~brands.duplicated() & sem_id
+    novas_lojas_df = df_shopee.loc[primeras, ['BRAND_NAME_SHOPEE', 'SHOPID']].reset_index(drop=True)
+    novas_brands = brands[primeras].tolist()
+    novas_lojas_df['UNIC_ID'] = gerar_unic_ids(novas_brands, registro.ocupados)
+
+    if not novas_lojas_df.empty:
+        registro.registrar(novas_brands, novas_lojas_df['UNIC_ID'].tolist(), novas_lojas_df['SHOPID'].tolist())
+        mapa_novas = pd.Series(novas_lojas_df['UNIC_ID'].values, index=novas_brands)
+        unic_ids[sem_id] = brands[sem_id].map(mapa_novas)
+
+    return unic_ids, novas_lojas_df
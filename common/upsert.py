@@ -0,0 +1,108 @@
+from common.consultas import TABLA_BRANDS, TIPOS_BRANDS, aplicar_tipos
+
+# Clave de cada fila de DM_SHOPEE_OFFICIAL_BRANDS. Además de UNIC_ID + DATE_SCRAPING van CATEGORY_ID y SHOPID:
+# la misma marca aparece una vez por categoría en cada scraping (y en la Página Principal), y dos tiendas con el
+# mismo nombre de marca comparten UNIC_ID, así que el par solo no identifica una fila y el MERGE fallaría por
+# tener más de una fila de origen para la misma fila de destino.
+CLAVES_BRANDS = ('UNIC_ID', 'DATE_SCRAPING', 'CATEGORY_ID', 'SHOPID')
+
+
+def _nombre(tabla, dialecto):
+    return f"`{tabla}`" if dialecto == 'bigquery' else tabla.split('.')[-1]
+
+
+def _distinto(a, b, dialecto):
+    """Comparación que trata NULL como un valor más (NULL vs NULL no es un cambio)."""
+    return f"{a} IS DISTINCT FROM {b}" if dialecto == 'bigquery' else f"{a} IS NOT {b}"
+
+
+def sql_conteo(tabla, staging, columnas, claves, dialecto='bigquery'):
+    """Cuenta, antes del MERGE, cuántas filas de staging son nuevas y cuántas cambian algo en la tabla."""
+    on = " AND ".join(f"t.{c} = s.{c}" for c in claves)
+    valores = [c for c in columnas if c not in claves]
+    cambio = " OR ".join(_distinto(f"t.{c}", f"s.{c}", dialecto) for c in valores) or "FALSE"
+    return (
+        f"SELECT\n"
+        f"    SUM(CASE WHEN t.{claves[0]} IS NULL THEN 1 ELSE 0 END) AS INSERTADOS,\n"
+        f"    SUM(CASE WHEN t.{claves[0]} IS NOT NULL AND ({cambio}) THEN 1 ELSE 0 END) AS ACTUALIZADOS\n"
+        f"FROM {_nombre(staging, dialecto)} s\n"
+        f"LEFT JOIN {_nombre(tabla, dialecto)} t ON {on}"
+    )
+
+
+def sql_merge(tabla, staging, columnas, claves, insertar=True, dialecto='bigquery'):
+    """
+    Arma el upsert por clave: actualiza solo las filas que cambiaron y, si `insertar`, agrega las que no existen.
+    En BigQuery es un MERGE; en el backend local (SQLite, que no tiene MERGE) son un UPDATE ... FROM + INSERT.
+    Devuelve la lista de sentencias a ejecutar.
+    """
+    valores = [c for c in columnas if c not in claves]
+    t, s = _nombre(tabla, dialecto), _nombre(staging, dialecto)
+
+    if dialecto == 'bigquery':
+        on = " AND ".join(f"t.{c} = s.{c}" for c in claves)
+        sql = f"MERGE {t} t\nUSING {s} s\nON {on}"
+        if valores:
+            cambio = " OR ".join(_distinto(f"t.{c}", f"s.{c}", dialecto) for c in valores)
+            sets = ", ".join(f"{c} = s.{c}" for c in valores)
+            sql += f"\nWHEN MATCHED AND ({cambio}) THEN\n  UPDATE SET {sets}"
+        if insertar:
+            cols = ", ".join(columnas)
+            sql += f"\nWHEN NOT MATCHED THEN\n  INSERT ({cols}) VALUES ({', '.join('s.' + c for c in columnas)})"
+        return [sql]
+
+    sentencias = []
+    if valores:
+        on = " AND ".join(f"{t}.{c} = s.{c}" for c in claves)
+        cambio = " OR ".join(_distinto(f"{t}.{c}", f"s.{c}", dialecto) for c in valores)
+        sets = ", ".join(f"{c} = s.{c}" for c in valores)
+        sentencias.append(f"UPDATE {t} SET {sets}\nFROM {s} s\nWHERE {on} AND ({cambio})")
+    if insertar:
+        on = " AND ".join(f"x.{c} = s.{c}" for c in claves)
+        cols = ", ".join(columnas)
+        sentencias.append(
+            f"INSERT INTO {t} ({cols})\nSELECT {', '.join('s.' + c for c in columnas)} FROM {s} s\n"
+            f"WHERE NOT EXISTS (SELECT 1 FROM {t} x WHERE {on})"
+        )
+    return sentencias
+
+
+def upsert(backend, df, tabla=TABLA_BRANDS, claves=CLAVES_BRANDS, insertar=True, tipos=TIPOS_BRANDS):
+    """
+    Sube `df` a una tabla de staging y aplica un MERGE por `claves` sobre `tabla`.
+
+    Solo se tocan las columnas que vienen en `df`: para corregir una columna alcanza con mandar las claves y esa
+    columna, de las filas que cambiaron (con insertar=False para no crear filas nuevas). Las filas que ya están
+    iguales no se reescriben. Devuelve {'insertados': n, 'actualizados': n}.
+
+    Antes de subirlo, `df` se castea a `tipos` (los de la tabla): si staging quedara con otro tipo (por ejemplo
+    TIMESTAMP contra DATETIME), el ON y el INSERT del MERGE fallarían en BigQuery.
+    """
+    claves = list(claves)
+    faltan = [c for c in claves if c not in df.columns]
+    if faltan:
+        raise ValueError(f"Faltan columnas clave para el upsert: {faltan}")
+    repetidas = df.duplicated(subset=claves).sum()
+    if repetidas:
+        raise ValueError(f"Hay {repetidas} filas con la clave {claves} repetida; el MERGE no puede aplicarlas")
+
+    if df.empty:
+        return {'insertados': 0, 'actualizados': 0}
+
+    df = aplicar_tipos(df, tipos)
+    columnas = list(df.columns)
+    staging = f"{tabla}_STAGING"
+    backend.escribir(df, staging, create_disposition="CREATE_IF_NEEDED", mode="replace")
+
+    conteo = backend.consultar(sql_conteo(tabla, staging, columnas, claves, backend.dialecto))
+    resultado = {
+        'insertados': int(conteo['INSERTADOS'].fillna(0).iloc[0]) if insertar else 0,
+        'actualizados': int(conteo['ACTUALIZADOS'].fillna(0).iloc[0]),
+    }
+
+    for sentencia in sql_merge(tabla, staging, columnas, claves, insertar, backend.dialecto):
+        backend.ejecutar(sentencia)
+    backend.ejecutar(f"DROP TABLE IF EXISTS {_nombre(staging, backend.dialecto)}")
+
+    print(f"Upsert en {tabla}: {resultado['insertados']} filas nuevas, {resultado['actualizados']} actualizadas.")
+    return resultado
@@ -0,0 +1,72 @@
+import json
+import os
+
+import pandas as pd
+
+from common.busqueda import top_k
+from common.modelos import MODELO_VERTICAL
+
+# Nuestros segmentos de verticales definidos
+VERTICAIS = [
+    "SPORTS", "T & B", "ENTERTAINMENT", "CONSTRUCTION & INDUSTRY",
+    "HOME ELECTRONICS", "TECHNOLOGY", "OTHERS", "VEHICLE PARTS & ACCESSORIES",
+    "FASHION", "BEAUTY", "HEALTH", "FURNISHING & HOUSEWARE", "CPG"
+]
+
+# Mapeo manual para categorías que ya tienen una vertical clara (siempre gana sobre BERT)
+MAPEAMENTO_MANUAL = {
+    "Alimentos e Bebidas": "CPG",
+    "Brinquedos e Hobbies": "T & B",
+    "Eletônicos, Áudio e Vídeo": "HOME ELECTRONICS",
+    "Eletrônicos, Áudio e Vídeo": "HOME ELECTRONICS",
+    "Saúde": "HEALTH",
+    "Beleza e Cuidado Pessoal": "BEAUTY",
+    "Casa, Móveis e Decoração": "FURNISHING & HOUSEWARE",
+    "Calçados, Roupas e Bolsas": "FASHION"
+}
+
+# Lo que BERT ya clasificó en corridas anteriores (categoría -> vertical), al lado del mapeo manual
+RUTA_MAPEAMENTO_APRENDIDO = os.environ.get("VERTICAL_MAPEAMENTO", "mapeamento_verticais.json")
+
+
+def cargar_mapeamento_aprendido(ruta=RUTA_MAPEAMENTO_APRENDIDO, modelo=MODELO_VERTICAL):
+    """Mapeo guardado por corridas anteriores; si se generó con otro modelo no se usa."""
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, encoding='utf-8') as f:
+        guardado = json.load(f)
+    return guardado['mapeamento'] if guardado.get('modelo') == modelo else {}
+
+
+def guardar_mapeamento_aprendido(mapeamento, ruta=RUTA_MAPEAMENTO_APRENDIDO, modelo=MODELO_VERTICAL):
+    with open(ruta + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump({'modelo': modelo, 'mapeamento': mapeamento}, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(ruta + ".tmp", ruta)
+
+
+def classificar_verticais(categorias, encode, ruta=RUTA_MAPEAMENTO_APRENDIDO, modelo=MODELO_VERTICAL):
+    """
+    Vertical de cada categoría de Shopee.
+
+    Se trabaja sobre las categorías distintas (son unas pocas decenas): primero el mapeo manual, después lo ya
+    aprendido en corridas anteriores y, solo para las que quedan, BERT en un único lote (`encode` es la función
+    del modelo y no se llama si no hay nada nuevo). El resultado se completa con un map vectorizado; las
+    categorías vacías van a "OTHERS".
+    """
+    aprendido = cargar_mapeamento_aprendido(ruta, modelo)
+    mapeamento = {**aprendido, **MAPEAMENTO_MANUAL}
+
+    distintas = pd.Series(categorias.dropna().unique())
+    novas = [c for c in distintas if c not in mapeamento]
+    if novas:
+        embeddings = encode(novas + VERTICAIS)
+        mais_parecida = top_k(embeddings[:len(novas)], embeddings[len(novas):], k=1)[0][:, 0]
+        classificadas = {categoria: VERTICAIS[i] for categoria, i in zip(novas, mais_parecida)}
+        print(f"Verticales clasificadas con BERT para {len(novas)} categorías nuevas: {classificadas}")
+
+        aprendido.update(classificadas)
+        mapeamento.update(classificadas)
+        guardar_mapeamento_aprendido(aprendido, ruta, modelo)
+
+    # (como object: si `categorias` es categórica, map + fillna no podría agregar "OTHERS" a sus categorías)
+    return categorias.astype(object).map(mapeamento).fillna("OTHERS")
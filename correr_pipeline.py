@@ -0,0 +1,43 @@
+"""
+Pipeline completo: crawler -> normalización + UNIC_ID + carga en DM_SHOPEE_OFFICIAL_BRANDS -> matching.
+
+Todo corre en un solo proceso, con un solo cliente de BigQuery por ambiente. Los resultados intermedios quedan
+como Parquet en PIPELINE_ARTEFACTOS, con la clave de sus entradas: si una corrida se corta (por ejemplo al subir
+el match), al relanzarla se reutilizan las descargas y etapas ya calculadas.
+
+    python correr_pipeline.py
+    PIPELINE_DESDE=match python correr_pipeline.py          # solo el matching
+    PIPELINE_FORZAR=meli,sheets python correr_pipeline.py   # volver a bajar Meli y Sheets aunque estén en caché
+"""
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common.pipeline import Etapa, correr_etapas
+
+RAIZ = Path(__file__).resolve().parent
+HOY = datetime.now().strftime('%Y%m%d')
+
+
+def crawler_de_hoy_hecho():
+    # El crawler ya terminó hoy si dejó su archivo del día (si se cortó, sus checkpoints retoman lo que falte).
+    # Solo cuenta el archivo terminado, no el .tmp que se está escribiendo
+    return any(os.path.exists(f"brands_shopee_{HOY}.{ext}") for ext in ("parquet", "csv"))
+
+
+ETAPAS = [
+    Etapa("crawler", str(RAIZ / "scraper" / "crawler_python_version.py"), hecha=crawler_de_hoy_hecho),
+    # Normalización (cacheada adentro), UNIC_ID y upsert en la tabla (idempotente, se puede repetir sin duplicar)
+    Etapa("carga", str(RAIZ / "scraper" / "input_tabla_scraper.py")),
+    Etapa("match", str(RAIZ / "match" / "input_e_match.py")),
+]
+
+
+if __name__ == "__main__":
+    # El matching cruza la foto que se acaba de cargar (salvo que se pida otra fecha)
+    os.environ.setdefault("DATA_SCRAPING", datetime.now().strftime('%Y-%m-%d'))
+
+    correr_etapas(ETAPAS, desde=os.environ.get("PIPELINE_DESDE"), hasta=os.environ.get("PIPELINE_HASTA"))
@@ -1,37 +1,68 @@
 #  --- Librerías esenciales para manipulación de datos y conexión ---
 from datetime import datetime
 import pandas as pd
-import re
-import unicodedata
-import torch
-from sentence_transformers import SentenceTransformer, util
-from melitk.bigquery import BigQueryDatameshClientBuilder, BigQueryClientBuilderError
-import numpy as np
+from melitk.bigquery import BigQueryClientBuilderError
+import os
+import sys
+from pathlib import Path
 
+# Para poder importar el paquete common desde la raíz del repo
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.cache_embeddings import CacheEmbeddings
+from common.consultas import (
+    CONSULTA_MATCH_ANTERIOR, CONSULTA_SHEETS, CONSULTA_SHOPEE_MATCH, TABLA_MATCH, backend_compartido, leer,
+)
+from common.esquema import ESQUEMA_MATCH, RENOMBRE_MATCH, activar_copy_on_write, compactar, para_esquema
+from common.indice_ann import IndiceIVF
+from common.instrumentacion import Instrumentador, marcar_error
+from common.match_exato import aplicar_matches, match_exato
+from common.match_incremental import (
+    DIAS_MATCH_ANTERIOR, MATCH_INCREMENTAL, juntar_con_arrastrados, separar_arrastrados,
+)
+from common.match_semantico import (
+    K_CANDIDATOS_BERT, LIMIAR_SIMILARIDADE, candidatos_bert, candidatos_meli, match_lexico, matches_bert,
+)
+from common.modelos import MODELO_MATCH, MODELO_VERTICAL, Codificador
+from common.normalizacion import normalizar_nomes
+from common.pipeline import en_cache, una_vez
+from common.tiendas_meli import deduplicar_tiendas
+from common.vertical import classificar_verticais
+
+# Copy-on-write: los recortes y copias intermedias (df_resultado, concat, ...) no duplican datos hasta que se escriben
+activar_copy_on_write()
+
+# Métricas de cada paso (tiempo, CPU, pico de memoria, filas y consultas a BigQuery) en METRICAS_ARCHIVO
+metricas = Instrumentador('match')
 
 # --- Paso 1: Importar la base de datos del crawler de Shopee ---
+etapa = metricas.paso('paso_01_shopee')
 print("✨ Iniciando el proceso: importando datos de Shopee y Mercado Libre...")
 
 # Inicializar df_old vacío para evitar errores si la consulta falla
 # Es una buena práctica asegurar que la variable exista antes de usarse.
 df_old = pd.DataFrame()
 
+# Un solo cliente de BigQuery para todo el matching, compartido con las demás etapas si corren en el mismo
+# proceso (se conecta en la primera consulta)
+backend_bq = backend_compartido('DEV')
+
+# Fecha de la foto del scraper que se va a cruzar (DATA_SCRAPING=AAAA-MM-DD; por defecto, la de hoy)
+DATA_SCRAPING = os.environ.get("DATA_SCRAPING") or datetime.now().strftime('%Y-%m-%d')
+
+# Día de la corrida: las lecturas de tablas que cambian todos los días (TOs, Sheets) se reutilizan solo dentro del día
+HOY = datetime.now().date().isoformat()
+
 # Conectar a BigQuery para obtener datos de Shopee
 try:
-    # Construir el cliente de BigQuery para acceder a la DME de Shopee
-    bigquery_client = BigQueryDatameshClientBuilder()\
-        .with_dme_name("DME_ATTACH_DME000418", env='DEV')\
-        .build()
-    print("✅ Conexión con BigQuery para Shopee establecida. Procediendo a la consulta de datos.")
-
-    # Consulta para obtener los datos de Shopee. Se filtra por una fecha específica.
-    query_shopee = """SELECT * FROM ddme000418-dn88p8g386x-furyid.TBL.DM_SHOPEE_OFFICIAL_BRANDS
-    WHERE DATE(DATE_SCRAPING) = DATE '2025-06-04'
-    """
+    # Solo las columnas que usa el matching, filtrando la partición del día (nada de SELECT * de todo el histórico)
+    # (si ya se leyó esta misma partición, se reutiliza el artefacto guardado)
+    consulta_shopee = CONSULTA_SHOPEE_MATCH.en_fecha(DATA_SCRAPING)
+    df_api = en_cache('shopee', lambda: leer(backend_bq, consulta_shopee), consulta_shopee.sql(), HOY)  # Este es nuestro DataFrame de Shopee.
 
-    # Ejecutar la consulta y cargar el resultado en un DataFrame de pandas
-    response_shopee = bigquery_client.query_to_df(query_shopee)
-    df_api = response_shopee.df  # Este es nuestro DataFrame de Shopee.
+    # Texto a tipos compactos según el esquema final (categorías y strings de Arrow en vez de object)
+    df_api = compactar(df_api)
+    etapa['filas_salida'] = len(df_api)
 
     print("✅ Acceso a la tabla de Shopee confirmado. Primeros registros:")
     print(df_api.head())
@@ -39,22 +70,21 @@ try:
     print(df_api.columns)
 
 except BigQueryClientBuilderError as e:
+    marcar_error(etapa, e)
     print(f"Error al construir el cliente de BigQuery para Shopee: {e}")
 except Exception as e:
+    marcar_error(etapa, e)
     print(f"Error inesperado al obtener los datos de Shopee: {e}")
 
 # --- Paso 2: Importar la base de datos de Tiendas Oficiales (TOs) de Mercado Libre ---
+etapa = metricas.paso('paso_02_meli')
 
 # Inicializar df_old nuevamente (para asegurar que no haya errores si esta consulta falla)
 df_old = pd.DataFrame()
 
 # Conectar a BigQuery para obtener datos de Mercado Libre
 try:
-    # Reconstruir el cliente de BigQuery (se puede reutilizar, pero aquí se separa para claridad)
-    bigquery_client = BigQueryDatameshClientBuilder()\
-        .with_dme_name("DME_ATTACH_DME000418", env='DEV')\
-        .build()
-    print("\n✅ Conexión con BigQuery para Mercado Libre establecida. Obteniendo datos de TOs.")
+    print("\n✅ Obteniendo datos de TOs de Mercado Libre (mismo cliente de BigQuery).")
 
     # Consulta para obtener las Tiendas Oficiales de Mercado Libre, incluyendo IDs de categoría.
     query_meli = """
@@ -100,8 +130,9 @@ try:
     """
 
     # Ejecutar la consulta y cargar el resultado en un DataFrame de pandas
-    response_meli = bigquery_client.query_to_df(query_meli)
-    df_meli = response_meli.df  # Este es nuestro DataFrame de Mercado Libre.
+    df_meli = en_cache('meli', lambda: backend_bq.consultar(query_meli), query_meli, HOY)  # Este es nuestro DataFrame de Mercado Libre.
+    df_meli = compactar(df_meli)
+    etapa['filas_salida'] = len(df_meli)
 
     print("✅ Acceso a la tabla de Mercado Libre confirmado. Primeros registros:")
     print(df_meli.head())
@@ -109,11 +140,14 @@ try:
     print(df_meli.columns)
 
 except BigQueryClientBuilderError as e:
+    marcar_error(etapa, e)
     print(f"Error al construir el cliente de BigQuery para Mercado Libre: {e}")
 except Exception as e:
+    marcar_error(etapa, e)
     print(f"Error inesperado al obtener los datos de Mercado Libre: {e}")
 
 # --- Paso 3: Procesamiento de la base de Mercado Libre para comparación con Shopee ---
+etapa = metricas.paso('paso_03_limpieza_meli', filas_entrada=len(df_meli))
 print("\n🧹 Iniciando la limpieza y estandarización de los datos de Mercado Libre...")
 
 # Reemplazar caracteres no deseados (., _, -) por espacios en los nombres de las tiendas
@@ -124,40 +158,10 @@ df_meli['OFS_FANTASY_NAME'] = df_meli['OFS_FANTASY_NAME'].str.replace(r'[._-]',
 print("Nombres de tiendas y nombres de fantasía de Mercado Libre después de la primera limpieza:")
 print(df_meli)
 
-# Función para la limpieza final de los nombres de marcas
-def limpiar_nombre_marca(nombre):
-    if pd.isna(nome):
-        return nome
-
-    # Eliminar caracteres específicos que no son útiles para la coincidencia
-    nome = nome.replace('!', '')
-    nome = nome.replace('?', '')
-    nome = nome.replace('+', ' ')
-    nome = nome.replace('@', '')
-    nome = nome.replace('#', ' ')
-    nome = nome.replace('(', '').replace(')', '')
-    nome = nome.replace('_', ' ')
-    nome = nome.replace("'", '')
-    nome = nome.replace('|', '')
-    nome = nome.replace(',', '')
-    nome = nome.replace('/', '')
-    nome = nome.replace('=', '')
-
-    # Reemplazar "&" por " E " para estandarizar
-    nome = re.sub(r'\s*&\s*', ' E ', nome)
-
-    # Eliminar acentos (normalización Unicode)
-    nome = unicodedata.normalize('NFKD', nome).encode('ASCII', 'ignore').decode('utf-8')
-
-    # Eliminar espacios duplicados
-    nome = re.sub(r'\s+', ' ', nome)
-
-    # Eliminar espacios al inicio/final y convertir a mayúsculas
-    return nome.strip().upper()
-
 # Aplicar la función de limpieza a las columnas de nombres de Mercado Libre
-df_meli['OFS_FANTASY_NAME'] = df_meli['OFS_FANTASY_NAME'].apply(limpiar_nome_marca)
-df_meli['OFS_NAME'] = df_meli['OFS_NAME'].apply(limpiar_nome_marca)
+# (normalizador compartido, variante "meli": vectorizado y con memo por nombre crudo)
+df_meli['OFS_FANTASY_NAME'] = normalizar_nomes(df_meli['OFS_FANTASY_NAME'], variante='meli')
+df_meli['OFS_NAME'] = normalizar_nomes(df_meli['OFS_NAME'], variante='meli')
 
 print("\nNombres de tiendas y nombres de fantasía de Mercado Libre después de la limpieza completa:")
 print(df_meli)
@@ -174,105 +178,55 @@ print(username_invalidos[['OFS_FANTASY_NAME']])
 
 print("\nCaracteres especiales encontrados en OFS_NAME:")
 print(brand_invalidos[['OFS_NAME']])
+etapa['filas_salida'] = len(df_meli)
 
 # --- Paso 4: Manejo de TOs con registros duplicados en Mercado Libre ---
+etapa = metricas.paso('paso_04_dedup_meli')
 print("\n👯 Procesando los registros duplicados de TOs en Mercado Libre, seleccionando siempre el más reciente.")
 
-# Contar cuántos registros existen por nombre y estado para identificar duplicidades
-contagem = df_meli.groupby(['OFS_FANTASY_NAME', 'OFS_STATUS']).size().reset_index(name='COUNT')
-total_por_nome = contagem.groupby('OFS_FANTASY_NAME')['COUNT'].sum().reset_index(name='TOTAL')
-nomes_com_mais_de_um = total_por_nome[total_por_nome['TOTAL'] > 1]['OFS_FANTASY_NAME']
-
-print("Nombres de fantasía de Mercado Libre con más de un registro (duplicados):")
-print(contagem[contagem['OFS_FANTASY_NAME'].isin(nomes_com_mais_de_um)])
-
-# Filtrar el DataFrame original para incluir solo los nombres repetidos
-df_filtrado = df_meli[df_meli['OFS_FANTASY_NAME'].isin(nomes_com_mais_de_um)]
-
-# Ordenar por la fecha de actualización para obtener el registro más reciente
-df_ordenado = df_filtrado.sort_values(by='AUD_UPD_DTTM', ascending=False)
-
-# Obtener el registro más reciente de cada combinación Nombre + Estado
-df_mais_recentes = df_ordenado.drop_duplicates(subset=['OFS_FANTASY_NAME', 'OFS_STATUS'], keep='first')
-
-print("\nRegistros más recientes para nombres de fantasía duplicados:")
-print(df_mais_recentes[['OFS_FANTASY_NAME', 'OFS_STATUS', 'AUD_UPD_DTTM']])
-
-# Consolidar: registros únicos más los más recientes de los duplicados
-total_por_nome = df_meli.groupby('OFS_FANTASY_NAME').size().reset_index(name='TOTAL')
-nomes_unicos = total_por_nome[total_por_nome['TOTAL'] == 1]['OFS_FANTASY_NAME']
-nomes_duplicados = total_por_nome[total_por_nome['TOTAL'] > 1]['OFS_FANTASY_NAME']
+# Un solo sort + drop_duplicates: el registro más reciente de cada combinación Nombre + Estado
+total_antes = len(df_meli)
+df_meli = deduplicar_tiendas(df_meli)  # Nuestro DataFrame de Mercado Libre ahora está limpio y sin duplicados.
+etapa.update(filas_entrada=total_antes, filas_salida=len(df_meli))
 
-df_unicos = df_meli[df_meli['OFS_FANTASY_NAME'].isin(nomes_unicos)]
-df_duplicados = df_meli[df_meli['OFS_FANTASY_NAME'].isin(nomes_duplicados)]
-df_duplicados = df_duplicados.sort_values(by='AUD_UPD_DTTM', ascending=False)
-df_duplicados_mais_recentes = df_duplicados.drop_duplicates(subset=['OFS_FANTASY_NAME', 'OFS_STATUS'], keep='first')
+print(f'\nTotal de registros finales en Mercado Libre después de la deduplicación: {len(df_meli)} '
+      f'({total_antes - len(df_meli)} registros descartados)')
+print(df_meli[['OFS_FANTASY_NAME', 'OFS_STATUS', 'AUD_UPD_DTTM']])
 
-df_final = pd.concat([df_unicos, df_duplicados_mais_recentes], ignore_index=True)
-df_final = df_final.sort_values(by='OFS_FANTASY_NAME').reset_index(drop=True)
-
-print(f'\nTotal de registros finales en Mercado Libre después de la deduplicación: {len(df_final)}')
-print(df_final[['OFS_FANTASY_NAME', 'OFS_STATUS', 'AUD_UPD_DTTM']])
-
-df_meli = df_final  # Nuestro DataFrame de Mercado Libre ahora está limpio y sin duplicados.
 print("\nDataFrame de Mercado Libre finalizado después del procesamiento:")
 print(df_meli)
 print(df_meli.info())
 
 
 # --- Paso 5: Realizar la coincidencia (Match) de la base de Shopee con la base de Mercado Libre ---
+etapa = metricas.paso('paso_05_match_exato', filas_entrada=len(df_api))
 print("\n🔗 ¡Momento de la coincidencia! Cruzando Shopee y Mercado Libre para identificar las tiendas.")
 
-# DataFrame de trabajo con UNIC_ID de Shopee
-df_trabalho = df_api[['UNIC_ID', 'BRAND_NAME_SHOPEE', 'USERNAME_SHOPEE']].copy()
-
-# Función auxiliar para realizar el merge y registrar el tipo de coincidencia
-def encontrar_e_merge(df_busca, chave_busca, chave_meli):
-    df_temp = df_busca.merge(df_meli, left_on=chave_busca, right_on=chave_meli, how='inner')
-    df_temp['VALOR_ENCONTRADO'] = chave_busca  # Valor de Shopee que encontró coincidencia
-    df_temp['COLUNA_ENCONTRADA_EM'] = chave_meli  # Columna de Mercado Libre donde se encontró la coincidencia
-    return df_temp
-
-# Secuencia de intentos de coincidencia: primero BRAND_NAME_SHOPEE vs OFS_FANTASY_NAME,
-# luego BRAND_NAME_SHOPEE vs OFS_NAME, y así sucesivamente, trabajando con los registros restantes.
-df1 = encontrar_e_merge(df_trabalho, 'BRAND_NAME_SHOPEE', 'OFS_FANTASY_NAME')
-rest2 = df_trabalho[~df_trabalho['UNIC_ID'].isin(df1['UNIC_ID'])]
-
-df2 = encontrar_e_merge(rest2, 'BRAND_NAME_SHOPEE', 'OFS_NAME')
-rest3 = rest2[~rest2['UNIC_ID'].isin(df2['UNIC_ID'])]
-
-df3 = encontrar_e_merge(rest3, 'USERNAME_SHOPEE', 'OFS_FANTASY_NAME')
-rest4 = rest3[~rest3['UNIC_ID'].isin(df3['UNIC_ID'])]
-
-df4 = encontrar_e_merge(rest4, 'USERNAME_SHOPEE', 'OFS_NAME')
-
-# Identificar las tiendas que no encontraron coincidencia en ninguno de los pasos anteriores
-ids_encontrados = pd.concat([df1, df2, df3, df4])['UNIC_ID'].unique()
-df_nao_encontrado = df_trabalho[~df_trabalho['UNIC_ID'].isin(ids_encontrados)].copy()
-df_nao_encontrado['VALOR_ENCONTRADO'] = 'NÃO_ENCONTRADO'  # Marcar claramente
-df_nao_encontrado['COLUNA_ENCONTRADA_EM'] = 'NÃO_ENCONTRADO'  # Y dónde no se encontró
-
-# Añadir columnas de Mercado Libre con valores vacíos para las tiendas no encontradas
-colunas_meli = [
-    'OFS_OFFICIAL_STORE_ID', 'SIT_SITE_ID', 'OFS_NAME', 'OFS_FANTASY_NAME',
-    'OFS_STATUS', 'Category_ID', 'CAT_CATEG_ID_L1', 'CAT_CATEG_NAME_L1'
-]
-for col in colunas_meli:
-    df_nao_encontrado[col] = pd.NA
-
-# Unir todos los resultados (coincidencias y no coincidencias)
-df_merged = pd.concat([df1, df2, df3, df4, df_nao_encontrado], ignore_index=True)
-
-# Realizar un merge final con df_api para incluir todas las columnas originales de Shopee
-df_resultado = df_api.merge(df_merged.drop(columns=['BRAND_NAME_SHOPEE', 'USERNAME_SHOPEE'], errors='ignore'),
-                            on='UNIC_ID', how='left')
-
-# Reorganizar las columnas para una mejor visualización
-colunas_api = [col for col in df_api.columns if col in df_resultado.columns]
-colunas_info = ['VALOR_ENCONTRADO', 'COLUNA_ENCONTRADA_EM']
-colunas_meli_presentes = [col for col in colunas_meli if col in df_resultado.columns]
-colunas_finais = colunas_api + colunas_info + colunas_meli_presentes
-df_resultado = df_resultado[colunas_finais]
+# Modo incremental: las tiendas que ya coincidieron en la corrida anterior, con los mismos nombres y cuya TO de
+# Meli sigue igual (mismo estado y nombres), se arrastran tal cual; solo lo nuevo o cambiado pasa por la cascada
+df_match_anterior = None
+if MATCH_INCREMENTAL:
+    try:
+        consulta_anterior = CONSULTA_MATCH_ANTERIOR.con_fechas(
+            pd.Timestamp(DATA_SCRAPING) - pd.Timedelta(days=DIAS_MATCH_ANTERIOR),
+            pd.Timestamp(DATA_SCRAPING) - pd.Timedelta(days=1),
+        )
+        df_match_anterior = en_cache(
+            'match_anterior', lambda: leer(backend_bq, consulta_anterior), consulta_anterior.sql(), HOY
+        )
+    except Exception as e:
+        print(f"No se pudo leer el match anterior, se cruza toda la foto: {e}")
+
+df_arrastrado, pos_pendientes = separar_arrastrados(df_api, df_match_anterior, df_meli)
+df_api_match = df_api.reset_index(drop=True).iloc[pos_pendientes].reset_index(drop=True)
+print(f"Tiendas arrastradas de la corrida anterior: {df_arrastrado['UNIC_ID'].nunique()} "
+      f"({len(df_arrastrado)} filas); filas para cruzar: {len(df_api_match)}")
+
+# Un solo índice hash nombre -> fila de Meli (OFS_FANTASY_NAME antes que OFS_NAME) y una sola pasada:
+# primero BRAND_NAME_SHOPEE y, para lo que no aparece, USERNAME_SHOPEE. Mismo orden que los cuatro merges
+# de antes, pero sin recorrer df_meli cuatro veces ni multiplicar filas cuando un nombre se repite en Meli.
+df_resultado = match_exato(df_api_match, df_meli)
+etapa.update(filas_salida=len(df_resultado), filas_arrastradas=len(df_arrastrado))
 
 # Evaluar el resultado por tienda (USERNAME_SHOPEE)
 df_lojas = df_resultado.groupby('USERNAME_SHOPEE')['COLUNA_ENCONTRADA_EM'].apply(
@@ -290,7 +244,7 @@ print(f"Tiendas con al menos una coincidencia: {total_encontradas}")
 print(f"Tiendas sin coincidencia: {total_nao_encontradas}")
 
 # Verificar si alguna tienda "desapareció" (no debería ocurrir)
-faltando = set(df_api['USERNAME_SHOPEE']) - set(df_resultado['USERNAME_SHOPEE'])
+faltando = set(df_api_match['USERNAME_SHOPEE']) - set(df_resultado['USERNAME_SHOPEE'])
 print(f'Tiendas que no están en el resultado final (debería ser 0): {len(faltando)}')
 if faltando:
     print('Ejemplos:', list(faltando)[:10])
@@ -318,10 +272,12 @@ print("\nLista de las tiendas de Shopee que *aún no* han sido encontradas:")
 print(df_lojas_nao_encontradas_direto['USERNAME_SHOPEE'].dropna().tolist())
 
 # --- Paso 6: Complementar la coincidencia con contexto BERT (IA) ---
+etapa = metricas.paso('paso_06_match_ia', filas_entrada=len(df_resultado))
 print("\n🧠 Utilizando inteligencia artificial (BERT) para encontrar coincidencias más complejas.")
 
-# Cargar el modelo BERT pre-entrenado (ligero y eficiente)
-model = SentenceTransformer('paraphrase-MiniLM-L6-v2')
+# Modelo BERT pre-entrenado (ligero y eficiente). Se carga recién cuando hay textos nuevos para codificar
+# (MODELOS_BACKEND=int8/onnx para inferencia más rápida en CPU, con control de paridad contra torch)
+encode_match = Codificador(MODELO_MATCH)
 
 # Filtrar solo las tiendas de Shopee que *no fueron encontradas* en la coincidencia directa
 df_nao_encontrado_para_bert = df_resultado[
@@ -333,82 +289,60 @@ df_nao_encontrado_para_bert = df_resultado[
 lista_shopee_bert = df_nao_encontrado_para_bert['USERNAME_SHOPEE'].dropna().drop_duplicates().tolist()
 
 # Crear la lista de nombres de Mercado Libre para ser los "candidatos" a la coincidencia
-# Se incluyen tanto el nombre oficial como el nombre de fantasía.
-candidatos = []
-for col in ['OFS_NAME', 'OFS_FANTASY_NAME']:
-    for idx, val in df_meli[col].dropna().astype(str).items():
-        candidatos.append((val.strip(), idx, col))  # Almacenar texto, índice original y la columna
-
-lista_candidatos_texto = [c[0] for c in candidatos]  # Solo el texto para el modelo
-
-# Generar los embeddings (representaciones numéricas) para Shopee y Mercado Libre
-embeddings_shopee = model.encode(lista_shopee_bert, convert_to_tensor=True)
-embeddings_meli = model.encode(lista_candidatos_texto, convert_to_tensor=True)
-
-# Definir el umbral de similitud (0.80 es un buen punto de partida)
-limiar_similaridade = 0.80
-
-matches_bert = []
-
-# Comparar cada tienda no encontrada de Shopee con todas las de Mercado Libre
-for i, embedding_shopee in enumerate(embeddings_shopee):
-    similaridades = util.pytorch_cos_sim(embedding_shopee, embeddings_meli)[0]
-    top_score, top_idx = torch.max(similaridades, dim=0)  # Obtener la mayor similitud
-
-    if float(top_score) >= limiar_similaridade:  # Si está por encima del umbral, es una coincidencia
-        texto_match, idx_df_meli, coluna_encontrada = candidatos[top_idx]
-        row_meli = df_meli.loc[idx_df_meli]  # Obtener la fila completa de Mercado Libre
-
-        matches_bert.append({
-            'USERNAME_SHOPEE': lista_shopee_bert[i],
-            'MATCH_MELI': texto_match,
-            'SIMILARITY': float(top_score),
-            'COLUNA_ENCONTRADA_EM': coluna_encontrada,
-            'OFS_OFFICIAL_STORE_ID': row_meli.get('OFS_OFFICIAL_STORE_ID'),
-            'SIT_SITE_ID': row_meli.get('SIT_SITE_ID'),
-            'OFS_NAME': row_meli.get('OFS_NAME'),
-            'OFS_FANTASY_NAME': row_meli.get('OFS_FANTASY_NAME'),
-            'OFS_STATUS': row_meli.get('OFS_STATUS'),
-            'Category_ID': row_meli.get('Category_ID'),
-            'CAT_CATEG_ID_L1': row_meli.get('CAT_CATEG_ID_L1'),
-            'CAT_CATEG_NAME_L1': row_meli.get('CAT_CATEG_NAME_L1')
-        })
-
-df_matches_bert = pd.DataFrame(matches_bert)
-
-print("\nResultados de la Coincidencia Semántica (BERT) con similitud >= 0.80:")
+# Se incluyen tanto el nombre oficial como el nombre de fantasía (cada uno con su clave TO|columna).
+df_textos_meli, claves_candidatos = candidatos_meli(df_meli)
+
+# Filtro léxico antes de BERT: errores de tipeo, espacios y sufijos (KIT, OFICIAL, ...) se resuelven acá mismo,
+# y para el resto se arma un bloque chico de candidatos parecidos, que es lo único que BERT tiene que puntuar
+df_matches_fuzzy, lista_shopee_bert, bloques_fuzzy = match_lexico(lista_shopee_bert, df_meli, df_textos_meli)
+print(f"\n🔤 Coincidencias por similitud de texto (rapidfuzz): {len(df_matches_fuzzy)} tiendas resueltas sin BERT.")
+print(df_matches_fuzzy)
+
+# Generar los embeddings (representaciones numéricas) para Shopee y Mercado Libre.
+# Pasan por el caché en disco: de un mes a otro casi todos los nombres son los mismos y solo se codifican los nuevos.
+# Los candidatos de Meli van a un índice ANN persistente (uno por sitio): entre corridas solo se codifican y se
+# agregan las TOs nuevas o renombradas, y se borran las que ya no están en LK_OFS_OFFICIAL_STORES.
+# El caché y el índice van por modelo + backend: la paridad de int8/onnx se verifica antes, para que un backend
+# que vuelve a torch no guarde vectores de torch bajo la clave de int8/onnx
+encode_match.preparar(lista_shopee_bert + df_textos_meli['MATCH_MELI'].tolist())
+cache_embeddings = CacheEmbeddings(encode_match.clave)
+indice_meli = IndiceIVF(f'meli_MLB/{encode_match.clave}')
+
+# Tiendas con bloque léxico: BERT puntúa solo esos candidatos (los vectores salen del índice, ya calculados).
+# Tiendas sin ningún candidato parecido por texto: búsqueda en el índice completo
+df_candidatos_bert = candidatos_bert(
+    lista_shopee_bert, bloques_fuzzy, df_textos_meli, claves_candidatos, encode_match, cache_embeddings, indice_meli,
+    k=K_CANDIDATOS_BERT,
+)
+cache_embeddings.compactar()
+cache_embeddings.cerrar()
+
+print(f"\nTop {K_CANDIDATOS_BERT} candidatos de BERT por tienda (para revisión):")
+print(df_candidatos_bert)
+
+# Si la mejor similitud está por encima del umbral (LIMIAR_SIMILARIDADE), es una coincidencia
+df_matches_bert = matches_bert(df_candidatos_bert, df_meli, LIMIAR_SIMILARIDADE)
+
+print(f"\nResultados de la Coincidencia Semántica (BERT) con similitud >= {LIMIAR_SIMILARIDADE:.2f}:")
 print(df_matches_bert)
 
-# Actualizar el DataFrame de resultados con las coincidencias encontradas por BERT
-df_resultado_atualizado = df_resultado.copy()
-
-for _, row in df_matches_bert.iterrows():
-    # Encontrar las filas en df_resultado_atualizado que corresponden a la tienda de Shopee no encontrada
-    idx = df_resultado_atualizado[
-        (df_resultado_atualizado['USERNAME_SHOPEE'] == row['USERNAME_SHOPEE']) &
-        (df_resultado_atualizado['VALOR_ENCONTRADO'] == 'NÃO_ENCONTRADO') &
-        (df_resultado_atualizado['COLUNA_ENCONTRADA_EM'] == 'NÃO_ENCONTRADO')
-    ].index
-
-    # Si se encontró, actualizar la información de la coincidencia
-    if not idx.empty:
-        i = idx[0]  # Tomar el primer índice (puede haber más de un ítem por tienda)
-        df_resultado_atualizado.at[i, 'VALOR_ENCONTRADO'] = row['MATCH_MELI']
-        df_resultado_atualizado.at[i, 'COLUNA_ENCONTRADA_EM'] = row['COLUNA_ENCONTRADA_EM']
-        df_resultado_atualizado.at[i, 'OFS_OFFICIAL_STORE_ID'] = row['OFS_OFFICIAL_STORE_ID']
-        df_resultado_atualizado.at[i, 'SIT_SITE_ID'] = row['SIT_SITE_ID']
-        df_resultado_atualizado.at[i, 'OFS_NAME'] = row['OFS_NAME']
-        df_resultado_atualizado.at[i, 'OFS_FANTASY_NAME'] = row['OFS_FANTASY_NAME']
-        df_resultado_atualizado.at[i, 'OFS_STATUS'] = row['OFS_STATUS']
-        df_resultado_atualizado.at[i, 'Category_ID'] = row['Category_ID']
-        df_resultado_atualizado.at[i, 'CAT_CATEG_ID_L1'] = row['CAT_CATEG_ID_L1']
-        df_resultado_atualizado.at[i, 'CAT_CATEG_NAME_L1'] = row['CAT_CATEG_NAME_L1']
+# Las coincidencias del filtro léxico se aplican junto con las de BERT
+df_matches_bert = pd.concat([df_matches_fuzzy, df_matches_bert], ignore_index=True)
+
+# Actualizar el DataFrame de resultados con las coincidencias encontradas por BERT (y por el filtro léxico):
+# un solo cruce por USERNAME_SHOPEE, cada coincidencia en la primera fila todavía sin coincidencia de su tienda
+df_resultado_atualizado = aplicar_matches(df_resultado, df_matches_bert)
+
+# Volver a juntar lo recién cruzado con lo arrastrado de la corrida anterior (en el orden original de Shopee)
+df_resultado_atualizado = juntar_con_arrastrados(df_resultado_atualizado, pos_pendientes, df_arrastrado)
+etapa.update(filas_salida=len(df_resultado_atualizado), matches=len(df_matches_bert))
 
 print("\nDataFrame de resultado actualizado después de la coincidencia con BERT:")
 print(df_resultado_atualizado)
 
 
 # --- Paso 7: Importar datos de validación manual de Sheets ---
+etapa = metricas.paso('paso_07_sheets')
 print("\n📄 Importando datos de Sheets para revisar el trabajo de verificación manual.")
 
 # Inicializar df_old (práctica recomendada)
@@ -416,24 +350,19 @@ df_old = pd.DataFrame()
 
 # Conectar a BigQuery para obtener los datos de Sheets
 try:
-    bigquery_client = BigQueryDatameshClientBuilder()\
-        .with_dme_name("DME_ATTACH_DME000418", env='DEV')\
-        .build()
-    print("✅ Conexión con BigQuery para Sheets establecida.")
-
-    query_sheets = """SELECT * FROM ddme000418-dn88p8g386x-furyid.TBL.DM_STEP_PLAN_ACTION_TO_SHOPEE_PH
-    """
-
-    response_sheets = bigquery_client.query_to_df(query_sheets)
-    df_sheets = response_sheets.df  # Nuestro DataFrame con los datos de Sheets.
+    # Solo la tienda y las columnas de revisión manual
+    df_sheets = en_cache('sheets', lambda: leer(backend_bq, CONSULTA_SHEETS), CONSULTA_SHEETS.sql(), HOY)  # Nuestro DataFrame con los datos de Sheets.
+    etapa['filas_salida'] = len(df_sheets)
 
     print("✅ Acceso a la tabla de Sheets confirmado!")
     print(df_sheets.head())
     print(df_sheets.columns)
 
 except BigQueryClientBuilderError as e:
+    marcar_error(etapa, e)
     print(f"Error al construir el cliente de BigQuery para Sheets: {e}")
 except Exception as e:
+    marcar_error(etapa, e)
     print(f"Error inesperado al obtener los datos de Sheets: {e}")
 
 # Estandarizar el nombre de la tienda en Sheets
@@ -447,7 +376,7 @@ print("\nNombre de la tienda en Sheets después de la limpieza de caracteres:")
 print(df_sheets)
 
 # Aplicar la función de limpieza previamente definida (reutilización de código)
-df_sheets['LOJA_OFICIAL_SHOPEE'] = df_sheets['LOJA_OFICIAL_SHOPEE'].apply(limpiar_nome_marca)
+df_sheets['LOJA_OFICIAL_SHOPEE'] = normalizar_nomes(df_sheets['LOJA_OFICIAL_SHOPEE'], variante='meli')
 print("\nNombre de la tienda en Sheets después de la limpieza completa (sin acentos y estandarizado):")
 print(df_sheets)
 
@@ -458,6 +387,7 @@ print("Caracteres especiales encontrados en LOJA_OFICIAL_SHOPEE (Sheets):")
 print(username_invalidos_sheets[['LOJA_OFICIAL_SHOPEE']])
 
 # --- Paso 8: Actualizar resultados con la coincidencia manual de Sheets ---
+etapa = metricas.paso('paso_08_match_manual', filas_entrada=len(df_resultado_atualizado))
 print("\n✋ Combinando los resultados automáticos con la coincidencia manual de Sheets.")
 
 # Filtrar las tiendas que fueron marcadas como "Encontrado" en Sheets (validación manual)
@@ -494,46 +424,23 @@ mask_final_manual = mask_nao_encontrado_total & mask_loja_bateu_manual
 df_resultado_atualizado.loc[mask_final_manual, ['VALOR_ENCONTRADO', 'COLUNA_ENCONTRADA_EM']] = 'ENCONTRADO_MANUAL'
 
 print(f"Filas actualizadas con coincidencia manual: {mask_final_manual.sum()}")
+etapa.update(filas_salida=len(df_resultado_atualizado), matches=int(mask_final_manual.sum()))
 print("\nDataFrame final después de aplicar la coincidencia manual:")
 print(df_resultado_atualizado)
 print(df_resultado_atualizado.info())
 
 # --- Paso 9: Renombrar y ajustar columnas para BigQuery ---
+etapa = metricas.paso('paso_09_columnas', filas_entrada=len(df_resultado_atualizado))
 print("\n✏️ Organizando los nombres de las columnas y preparando todo para BigQuery.")
 
 # Renombrar las columnas al estándar final, más claro
-df_resultado_atualizado.rename(columns={
-    'SHOPID': 'SHOPID_SHOPEE',
-    'LOGO': 'LOGO_SHOPEE',
-    'LOGO_PC': 'LOGO_PC_SHOPEE',
-    'SHOP_COLLECTION_ID': 'SHOP_COLLECTION_ID_SHOPEE',
-    'CTIME': 'CTIME_SHOPEE',
-    'BRAND_LABEL': 'BRAND_LABEL_SHOPEE',
-    'SHOP_TYPE': 'SHOP_TYPE_SHOPEE',
-    'REDIRECT_URL': 'REDIRECT_URL_SHOPEE',
-    'ENTITY_ID': 'ENTITY_ID_SHOPEE',
-    'CATEGORY_ID': 'CATEGORY_ID_SHOPEE',
-    'CATEGORY_NAME': 'CATEGORY_NAME_SHOPEE',
-    'TO_URL': 'TO_URL_SHOPEE',
-    'UNIC_ID': 'UNIC_ID_SHOPEE',
-    'FIRST_APPEARENCE': 'FIRST_APPEARENCE_SHOPEE',
-    'OFS_OFFICIAL_STORE_ID': 'OFFICIAL_STORE_ID_MELI',
-    'SIT_SITE_ID': 'SIT_SITE_ID_MELI',
-    'OFS_NAME': 'LOJA_OFICIAL_MELI',
-    'OFS_FANTASY_NAME': 'FANTASY_NAME_MELI',
-    'OFS_STATUS': 'OFS_STATUS_MELI',
-    'Category_ID': 'CATEGORIES_MELI_ID',
-    'CAT_CATEG_ID_L1': 'CATEGORY_ID_L1_MELI',
-    'CAT_CATEG_NAME_L1': 'CATEGORY_NAME_L1_MELI'
-}, inplace=True)
+df_resultado_atualizado.rename(columns=RENOMBRE_MATCH, inplace=True)
 
 # Eliminar la columna AUD_INS_DTTM, que se volverá a crear al final
-df_resultado_atualizado.drop(columns=['AUD_INS_DTTM'], inplace=True)
+df_resultado_atualizado.drop(columns=['AUD_INS_DTTM'], inplace=True, errors='ignore')
 
 # Marcar si la tienda de Shopee es "nueva" (apareció en la fecha de scraping actual)
-# Es importante actualizar esta fecha si el scraping corresponde a otro día.
-# Considerar una mejora para obtener esta fecha de forma automática.
-df_resultado_atualizado['LOJA_NOVA_SHOPEE'] = df_resultado_atualizado['FIRST_APPEARENCE_SHOPEE'].dt.date == pd.to_datetime("2025-06-04").date()
+df_resultado_atualizado['LOJA_NOVA_SHOPEE'] = df_resultado_atualizado['FIRST_APPEARENCE_SHOPEE'].dt.date == pd.to_datetime(DATA_SCRAPING).date()
 print("\nValores únicos para 'LOJA_NOVA_SHOPEE':")
 print(df_resultado_atualizado['LOJA_NOVA_SHOPEE'].unique())
 
@@ -555,103 +462,40 @@ df_resultado_atualizado = df_resultado_atualizado.rename(columns={
     'VALOR_ENCONTRADO': 'MATCH_VALUE_USED',
     'COLUNA_ENCONTRADA_EM': 'MATCH_COLUMN_MELI'
 })
+etapa['filas_salida'] = len(df_resultado_atualizado)
 
 # --- Paso 10: Clasificación de verticales con BERT (para los datos de Mercado Libre) ---
+etapa = metricas.paso('paso_10_verticales', filas_entrada=len(df_resultado_atualizado))
 print("\nCategorizando las tiendas de Mercado Libre en verticales con el poder de BERT.")
 
-# Cargar un modelo BERT multilingüe (ideal para español)
-model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
-
-# Nuestros segmentos de verticales definidos
-verticals = [
-    "SPORTS", "T & B", "ENTERTAINMENT", "CONSTRUCTION & INDUSTRY",
-    "HOME ELECTRONICS", "TECHNOLOGY", "OTHERS", "VEHICLE PARTS & ACCESSORIES",
-    "FASHION", "BEAUTY", "HEALTH", "FURNISHING & HOUSEWARE", "CPG"
-]
-
-# Generar embeddings para los nombres de las verticales
-vertical_embeddings = model.encode(verticals, convert_to_tensor=True)
-
-# Mapeo manual para categorías que ya tienen una vertical clara
-mapeamento_manual = {
-    "Alimentos e Bebidas": "CPG",
-    "Brinquedos e Hobbies": "T & B",
-    "Eletônicos, Áudio e Vídeo": "HOME ELECTRONICS",
-    "Eletrônicos, Áudio e Vídeo": "HOME ELECTRONICS",
-    "Saúde": "HEALTH",
-    "Beleza e Cuidado Pessoal": "BEAUTY",
-    "Casa, Móveis e Decoração": "FURNISHING & HOUSEWARE",
-    "Calçados, Roupas e Bolsas": "FASHION"
-}
-
-# Función para clasificar la vertical de una categoría
-def classificar_vertical(category_name):
-    if pd.isna(category_name):
-        return "OTHERS"  # Si no hay nombre, se asigna a "Otros"
-
-    # Primero, intentar el mapeo manual (es más rápido y preciso)
-    if category_name in mapeamento_manual:
-        return mapeamento_manual[category_name]
-
-    # Si no hay mapeo manual, usar BERT para encontrar la similitud
-    cat_embedding = model.encode(category_name, convert_to_tensor=True)
-    scores = util.cos_sim(cat_embedding, vertical_embeddings)[0]
-    best_idx = scores.argmax().item()  # Obtener el índice de la vertical más similar
-    return verticals[best_idx]  # Retornar el nombre de la vertical
-
 # Crear la columna VERTICAL_MELI si no existe
 if "VERTICAL_MELI" not in df_resultado_atualizado.columns:
     df_resultado_atualizado["VERTICAL_MELI"] = None
 
-# Aplicar la clasificación solo donde la vertical aún está vacía
+# Clasificar solo donde la vertical aún está vacía. Son pocas categorías distintas: mapeo manual, lo aprendido
+# en corridas anteriores y BERT en un solo lote para las nuevas (el modelo multilingüe solo se carga si hay alguna)
 mask_vazia = df_resultado_atualizado["VERTICAL_MELI"].isna()
-df_resultado_atualizado.loc[mask_vazia, "VERTICAL_MELI"] = df_resultado_atualizado.loc[mask_vazia, "CATEGORY_NAME_SHOPEE"].apply(classificar_vertical)
+df_resultado_atualizado.loc[mask_vazia, "VERTICAL_MELI"] = classificar_verticais(
+    df_resultado_atualizado.loc[mask_vazia, "CATEGORY_NAME_SHOPEE"],
+    Codificador(MODELO_VERTICAL),
+)
 
 print("\nVerticales únicas después de la clasificación:")
 print(df_resultado_atualizado["VERTICAL_MELI"].unique())
 
 # Crear la columna 'MAIN_CATEGORIES_MELI_ID' con valores nulos (el tipo Float64 acepta NaN)
 df_resultado_atualizado['MAIN_CATEGORIES_MELI_ID'] = pd.Series([pd.NA] * len(df_resultado_atualizado), dtype='Float64')
+etapa['filas_salida'] = len(df_resultado_atualizado)
 
 # --- Paso 11: Validación del Esquema y Reorganización de Columnas ---
+etapa = metricas.paso('paso_11_esquema', filas_entrada=len(df_resultado_atualizado))
 print("\n✅ Revisando el esquema y organizando las columnas, todo listo para BigQuery.")
 
-# Definir el esquema esperado para BigQuery (nombre_columna: tipo_pandas)
-schema_esperado = {
-    'USERNAME_SHOPEE':              'object',
-    'BRAND_NAME_SHOPEE':            'object',
-    'SHOPID_SHOPEE':                'Int64',
-    'LOGO_SHOPEE':                  'object',
-    'LOGO_PC_SHOPEE':               'object',
-    'SHOP_COLLECTION_ID_SHOPEE':    'Int64',
-    'CTIME_SHOPEE':                 'Int64',
-    'BRAND_LABEL_SHOPEE':           'Int64',
-    'SHOP_TYPE_SHOPEE':             'Int64',
-    'REDIRECT_URL_SHOPEE':          'object',
-    'ENTITY_ID_SHOPEE':             'Int64',
-    'CATEGORY_ID_SHOPEE':           'Int64',
-    'CATEGORY_NAME_SHOPEE':         'object',
-    'TO_URL_SHOPEE':                'object',
-    'LOJA_NOVA_SHOPEE':             'bool',
-    'FIRST_APPEARENCE_SHOPEE':      'datetime64[ns, UTC]',
-    'UNIC_ID_SHOPEE':               'object',
-    'DATE_SCRAPING':                'datetime64[ns, UTC]',
-    'DATE_MATCH':                   'datetime64[ns]',
-    'FOUND_BY_AI':                  'bool',
-    'LOJA_OFICIAL_MELI':            'object',
-    'FANTASY_NAME_MELI':            'object',
-    'OFFICIAL_STORE_ID_MELI':       'object',
-    'CATEGORIES_MELI_ID':           'Int64',
-    'MAIN_CATEGORIES_MELI_ID':      'Float64',
-    'VERTICAL_MELI':                'object',
-    'SIT_SITE_ID_MELI':             'object',
-    'MATCH_VALUE_USED':             'object',  # Nombre actualizado
-    'MATCH_COLUMN_MELI':            'object',  # Nombre actualizado
-    'OFS_STATUS_MELI':              'object',
-    'CATEGORY_ID_L1_MELI':          'Int64',
-    'CATEGORY_NAME_L1_MELI':        'object'
-}
+# Esquema esperado para BigQuery (nombre_columna: tipo_pandas), definido en common/esquema.py
+schema_esperado = ESQUEMA_MATCH
 
+# Las columnas de texto se trabajaron con tipos compactos; para la carga vuelven a object
+df_resultado_atualizado = para_esquema(df_resultado_atualizado, schema_esperado)
 # Función auxiliar para obtener el tipo de dato como string
 def dtype_str(dtype):
     if pd.api.types.is_datetime64_any_dtype(dtype):
@@ -685,8 +529,10 @@ ordem_colunas = list(schema_esperado.keys())  # Obtener el orden de las claves d
 
 # Reorganizar el DataFrame con el orden correcto
 df_resultado_atualizado = df_resultado_atualizado[ordem_colunas]
+etapa['filas_salida'] = len(df_resultado_atualizado)
 
 # --- Paso 12: Añadir Metadatos y Finalizar ---
+etapa = metricas.paso('paso_12_metadatos', filas_entrada=len(df_resultado_atualizado))
 print("\n🎉 ¡Todo listo! Añadiendo marcas de tiempo y finalizando el proceso ETL.")
 
 # Crear las columnas de auditoría (fecha de inserción y actualización)
@@ -699,33 +545,37 @@ print("\nTipos de datos del DataFrame final:")
 print(df_resultado_atualizado.dtypes)
 print("\nDataFrame final listo para BigQuery:")
 print(df_resultado_atualizado)
+etapa['filas_salida'] = len(df_resultado_atualizado)
 
 # --- Paso 13: Insertar los datos en BigQuery ---
+etapa = metricas.paso('paso_13_subida', filas_entrada=len(df_resultado_atualizado))
 print("\n🚀 ¡Es hora de enviar los datos a la tabla de BigQuery!")
 
 try:
-    # Construir el cliente de BigQuery nuevamente (siempre es bueno verificar)
-    bigquery_client = BigQueryDatameshClientBuilder()\
-        .with_dme_name("DME_ATTACH_DME000418", env='DEV')\
-        .build()
-
     print("Iniciando la inserción de datos en BigQuery...")
 
-    # Nombre de la tabla en BigQuery
-    table_id = 'ddme000418-dn88p8g386x-furyid.TBL.DM_SHOPEE_OFFICIAL_BRANDS_MATCH_AT'
-
     # Configuraciones del trabajo: CREATE_NEVER (no crea la tabla si no existe) y 'append' (añade a los datos existentes)
     job_config_attributes = {
         "create_disposition": "CREATE_NEVER",
         "mode": "append"
     }
 
-    # Insertar el DataFrame en BigQuery
-    bigquery_client.df_to_gbq(df_resultado_atualizado, table_id, **job_config_attributes)
+    # Insertar el DataFrame en BigQuery con el mismo cliente de las lecturas. Como es un append, se hace una sola
+    # vez por foto del scraper y día: si el pipeline se vuelve a correr después de una subida exitosa, no se duplica
+    una_vez(
+        'subida_match',
+        lambda: backend_bq.escribir(df_resultado_atualizado, TABLA_MATCH, **job_config_attributes),
+        DATA_SCRAPING, HOY,
+    )
 
+    etapa['filas_salida'] = len(df_resultado_atualizado)
     print("¡Datos insertados con éxito en BigQuery! ¡Misión cumplida! 🎉")
 
 except BigQueryClientBuilderError as builder_error:
+    marcar_error(etapa, builder_error)
     print(f"Error al construir el cliente de BigQuery: {builder_error}")
 except Exception as e:
+    marcar_error(etapa, e)
     print(f"Ocurrió un error inesperado al intentar insertar los datos: {e}")
+
+metricas.terminar()
@@ -1,7 +1,25 @@
+import json
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from urllib.parse import urlparse
+
 import requests
-import pandas as pd
+from requests.adapters import HTTPAdapter
 from datetime import datetime
 
+# Para poder importar el paquete common desde la raíz del repo
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.instrumentacion import Instrumentador
+from escritor_brands import EscritorBrands
+
 # Configuraciones de la URL y headers para hacer la solicitud
 url = "https://shopee.com.br/api/v4/official_shop/get_shops_by_category"
 headers = {
@@ -42,28 +60,119 @@ categories = {
     11059975: "Libros y Revistas"
 }
 
-# Lista donde vamos a guardar toda la info de las marcas
-all_brands_data = []
+# Límites del modo concurrente (se pueden cambiar por variable de entorno sin tocar el código)
+# CONCURRENCIA_MAX: cuántas categorías se piden al mismo tiempo (1 = igual que antes, una por una)
+# MAX_REQ_POR_SEGUNDO: tope de solicitudes por segundo hacia cada host, para no comernos un bloqueo de Shopee
+CONCURRENCIA_MAX = int(os.environ.get("CRAWLER_CONCURRENCIA", 8))
+MAX_REQ_POR_SEGUNDO = float(os.environ.get("CRAWLER_MAX_REQ_POR_SEGUNDO", 4))
+TIMEOUT_SEGUNDOS = 30
 
-# Recorriendo todas las categorías
-for category_id, category_name in categories.items():
-    # Parámetros específicos para cada categoría
-    params = {
-        "need_zhuyin": 0,
-        "category_id": category_id
-    }
+# Cuántas categorías se piden por delante de la que se está entregando, por hilo: como se entregan en orden, una
+# categoría lenta retiene las que ya terminaron detrás de ella, y esto acota cuántas pueden quedar esperando
+VENTANA_POR_HILO = int(os.environ.get("CRAWLER_VENTANA_POR_HILO", 4))
 
-    # Haciendo la solicitud HTTP
-    response = requests.get(url, headers=headers, params=params)
+# Reintentos: backoff exponencial con jitter, respetando el Retry-After cuando Shopee lo manda
+MAX_REINTENTOS = int(os.environ.get("CRAWLER_MAX_REINTENTOS", 5))
+BACKOFF_BASE_SEGUNDOS = 1.0
+BACKOFF_MAX_SEGUNDOS = 60.0
+STATUS_REINTENTABLES = {403, 429, 500, 502, 503, 504}  # 403 también, porque así responde Shopee cuando nos frena
 
-    if response.status_code == 200:
-        print(f"¡Solicitud exitosa para la categoría {category_name}!")
-    else:
-        print(f"Error en la solicitud para la categoría {category_name}. Código de estado: {response.status_code}")
-        continue  # Saltamos esta categoría si algo salió mal
+# Carpeta donde queda un archivo por categoría ya bajada, para retomar una corrida cortada
+DIR_CHECKPOINTS = os.environ.get("CRAWLER_DIR_CHECKPOINTS", "checkpoints_crawler")
+
+# Formato del archivo final: "parquet" (columnas tipadas) o "csv"
+FORMATO_SALIDA = os.environ.get("CRAWLER_FORMATO_SALIDA", "parquet")
+
+
+class CategoriasPendientesError(Exception):
+    """Algunas categorías no se pudieron bajar ni con reintentos; quedan pendientes para la próxima corrida."""
+
+    def __init__(self, pendientes):
+        self.pendientes = pendientes
+        nombres = ", ".join(str(nombre) for nombre in pendientes.values())
+        super().__init__(f"Categorías pendientes ({len(pendientes)}): {nombres}")
+
+
+class LimitadorPorHost:
+    """Reparte los turnos de salida para que cada host reciba como máximo `max_por_segundo` solicitudes."""
+
+    def __init__(self, max_por_segundo):
+        self.intervalo = 1.0 / max_por_segundo if max_por_segundo and max_por_segundo > 0 else 0.0
+        self._lock = threading.Lock()
+        self._proximo_turno = {}
+
+    def esperar(self, host):
+        if not self.intervalo:
+            return
+        # Reservamos el turno con el lock tomado, pero dormimos afuera para no trabar a los otros hilos
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self._proximo_turno.get(host, ahora))
+            self._proximo_turno[host] = turno + self.intervalo
+        espera = turno - time.monotonic()
+        if espera > 0:
+            time.sleep(espera)
+
+
+def leer_retry_after(response):
+    """Devuelve los segundos del header Retry-After (viene en segundos o como fecha HTTP), o None si no vino."""
+    valor = response.headers.get("Retry-After")
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        fecha = parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, fecha.timestamp() - time.time())
+
+
+def calcular_espera(intento, retry_after=None):
+    """Backoff exponencial con "full jitter"; si el servidor pidió un Retry-After, nunca esperamos menos que eso."""
+    espera = random.uniform(0, min(BACKOFF_MAX_SEGUNDOS, BACKOFF_BASE_SEGUNDOS * (2 ** intento)))
+    if retry_after is not None:
+        espera = max(espera, retry_after)
+    return espera
+
+
+def ruta_checkpoint(dir_checkpoints, category_id):
+    return os.path.join(dir_checkpoints, f"{category_id}.json")
+
+
+def guardar_checkpoint(dir_checkpoints, category_id, filas):
+    """Graba las filas de la categoría de forma atómica (tmp + rename), así un corte nunca deja un archivo a medias."""
+    os.makedirs(dir_checkpoints, exist_ok=True)
+    ruta = ruta_checkpoint(dir_checkpoints, category_id)
+    with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(filas, f, ensure_ascii=False)
+    os.replace(ruta + ".tmp", ruta)
+
+
+def cargar_checkpoint(dir_checkpoints, category_id):
+    """Devuelve las filas guardadas de la categoría, o None si todavía no se bajó."""
+    ruta = ruta_checkpoint(dir_checkpoints, category_id)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def crear_sesion(concurrencia=CONCURRENCIA_MAX):
+    """Una sola sesión keep-alive compartida: el handshake TCP/TLS se paga una vez y las conexiones se reutilizan."""
+    session = requests.Session()
+    session.headers.update(headers)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, concurrencia))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
-    # Parseando la respuesta como JSON
-    response_json = response.json()
+
+def extraer_marcas(response_json, category_id, category_name):
+    """Convierte la respuesta de la API en la lista de filas (mismo formato de siempre de all_brands_data)."""
+    filas = []
 
     # Checando si la estructura que esperamos está en la respuesta
     if 'data' in response_json and 'brands' in response_json['data']:
@@ -73,7 +182,7 @@ for category_id, category_name in categories.items():
                 # Creamos la URL pública del shop
                 url_to = f"https://shopee.com.br/{brand_id['shopid']}"
                 # Añadimos todo a la lista
-                all_brands_data.append({
+                filas.append({
                     'index': brand['index'],
                     'total': brand['total'],
                     'username': brand_id['username'],
@@ -95,14 +204,137 @@ for category_id, category_name in categories.items():
     else:
         print(f"La estructura esperada no está presente en la respuesta para la categoría {category_name}.")
 
-# Convertimos la lista a un DataFrame de pandas
-df = pd.DataFrame(all_brands_data)
+    return filas
+
+
+def buscar_categoria(session, limitador, category_id, category_name, url=url, max_reintentos=MAX_REINTENTOS):
+    """
+    Pide una categoría a la API y devuelve sus filas.
+    Los errores temporales (throttling, 5xx, caídas de conexión) se reintentan; devuelve None si no hubo caso.
+    """
+    # Parámetros específicos para cada categoría
+    params = {
+        "need_zhuyin": 0,
+        "category_id": category_id
+    }
+
+    for intento in range(max_reintentos + 1):
+        ultimo_intento = intento == max_reintentos
+
+        # Esperamos nuestro turno para este host y hacemos la solicitud por la sesión compartida
+        limitador.esperar(urlparse(url).netloc)
+        try:
+            response = session.get(url, params=params, timeout=TIMEOUT_SEGUNDOS)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            print(f"Error de conexión en la categoría {category_name} (intento {intento + 1}): {e}")
+            if ultimo_intento:
+                return None
+            time.sleep(calcular_espera(intento))
+            continue
+
+        if response.status_code == 200:
+            print(f"¡Solicitud exitosa para la categoría {category_name}!")
+            # Parseando la respuesta como JSON
+            return extraer_marcas(response.json(), category_id, category_name)
+
+        print(f"Error en la solicitud para la categoría {category_name}. Código de estado: {response.status_code} (intento {intento + 1})")
+        if response.status_code not in STATUS_REINTENTABLES or ultimo_intento:
+            return None
+        time.sleep(calcular_espera(intento, leer_retry_after(response)))
+
+    return None
+
+
+def iterar_categorias(categories=categories, url=url, concurrencia=CONCURRENCIA_MAX,
+                      max_req_por_segundo=MAX_REQ_POR_SEGUNDO, dir_checkpoints=None):
+    """
+    Pide todas las categorías con un pool de hilos acotado sobre una sola sesión y va devolviendo
+    (category_id, filas) en el mismo orden del diccionario `categories`, sin importar cuál respondió primero.
+    Las solicitudes van en una ventana deslizante de `concurrencia * VENTANA_POR_HILO` categorías: la siguiente se
+    pide recién cuando se entrega una, así que en memoria hay como mucho esa cantidad de categorías bajadas y
+    todavía sin entregar (nunca todo el dataset), aunque una categoría lenta frene a las de atrás.
+
+    Si se pasa `dir_checkpoints`, cada categoría bajada queda grabada ahí y las que ya tienen archivo no se vuelven
+    a pedir. Si alguna categoría no se pudo bajar, al final se lanza CategoriasPendientesError (las demás ya
+    quedaron grabadas, así que la próxima corrida solo pide las que faltan).
+    """
+    limitador = LimitadorPorHost(max_req_por_segundo)
+
+    # Primero vemos qué categorías ya quedaron de una corrida anterior (se leen recién cuando les toca)
+    ya_bajadas = set()
+    if dir_checkpoints:
+        ya_bajadas = {cid for cid in categories if os.path.exists(ruta_checkpoint(dir_checkpoints, cid))}
+        if ya_bajadas:
+            print(f"Retomando corrida: {len(ya_bajadas)} categorías ya estaban en {dir_checkpoints}")
+
+    def buscar_y_guardar(category_id, category_name):
+        filas = buscar_categoria(session, limitador, category_id, category_name, url)
+        if filas is not None and dir_checkpoints:
+            guardar_checkpoint(dir_checkpoints, category_id, filas)
+        return filas
+
+    por_pedir = iter([(cid, nombre) for cid, nombre in categories.items() if cid not in ya_bajadas])
+    ventana = max(1, concurrencia) * max(1, VENTANA_POR_HILO)
+
+    pendientes = {}
+    with crear_sesion(concurrencia) as session, ThreadPoolExecutor(max_workers=max(1, concurrencia)) as pool:
+        futuros = {}
+        for category_id, category_name in categories.items():
+            # Se completa la ventana: como se pide en el mismo orden en que se entrega, la categoría que toca
+            # ahora siempre ya está pedida
+            while len(futuros) < ventana:
+                siguiente = next(por_pedir, None)
+                if siguiente is None:
+                    break
+                futuros[siguiente[0]] = pool.submit(buscar_y_guardar, *siguiente)
+
+            if category_id in ya_bajadas:
+                filas = cargar_checkpoint(dir_checkpoints, category_id)
+            else:
+                filas = futuros.pop(category_id).result()
+            if filas is None:
+                pendientes[category_id] = category_name
+                continue
+            yield category_id, filas
+
+    if pendientes:
+        raise CategoriasPendientesError(pendientes)
+
+
+def crawlear_categorias(categories=categories, url=url, concurrencia=CONCURRENCIA_MAX,
+                        max_req_por_segundo=MAX_REQ_POR_SEGUNDO, dir_checkpoints=None):
+    """Igual que iterar_categorias, pero junta todo en la lista all_brands_data de siempre."""
+    # Lista donde vamos a guardar toda la info de las marcas
+    all_brands_data = []
+    for _, filas in iterar_categorias(categories, url, concurrencia, max_req_por_segundo, dir_checkpoints):
+        all_brands_data.extend(filas)
+    return all_brands_data
+
+
+if __name__ == "__main__":
+    # Generamos la fecha actual en formato YYYYMMDD
+    data_atual = datetime.now().strftime('%Y%m%d')
+
+    # Los checkpoints van por día: si la corrida de hoy se corta, al relanzarla solo se piden las que faltan
+    dir_checkpoints_hoy = os.path.join(DIR_CHECKPOINTS, data_atual)
+
+    # Guardamos el archivo con la fecha en el nombre (Parquet tipado por defecto, CSV si se pide o si falta pyarrow)
+    nome_arquivo = f"brands_shopee_{data_atual}.{FORMATO_SALIDA}"
+
+    # Métricas de cada sección (tiempo, CPU, pico de memoria y filas) en METRICAS_ARCHIVO
+    metricas = Instrumentador('crawler')
 
-# Generamos la fecha actual en formato YYYYMMDD
-data_atual = datetime.now().strftime('%Y%m%d')
+    # Recorriendo todas las categorías (en paralelo, pero se escriben en el orden de siempre a medida que llegan)
+    try:
+        with metricas.etapa('descarga', categorias=len(categories)) as etapa, EscritorBrands(nome_arquivo) as escritor:
+            for _, filas in iterar_categorias(dir_checkpoints=dir_checkpoints_hoy):
+                escritor.escribir(filas)
+            etapa['filas_salida'] = escritor.total_filas
+    except CategoriasPendientesError as e:
+        print(f"{e}. Volvé a correr el crawler para bajar solo esas categorías.")
+        raise SystemExit(1)
 
-# Guardamos el archivo CSV con la fecha en el nombre
-nome_arquivo = f"brands_shopee_{data_atual}.csv"
-df.to_csv(nome_arquivo, index=False)
+    # Con el archivo completo ya no necesitamos los checkpoints del día
+    shutil.rmtree(dir_checkpoints_hoy, ignore_errors=True)
 
-print(f"Datos guardados en {nome_arquivo}")
+    print(f"Datos guardados en {escritor.ruta} ({escritor.total_filas} filas)")
@@ -0,0 +1,150 @@
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Sin pyarrow seguimos funcionando, pero solo con CSV
+    pa = None
+    pq = None
+
+# Columnas que arma el crawler, en el orden de siempre, con su tipo de pandas.
+# Así el que lee el archivo ya recibe las columnas tipadas y no tiene que adivinarlas desde texto.
+DTYPES_BRANDS = {
+    'index':              'string',
+    'total':              'Int64',
+    'username':           'string',
+    'brand_name':         'string',
+    'shopid':             'int64',
+    'logo':               'string',
+    'logo_pc':            'string',
+    'shop_collection_id': 'Int64',
+    'ctime':              'int64',
+    'brand_label':        'Int64',
+    'shop_type':          'Int64',
+    'redirect_url':       'string',
+    'entity_id':          'int64',
+    'category_id':        'int64',
+    'category_name':      'category',
+    'url_to':             'string',
+    'data_requisicao':    'string',
+}
+
+COLUNAS_BRANDS = list(DTYPES_BRANDS)
+
+# Nombres de las columnas en la tabla DM_SHOPEE_OFFICIAL_BRANDS (index y total no se suben)
+COLUNAS_TABLA = {
+    'username':           'USERNAME_SHOPEE',
+    'brand_name':         'BRAND_NAME_SHOPEE',
+    'shopid':             'SHOPID',
+    'logo':               'LOGO',
+    'logo_pc':            'LOGO_PC',
+    'shop_collection_id': 'SHOP_COLLECTION_ID',
+    'ctime':              'CTIME',
+    'brand_label':        'BRAND_LABEL',
+    'shop_type':          'SHOP_TYPE',
+    'redirect_url':       'REDIRECT_URL',
+    'entity_id':          'ENTITY_ID',
+    'category_id':        'CATEGORY_ID',
+    'category_name':      'CATEGORY_NAME',
+    'url_to':             'TO_URL',
+    'data_requisicao':    'DATE_SCRAPING',
+}
+
+
+def _schema_arrow():
+    """Mismo esquema que DTYPES_BRANDS, pero en Arrow (category_name queda como diccionario = categórica)."""
+    tipos = {
+        'string': pa.string(),
+        'Int64': pa.int64(),
+        'int64': pa.int64(),
+        'category': pa.dictionary(pa.int32(), pa.string()),
+    }
+    return pa.schema([(col, tipos[dtype]) for col, dtype in DTYPES_BRANDS.items()])
+
+
+class EscritorBrands:
+    """
+    Va agregando al archivo las filas de cada categoría a medida que llegan, sin juntar todo en memoria.
+
+    El formato sale de la extensión (.parquet o .csv). Si se pide Parquet y no está pyarrow, se cae a CSV.
+    Se escribe sobre un archivo temporal que solo se renombra al final si todo salió bien, así nunca queda
+    un archivo a medio escribir con el nombre definitivo.
+    """
+
+    def __init__(self, ruta):
+        base, ext = os.path.splitext(ruta)
+        self.formato = ext.lstrip('.').lower() or 'csv'
+        if self.formato not in ('parquet', 'csv'):
+            raise ValueError(f"Formato de salida no soportado: {ext}")
+        if self.formato == 'parquet' and pa is None:
+            print("pyarrow no está instalado, guardamos en CSV.")
+            self.formato = 'csv'
+
+        self.ruta = f"{base}.{self.formato}"
+        self._ruta_tmp = self.ruta + ".tmp"
+        self._writer = None
+        self._con_header = True
+        self.total_filas = 0
+
+        if self.formato == 'parquet':
+            self._schema = _schema_arrow()
+            self._writer = pq.ParquetWriter(self._ruta_tmp, self._schema)
+        else:
+            # Arrancamos el CSV vacío; cada categoría se agrega con mode='a'
+            open(self._ruta_tmp, 'w').close()
+
+    def escribir(self, filas):
+        """Agrega las filas (lista de dicts del crawler) al final del archivo."""
+        if not filas:
+            return
+        if self.formato == 'parquet':
+            tabla = pa.Table.from_pylist([{col: fila.get(col) for col in COLUNAS_BRANDS} for fila in filas],
+                                         schema=self._schema)
+            self._writer.write_table(tabla)
+        else:
+            pd.DataFrame(filas, columns=COLUNAS_BRANDS).to_csv(
+                self._ruta_tmp, mode='a', header=self._con_header, index=False
+            )
+            self._con_header = False
+        self.total_filas += len(filas)
+
+    def cerrar(self):
+        if self._writer is not None:
+            self._writer.close()
+        elif self._con_header:
+            # No llegó ninguna fila: dejamos al menos el header, como hacía df.to_csv con la lista vacía
+            pd.DataFrame(columns=COLUNAS_BRANDS).to_csv(self._ruta_tmp, index=False)
+        os.replace(self._ruta_tmp, self.ruta)
+
+    def descartar(self):
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self._ruta_tmp):
+            os.remove(self._ruta_tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.cerrar()
+        else:
+            self.descartar()
+        return False
+
+
+def cargar_brands(ruta, renombrar=False):
+    """
+    Lee el archivo del crawler (Parquet o CSV) ya con los tipos de DTYPES_BRANDS.
+    Con renombrar=True devuelve las columnas con los nombres de la tabla de BigQuery (USERNAME_SHOPEE, etc.).
+    """
+    if ruta.endswith('.parquet'):
+        df = pd.read_parquet(ruta).astype(DTYPES_BRANDS)
+    else:
+        df = pd.read_csv(ruta, dtype=DTYPES_BRANDS, keep_default_na=False, na_values=[''])
+
+    if renombrar:
+        df = df[list(COLUNAS_TABLA)].rename(columns=COLUNAS_TABLA)
+    return df
@@ -1,54 +1,41 @@
-import unicodedata
-import re
 import pandas as pd
 from datetime import datetime
 import pandas as pd
-from melitk.bigquery import BigQueryDatameshClientBuilder, BigQueryClientBuilderError
-import random
-import string
-
-# Poner en mayúsculas las primeras columnas de nombre
-df_shopee['USERNAME_SHOPEE'] = df_shopee['USERNAME_SHOPEE'].str.upper()
-df_shopee['BRAND_NAME_SHOPEE'] = df_shopee['BRAND_NAME_SHOPEE'].str.upper()
-
-# Reemplazar ".", "_", "-" por espacio en las dos columnas
-df_shopee['USERNAME_SHOPEE'] = df_shopee['USERNAME_SHOPEE'].str.replace(r'[._-]', ' ', regex=True)
-df_shopee['BRAND_NAME_SHOPEE'] = df_shopee['BRAND_NAME_SHOPEE'].str.replace(r'[._-]', ' ', regex=True)
-
+from melitk.bigquery import BigQueryClientBuilderError
+import glob
+import os
+import sys
+from pathlib import Path
+
+# Para poder importar el paquete common desde la raíz del repo
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from common.consultas import CONSULTA_UNIC_IDS, TABLA_BRANDS, backend_compartido, leer
+from common.instrumentacion import Instrumentador, marcar_error
+from common.normalizacion import normalizar_tabla_shopee
+from common.pipeline import en_cache
+from common.primera_aparicion import IndicePrimeraAparicion, preparar_indice, sincronizar_tabla_lateral
+from common.registro_unic_ids import RegistroUnicIds
+from common.unic_id import atribuir_unic_ids
+from common.upsert import upsert
+from escritor_brands import cargar_brands
+
+# Métricas de cada sección (tiempo, CPU, pico de memoria, filas y consultas a BigQuery) en METRICAS_ARCHIVO
+metricas = Instrumentador('carga')
+
+# Cargar el archivo del crawler (el más nuevo, o el que se pase en ARCHIVO_BRANDS), ya con las columnas tipadas
+etapa = metricas.paso('archivo_crawler')
+archivo_brands = os.environ.get("ARCHIVO_BRANDS") or max(glob.glob("brands_shopee_*.parquet") + glob.glob("brands_shopee_*.csv"))
+df_shopee = cargar_brands(archivo_brands, renombrar=True)
+print(f"Archivo del crawler cargado: {archivo_brands} ({len(df_shopee)} filas)")
+etapa['filas_salida'] = len(df_shopee)
+
+# Etapa "normalizacion": si este mismo archivo ya se normalizó, se reutiliza el resultado guardado
+# (mayúsculas, ".", "_", "-" por espacio en las dos columnas y normalizador compartido en BRAND_NAME_SHOPEE)
+etapa = metricas.paso('normalizacion', filas_entrada=len(df_shopee))
+df_shopee = en_cache('normalizacion', lambda: normalizar_tabla_shopee(df_shopee.copy()), df_shopee)
 print(df_shopee)
 
-def limpiar_nome_marca(nome):
-    if pd.isna(nome):
-        return nome
-
-    # Reglas específicas para reemplazos directos
-    nome = nome.replace('!', '')
-    nome = nome.replace('(', '').replace(')', '')
-    nome = nome.replace('_', ' ')
-    nome = nome.replace("'", '')
-    nome = nome.replace('|', '')
-    nome = nome.replace(',', '')
-    nome = nome.replace('/', '')
-    nome = nome.replace('=', '')
-    nome = nome.replace('>', '')
-    nome = nome.replace('<', '')
-
-    # Reemplazar " & " o variantes con espacio por " E "
-    nome = re.sub(r'\s*&\s*', ' E ', nome)
-    # Mantener & solo cuando esté entre letras y sin espacios (ej: P&P), eso ya está cubierto arriba
-
-    # Sacar tildes y acentos en general
-    nome = unicodedata.normalize('NFKD', nome).encode('ASCII', 'ignore').decode('utf-8')
-
-    # Quitar espacios repetidos
-    nome = re.sub(r'\s+', ' ', nome)
-
-    # Sacar espacios al principio y al final y pasar todo a MAYÚSCULAS
-    return nome.strip().upper()
-
-# Aplicar a la columna BRAND_NAME_SHOPEE
-df_shopee['BRAND_NAME_SHOPEE'] = df_shopee['BRAND_NAME_SHOPEE'].apply(limpiar_nome_marca)
-
 # Verificar si hay caracteres especiales (cualquier cosa que no sea letra, número o espacio)
 pattern = r'[^A-Za-z0-9 ]'
 
@@ -70,111 +57,68 @@ nomes_unicos = df_shopee['BRAND_NAME_SHOPEE'].drop_duplicates()
 
 # Mostrar los primeros nombres únicos
 print(nomes_unicos)
+etapa['filas_salida'] = len(df_shopee)
 
-# Ahora vamos a buscar todos los resultados de todos los meses para crear UNIC_IDs solo para las tiendas nuevas, las que ya existen deben reutilizar sus IDs correspondientes.
+# Ahora vamos a crear UNIC_IDs solo para las tiendas nuevas, las que ya existen deben reutilizar sus IDs correspondientes.
+# Los IDs conocidos salen del registro local (registro_unic_ids.sqlite3); solo la primera vez, con el registro vacío,
+# se baja del histórico de BigQuery lo mínimo para sembrarlo (marca, SHOPID y UNIC_ID).
 
-# Inicializar df_old vacío para evitar error si falla la query
-df_old = pd.DataFrame()
+etapa = metricas.paso('unic_id', filas_entrada=len(df_shopee))
+registro_ids = RegistroUnicIds()
 
-# Conectar a BigQuery
-try:
-    bigquery_client = BigQueryDatameshClientBuilder()\
-        .with_dme_name("DME_ATTACH_DME000418", env='DEV')\
-        .build()
-    print("✅ Conexión con BigQuery establecida!")
+# Un solo cliente de BigQuery para las lecturas (compartido con las demás etapas si corren en el mismo proceso)
+backend_bq = backend_compartido('DEV')
 
-    query = """
-    SELECT *
-    FROM `ddme000418-dn88p8g386x-furyid.TBL.DM_SHOPEE_OFFICIAL_BRANDS`;
-    """
-
-    # Ejecutar la consulta
-    response = bigquery_client.query_to_df(query)
+# También se siembra si el registro es de antes de que se guardaran todos los IDs del histórico como ocupados
+if registro_ids.necesita_semilla():
+    try:
+        # Solo las columnas que necesita el UNIC_ID (nada de SELECT *), ordenadas para que gane el ID más reciente
+        df_dme = leer(backend_bq, CONSULTA_UNIC_IDS).sort_values('DATE_SCRAPING', kind='stable')
 
-    # Acceder al DataFrame
-    df_dme = response.df
+        print("✅ Acceso a la tabla confirmado!")
+        print(df_dme.head())
 
-    print("✅ Acceso a la tabla confirmado!")
-    print(df_dme.head())
-    print(df_dme.columns)
+        registro_ids.sembrar(df_dme)
 
-except BigQueryClientBuilderError as e:
-    print(f"Error al construir el cliente: {e}")
-except Exception as e:
-    print(f"Error inesperado: {e}")
+    except Exception as e:
+        # Sin el histórico el registro queda vacío y todas las marcas recibirían un UNIC_ID nuevo (y quedaría
+        # guardado para siempre): mejor cortar acá y volver a correr
+        marcar_error(etapa, e)
+        registro_ids.cerrar()
+        print(f"Error al sembrar el registro de UNIC_IDs desde BigQuery: {e}")
+        raise RuntimeError("No se pudo sembrar el registro de UNIC_IDs desde BigQuery; no se asignan IDs") from e
 
 '''
-Para cada fila en df_shopee, chequear si hay una tienda igual en df_dme, con el mismo SHOPID y BRAND_NAME_SHOPEE.
+Para cada fila en df_shopee, chequear si la marca (BRAND_NAME_SHOPEE) ya está en el registro de UNIC_IDs.
 
-Si la encuentra, tomar el UNIC_ID correspondiente de df_dme y ponerlo en la nueva columna UNIC_ID de df_shopee.
+Si la encuentra, tomar el UNIC_ID correspondiente y ponerlo en la nueva columna UNIC_ID de df_shopee.
 
-Si no la encuentra, generar un nuevo UNIC_ID alfanumérico (5 dígitos, letras mayúsculas) que todavía no exista en df_dme, y agregarlo en df_shopee y también en df_dme, si querés mantener la base actualizada.
+Si no la encuentra, generar su UNIC_ID alfanumérico (5 dígitos, letras mayúsculas) a partir del hash del nombre,
+probando el siguiente si ya está ocupado, y guardarlo en el registro para las próximas corridas.
 '''
 
-# Función para generar nuevo UNIC_ID
-def gerar_unic_id_existentes(existentes):
-    while True:
-        novo_id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
-        if novo_id not in existentes:
-            return novo_id
-
-# Set con UNIC_IDs que ya existen
-unic_ids_existentes = set(df_dme['UNIC_ID'])
-
-# Diccionario para mapear brand_name a UNIC_ID (para que sea consistente)
-brand_to_id = dict(zip(df_dme['BRAND_NAME_SHOPEE'], df_dme['UNIC_ID']))
-
-# Lista para guardar nuevas filas que se van a agregar a df_dme
-novas_linhas_dme = []
-
-# Lista para llenar la columna en df_shopee
-unic_ids_shopee = []
-
-for _, row in df_shopee.iterrows():
-    brand = row['BRAND_NAME_SHOPEE']
+df_shopee['UNIC_ID'], novas_lojas_df = atribuir_unic_ids(df_shopee, registro_ids)
+registro_ids.cerrar()
+etapa.update(filas_salida=len(df_shopee), ids_nuevos=len(novas_lojas_df))
 
-    # Ya tenemos ese brand registrado?
-    if brand in brand_to_id:
-        unic_id = brand_to_id[brand]
-    else:
-        # Brand nuevo: generar nuevo UNIC_ID y registrar
-        unic_id = gerar_unic_id_existentes(unic_ids_existentes)
-        unic_ids_existentes.add(unic_id)
-        brand_to_id[brand] = unic_id  # guardar para próximas veces
-        novas_linhas_dme.append({'BRAND_NAME_SHOPEE': brand, 'SHOPID': row['SHOPID'], 'UNIC_ID': unic_id})
-
-    unic_ids_shopee.append(unic_id)
-
-# Agregar columna en df_shopee
-df_shopee['UNIC_ID'] = unic_ids_shopee
+# Lista con las nuevas filas (mismo formato de siempre)
+novas_linhas_dme = novas_lojas_df.to_dict('records')
 
 # Mostrar las nuevas marcas agregadas
-novas_lojas_df = pd.DataFrame(novas_linhas_dme)
 if not novas_lojas_df.empty:
     print("Nuevas tiendas agregadas con UNIC_IDs nuevos:")
     print(novas_lojas_df)
 else:
     print("No se agregaron nuevas tiendas.")
 
-# Actualizar df_dme si querés mantener las nuevas marcas
-df_dme = pd.concat([df_dme, novas_lojas_df], ignore_index=True)
-
 print(df_shopee)
 
-# Ver nuevas tiendas agregadas
-novas_lojas_df = pd.DataFrame(novas_linhas_dme)
-
-# Imprimir si hay nuevas
-if not novas_lojas_df.empty:
-    print("Nuevas tiendas agregadas con UNIC_IDs nuevos:")
-    print(novas_lojas_df)
-else:
-    print("No se agregaron nuevas tiendas.")
-
 # Meter los datos del mes en la tabla de backup de datos del scraper
 
 from datetime import datetime as dt
 
+etapa = metricas.paso('auditoria_first_appearence', filas_entrada=len(df_shopee))
+
 # Crear y llenar columnas extras
 horario = dt.now().isoformat()
 df_shopee['AUD_INS_DTTM'] = pd.to_datetime(horario)
@@ -183,6 +127,24 @@ df_shopee['AUD_UPD_DTTM'] = pd.to_datetime(horario)
 # Convertir la columna 'DATE' a tipo datetime
 df_shopee['DATE_SCRAPING'] = pd.to_datetime(df_shopee['DATE_SCRAPING'], errors='coerce')
 
+# FIRST_APPEARENCE: se estampa acá mismo con el índice local UNIC_ID -> primera aparición, mirando solo las filas
+# de este scraping (nada de leer el histórico entero ni de reescribir la tabla para corregirlo después)
+indice_first = IndicePrimeraAparicion()
+try:
+    preparar_indice(backend_bq, indice_first)
+except Exception as e:
+    # Sin el histórico todas las marcas quedarían con la fecha de hoy, en el índice y en las dos tablas:
+    # mejor cortar acá (sin estampar ni cargar nada) y volver a correr
+    marcar_error(etapa, e)
+    indice_first.cerrar()
+    print(f"No se pudo preparar el índice de FIRST_APPEARENCE: {e}")
+    raise RuntimeError("No se pudo sembrar el índice de FIRST_APPEARENCE; no se carga el scraping") from e
+
+# Las fechas nuevas quedan en el índice recién cuando la carga a la tabla salió bien (ver más abajo)
+df_shopee['FIRST_APPEARENCE'], cambios_first = indice_first.estampar(df_shopee)
+print(f"UNIC_IDs con primera aparición nueva o corregida: {len(cambios_first)}")
+etapa.update(filas_salida=len(df_shopee), cambios_first=len(cambios_first))
+
 print("Proceso ETL terminado!")
 
 print(df_shopee.dtypes)
@@ -191,141 +153,44 @@ print(df_shopee)
 
 # Mandar los datos a la tabla del DME
 
-from melitk.bigquery import BigQueryDatameshClientBuilder, BigQueryClientBuilderError
-import pandas as pd
 import traceback
 
-try:
-    # Construir el cliente de BigQuery
-    bigquery_client = BigQueryDatameshClientBuilder()\
-        .with_dme_name("DME_ATTACH_DME000418")\
-        .build()
-except Exception as e:
-    print("Error completo:")
-    traceback.print_exc()
-    bigquery_client = None  
+etapa = metricas.paso('upsert', filas_entrada=len(df_shopee))
 
-if bigquery_client is not None:
-    try:
-        # Definir el ID de la tabla donde se van a meter los datos
-        table_id = 'ddme000418-dn88p8g386x-furyid.TBL.DM_SHOPEE_OFFICIAL_BRANDS'
-        
-        # Configs del job
-        job_config_attributes = {
-            "create_disposition": "CREATE_NEVER",  # No crear la tabla si no existe
-            "mode": "append"  # Meter los datos a la tabla que ya está
-        }
-
-        # Meter el DataFrame al BigQuery
-        bigquery_client.df_to_gbq(df_shopee, table_id, **job_config_attributes)
-
-        print("Datos metidos con éxito en BigQuery.")
-    except Exception as e:
-        print(f"Error al meter datos en BigQuery: {e}")
-else:
-    print("El cliente de BigQuery no se inicializó bien.")
-
-import pandas as pd
-from datetime import datetime, datetime as dt
-from melitk.bigquery import BigQueryDatameshClientBuilder, BigQueryClientBuilderError
-
-# --------------------------------------------------------
-# 1. CONEXIÓN CON BIGQUERY Y EXTRACCIÓN DE LA BASE DEL CRAWLER
-# --------------------------------------------------------
-
-# Inicializo df_old vacío solo para evitar errores si la consulta falla
-df_old = pd.DataFrame()
+# Las cargas a la tabla usan el ambiente por defecto del DME (como siempre)
+backend_carga = backend_compartido(None)
 
+# Si la carga falla la corrida falla con ella: seguir (y sincronizar la tabla lateral) dejaría la tabla sin el
+# scraping del día sin que nadie se entere
 try:
-    # Construyo el cliente de BigQuery usando la configuración del DME
-    bigquery_client = BigQueryDatameshClientBuilder()\
-        .with_dme_name("DME_ATTACH_DME000418", env='DEV')\
-        .build()
-    
-    print("✅ ¡Conexión con BigQuery establecida!")
-
-    # Defino la consulta para obtener los datos de la tabla
-    query = """SELECT * FROM `ddme000418-dn88p8g386x-furyid.TBL.DM_SHOPEE_OFFICIAL_BRANDS`"""
-
-    # Ejecuto la consulta y guardo el resultado como DataFrame
-    response = bigquery_client.query_to_df(query)  
-    df_api = response.df  
-
-    print("✅ ¡Acceso a la tabla confirmado!")
-    print(df_api.head())  
-    print(df_api.columns)
+    # Upsert por clave: solo se insertan las filas nuevas y se actualizan las que cambiaron (nada de append a ciegas)
+    resultado_carga = upsert(backend_carga, df_shopee, TABLA_BRANDS)
 
+    print(f"Datos metidos con éxito en BigQuery: {resultado_carga['insertados']} nuevas, "
+          f"{resultado_carga['actualizados']} actualizadas.")
+    etapa.update(filas_salida=resultado_carga['insertados'] + resultado_carga['actualizados'], **resultado_carga)
 except BigQueryClientBuilderError as e:
-    print(f"Error al construir el cliente: {e}")
+    marcar_error(etapa, e)
+    print("Error completo:")
+    traceback.print_exc()
+    raise
 except Exception as e:
-    print(f"Error inesperado: {e}")
-
-# --------------------------------------------------------
-# 2. AJUSTES EN FIRST_APPEARENCE (¡HORA DE LIMPIAR 🔍!) PQ ESQUECI SORRY
-# --------------------------------------------------------
-
-# Me aseguro de que la columna FIRST_APPEARENCE esté en formato datetime
-df_api['FIRST_APPEARENCE'] = pd.to_datetime(df_api['FIRST_APPEARENCE'], errors='coerce')
-
-# Creo la máscara para los datos de julio/2025 (ajustar si es necesario en el futuro)
-mask_jul25 = (
-    (df_api['DATE_SCRAPING'].dt.year == 2025) &
-    (df_api['DATE_SCRAPING'].dt.month == 7)
-)
-
-# Tomo todo el histórico fuera de julio/2025 que ya tiene FIRST_APPEARENCE lleno
-historico = df_api.loc[~mask_jul25 & df_api['FIRST_APPEARENCE'].notna()]
-
-# Creo un diccionario que mapea el menor FIRST_APPEARENCE por UNIC_ID
-map_first = (
-    historico
-        .groupby('UNIC_ID')['FIRST_APPEARENCE']
-        .min()
-        .to_dict()
-)
-
-# Para los registros de julio/2025, intento completar FIRST_APPEARENCE usando el diccionario
-df_api.loc[mask_jul25, 'FIRST_APPEARENCE'] = (
-    df_api.loc[mask_jul25, 'UNIC_ID'].map(map_first)
-)
-
-# Para los que aún quedaron sin fecha (NaT), asigno una fecha por defecto (se puede cambiar)
-data_padrao = pd.Timestamp('2025-07-11')
-df_api.loc[mask_jul25, 'FIRST_APPEARENCE'] = (
-    df_api.loc[mask_jul25, 'FIRST_APPEARENCE']
-        .fillna(data_padrao)
-)
-
-# Muestro el resultado para confirmar que todo salió bien
-print(df_api)
-
-# --------------------------------------------------------
-# 3. INSERCIÓN DE LOS DATOS EN BIGQUERY (¡VAMOS CON TODO 🚀!)
-# --------------------------------------------------------
+    marcar_error(etapa, e)
+    print(f"Error al meter datos en BigQuery: {e}")
+    raise
+
+# La tabla ya tiene las fechas de este scraping: recién ahora se guardan en el índice (pendientes de la tabla lateral)
+indice_first.registrar(cambios_first)
 
+etapa = metricas.paso('tabla_first_appearence', filas_entrada=len(cambios_first))
 try:
-    # Reutilizo el mismo cliente (podría recrearse, pero ya está listo aquí)
-    bigquery_client = BigQueryDatameshClientBuilder()\
-        .with_dme_name("DME_ATTACH_DME000418", env='DEV')\
-        .build()
-
-    print("Iniciando la inserción de los datos en BigQuery...")
-
-    # Nombre de la tabla de destino
-    table_id = 'ddme000418-dn88p8g386x-furyid.TBL.DM_SHOPEE_OFFICIAL_BRANDS'
-    
-    # Configuraciones del job de carga
-    job_config_attributes = {
-        "create_disposition": "CREATE_NEVER",  # No crea una tabla nueva
-        "mode": "replace"  # Reemplaza los datos existentes
-    }
-
-    # Inserto el DataFrame en BigQuery con las configuraciones definidas
-    bigquery_client.df_to_gbq(df_api, table_id, **job_config_attributes)
-
-    print("✅ Datos insertados exitosamente en BigQuery.")
-    
-except BigQueryClientBuilderError as builder_error:
-    print(f"Error al construir el cliente de BigQuery: {builder_error}")
+    # La tabla lateral de FIRST_APPEARENCE recibe solo los UNIC_ID que cambiaron (los de esta corrida y los que
+    # quedaron pendientes de una anterior); si falla, siguen pendientes para la próxima
+    resultado_first = sincronizar_tabla_lateral(backend_bq, indice_first)
+    etapa['filas_salida'] = resultado_first['insertados'] + resultado_first['actualizados']
 except Exception as e:
-    print(f"Ocurrió un error: {e}")
+    marcar_error(etapa, e)
+    print(f"Error al actualizar la tabla de FIRST_APPEARENCE (queda pendiente para la próxima corrida): {e}")
+indice_first.cerrar()
+
+metricas.terminar()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos compartidos se importan como `common.*` desde la raíz del repositorio, igual que en los scripts
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
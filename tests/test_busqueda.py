@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from common.busqueda import top_k, top_k_en_bloques
+
+
+def _fuerza_bruta(consultas, candidatos, k):
+    """Similitud coseno de cada consulta contra todos los candidatos y orden completo, como el cos_sim de antes."""
+    consultas = consultas / np.linalg.norm(consultas, axis=1, keepdims=True)
+    candidatos = candidatos / np.linalg.norm(candidatos, axis=1, keepdims=True)
+    sim = consultas @ candidatos.T
+    orden = np.argsort(-sim, axis=1)[:, :k]
+    return orden, np.take_along_axis(sim, orden, axis=1)
+
+
+def _datos(n_consultas, n_candidatos, dim=16, semilla=0):
+    rng = np.random.default_rng(semilla)
+    return rng.standard_normal((n_consultas, dim)), rng.standard_normal((n_candidatos, dim))
+
+
+@pytest.mark.parametrize("k", [1, 3, 10])
+@pytest.mark.parametrize("bloque_consultas,bloque_candidatos", [(1024, 65536), (7, 13), (1, 1)])
+def test_top_k_igual_a_fuerza_bruta(k, bloque_consultas, bloque_candidatos):
+    consultas, candidatos = _datos(50, 200)
+    indices, scores = top_k(consultas, candidatos, k=k, bloque_consultas=bloque_consultas,
+                            bloque_candidatos=bloque_candidatos)
+    esperado_idx, esperado_scores = _fuerza_bruta(consultas, candidatos, k)
+    np.testing.assert_array_equal(indices, esperado_idx)
+    np.testing.assert_allclose(scores, esperado_scores, atol=1e-5)
+
+
+def test_top_k_con_menos_candidatos_que_k():
+    consultas, candidatos = _datos(4, 2)
+    indices, scores = top_k(consultas, candidatos, k=5)
+    assert indices.shape == scores.shape == (4, 2)
+    np.testing.assert_array_equal(indices, _fuerza_bruta(consultas, candidatos, 2)[0])
+
+    indices, scores = top_k(consultas, candidatos[:0], k=3)
+    assert indices.shape == (4, 0)
+
+
+@pytest.mark.parametrize("k", [1, 3])
+def test_top_k_en_bloques_igual_a_fuerza_bruta_por_bloque(k):
+    consultas, candidatos = _datos(40, 100, semilla=1)
+    rng = np.random.default_rng(2)
+    # Bloques de distinto tamaño (algunos más chicos que k, uno vacío), completados con -1
+    bloques = np.full((len(consultas), 6), -1, dtype=np.int64)
+    for i in range(len(consultas)):
+        tamano = i % 7
+        bloques[i, :tamano] = rng.choice(len(candidatos), tamano, replace=False)
+
+    indices, scores = top_k_en_bloques(consultas, candidatos, bloques, k=k, bloque_consultas=9)
+    for i, bloque in enumerate(bloques):
+        propios = bloque[bloque >= 0]
+        orden, sim = _fuerza_bruta(consultas[i:i + 1], candidatos[propios], k)
+        n = len(orden[0])
+        np.testing.assert_array_equal(indices[i, :n], propios[orden[0]])
+        np.testing.assert_allclose(scores[i, :n], sim[0], atol=1e-5)
+        assert (indices[i, n:] == -1).all() and np.isneginf(scores[i, n:]).all()
+
+
+def test_top_k_en_bloques_sin_candidatos():
+    consultas, candidatos = _datos(3, 5)
+    indices, scores = top_k_en_bloques(consultas, candidatos, np.empty((3, 0), dtype=np.int64), k=2)
+    assert (indices == -1).all() and np.isneginf(scores).all()
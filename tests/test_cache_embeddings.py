@@ -0,0 +1,94 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from common.cache_embeddings import CacheEmbeddings
+
+
+class _Modelo:
+    """encode de mentira: un vector fijo por texto, y registro de qué textos se codificaron."""
+
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.llamadas = []
+
+    def vector(self, texto):
+        return np.random.default_rng(abs(hash(texto)) % 2**32).standard_normal(self.dim).astype(np.float32)
+
+    def __call__(self, textos):
+        self.llamadas.append(list(textos))
+        return np.stack([self.vector(t) for t in textos])
+
+
+def _envejecer(cache, textos, dias):
+    visto = (date.today() - timedelta(days=dias)).isoformat()
+    with cache.conn:
+        cache.conn.executemany("UPDATE textos SET visto = ? WHERE texto = ?", [(visto, t) for t in textos])
+
+
+@pytest.mark.parametrize("dtype,tolerancia", [("float32", 0), ("float16", 1e-2)])
+def test_ida_y_vuelta(tmp_path, dtype, tolerancia):
+    modelo = _Modelo()
+    cache = CacheEmbeddings("modelo/x", dir_cache=str(tmp_path), dtype=dtype)
+    textos = ["ACME", "BETA", "ACME", "  BETA  STORE ", "GAMA"]
+
+    vectores = cache.codificar(textos, modelo)
+    assert vectores.dtype == np.float32
+    esperado = np.stack([modelo.vector(" ".join(t.split())) for t in textos])
+    np.testing.assert_allclose(vectores, esperado, atol=tolerancia)
+    # Cada texto distinto se codifica una sola vez
+    assert modelo.llamadas == [["ACME", "BETA", "BETA STORE", "GAMA"]]
+    cache.cerrar()
+
+    # Otra corrida: lo que ya estaba sale del disco, solo se codifica lo nuevo
+    cache = CacheEmbeddings("modelo/x", dir_cache=str(tmp_path), dtype=dtype)
+    otra_vez = cache.codificar(["GAMA", "DELTA", "BETA STORE"], modelo)
+    assert modelo.llamadas[1:] == [["DELTA"]]
+    np.testing.assert_allclose(otra_vez[[0, 2]], vectores[[4, 3]])
+    assert len(cache) == 5
+    assert cache.codificar([], modelo).shape == (0, modelo.dim)
+    cache.cerrar()
+
+
+def test_descarta_filas_huerfanas(tmp_path):
+    modelo = _Modelo()
+    cache = CacheEmbeddings("m", dir_cache=str(tmp_path), dtype="float32")
+    cache.codificar(["ACME"], modelo)
+    # Una corrida que se cortó después de escribir vectores pero antes de indexarlos
+    with open(cache.ruta_matriz, 'ab') as f:
+        f.write(np.ones((3, modelo.dim), dtype=np.float32).tobytes())
+
+    vectores = cache.codificar(["BETA", "ACME"], modelo)
+    np.testing.assert_array_equal(vectores, np.stack([modelo.vector("BETA"), modelo.vector("ACME")]))
+    assert cache.ruta_matriz.stat().st_size == 2 * modelo.dim * 4
+
+
+def test_otra_dimension_falla(tmp_path):
+    cache = CacheEmbeddings("m", dir_cache=str(tmp_path))
+    cache.codificar(["ACME"], _Modelo(dim=8))
+    with pytest.raises(ValueError, match="dimensiones"):
+        cache.codificar(["BETA"], _Modelo(dim=4))
+
+
+def test_compactar_borra_lo_que_no_se_uso(tmp_path):
+    modelo = _Modelo()
+    cache = CacheEmbeddings("m", dir_cache=str(tmp_path), dtype="float32")
+    textos = [f"T{i}" for i in range(10)]
+    cache.codificar(textos, modelo)
+    viejos = textos[1::3]
+    _envejecer(cache, viejos, dias=100)
+    _envejecer(cache, ["T0"], dias=30)
+
+    assert cache.compactar(dias_sin_uso=90) == len(viejos)
+    assert cache.compactar(dias_sin_uso=90) == 0
+    quedan = [t for t in textos if t not in viejos]
+    assert len(cache) == len(quedan)
+    assert cache.ruta_matriz.stat().st_size == len(quedan) * modelo.dim * 4
+
+    # Los que quedan siguen devolviendo su vector sin codificar de nuevo; los borrados se vuelven a codificar
+    llamadas = len(modelo.llamadas)
+    np.testing.assert_array_equal(cache.codificar(quedan, modelo), np.stack([modelo.vector(t) for t in quedan]))
+    assert len(modelo.llamadas) == llamadas
+    np.testing.assert_array_equal(cache.codificar(viejos, modelo), np.stack([modelo.vector(t) for t in viejos]))
+    assert modelo.llamadas[-1] == viejos
@@ -0,0 +1,92 @@
+from datetime import date
+
+import pandas as pd
+
+from common.consultas import (
+    CONSULTA_MATCH_ANTERIOR, CONSULTA_SHOPEE_MATCH, CONSULTA_UNIC_IDS, BackendLocal, Consulta, leer,
+)
+
+TABLA = 'proyecto.dataset.TABLA'
+TIPOS = {
+    'UNIC_ID':       'object',
+    'SHOPID':        'Int64',
+    'DATE_SCRAPING': 'datetime64[ns, UTC]',
+    'AUD_INS_DTTM':  'datetime64[ns]',
+}
+
+
+def test_sql_bigquery_rango_semiabierto():
+    sql = Consulta(TABLA, TIPOS).con_fechas(date(2024, 5, 1), date(2024, 5, 31)).sql('bigquery')
+    assert "FROM `proyecto.dataset.TABLA`" in sql
+    assert "DATE_SCRAPING >= TIMESTAMP('2024-05-01')" in sql
+    # `hasta` es inclusivo: el filtro corta al principio del día siguiente
+    assert "DATE_SCRAPING < TIMESTAMP('2024-06-01')" in sql
+    assert "DATE(" not in sql
+
+
+def test_sql_bigquery_literal_segun_el_tipo_de_la_columna():
+    # DATETIME en la tabla (sin zona horaria): comparar con un TIMESTAMP no compila en BigQuery
+    sql = Consulta(TABLA, {**TIPOS, 'DATE_SCRAPING': 'datetime64[ns]'}).en_fecha(date(2024, 5, 1)).sql('bigquery')
+    assert "DATE_SCRAPING >= DATETIME('2024-05-01')" in sql
+    assert "DATE_SCRAPING < DATETIME('2024-05-02')" in sql
+    assert "TIMESTAMP" not in sql
+
+
+def test_sql_bigquery_tablas_del_proyecto_con_datetime():
+    for consulta in (CONSULTA_UNIC_IDS, CONSULTA_SHOPEE_MATCH, CONSULTA_MATCH_ANTERIOR):
+        sql = consulta.en_fecha(date(2025, 6, 4)).sql('bigquery')
+        assert "DATE_SCRAPING >= DATETIME('2025-06-04')" in sql
+        assert "DATE_SCRAPING < DATETIME('2025-06-05')" in sql
+
+
+def test_sql_sqlite_un_dia():
+    sql = Consulta(TABLA, TIPOS).en_fecha('2024-12-31 10:00:00').sql('sqlite')
+    assert "FROM TABLA\n" in sql
+    assert "DATE_SCRAPING >= '2024-12-31'" in sql
+    assert "DATE_SCRAPING < '2025-01-01'" in sql
+
+
+def test_sql_lados_abiertos():
+    consulta = Consulta(TABLA, TIPOS)
+    assert "WHERE" not in consulta.sql()
+
+    solo_desde = consulta.con_fechas(desde=date(2024, 1, 1)).sql()
+    assert "DATE_SCRAPING >= TIMESTAMP('2024-01-01')" in solo_desde
+    assert "<" not in solo_desde
+
+    solo_hasta = consulta.con_fechas(hasta=date(2024, 1, 1)).sql()
+    assert "DATE_SCRAPING < TIMESTAMP('2024-01-02')" in solo_hasta
+    assert ">=" not in solo_hasta
+
+
+def test_sql_solo_columnas_pedidas():
+    sql = Consulta(TABLA, {'UNIC_ID': 'object', 'SHOPID': 'Int64'}).sql()
+    assert sql.startswith("SELECT\n    UNIC_ID,\n    SHOPID\nFROM")
+
+
+def _backend_con_datos():
+    backend = BackendLocal()
+    backend.cargar_tabla(TABLA, pd.DataFrame({
+        'UNIC_ID': ['a', 'b', 'c'],
+        'SHOPID': [1, None, 3],
+        'DATE_SCRAPING': pd.to_datetime(['2024-05-01 08:00', '2024-05-02 09:00', '2024-05-03 10:00']),
+        'AUD_INS_DTTM': pd.to_datetime(['2024-05-01', '2024-05-02', '2024-05-03']),
+        'OTRA': ['x', 'y', 'z'],
+    }))
+    return backend
+
+
+def test_leer_castea_tipos():
+    df = leer(_backend_con_datos(), Consulta(TABLA, TIPOS))
+
+    assert list(df.columns) == list(TIPOS)
+    assert df['SHOPID'].dtype == 'Int64'
+    assert df['SHOPID'].isna().tolist() == [False, True, False]
+    assert str(df['DATE_SCRAPING'].dtype) == 'datetime64[ns, UTC]'
+    assert str(df['AUD_INS_DTTM'].dtype) == 'datetime64[ns]'
+    assert df['DATE_SCRAPING'].iloc[0] == pd.Timestamp('2024-05-01 08:00', tz='UTC')
+
+
+def test_leer_filtra_por_fecha():
+    df = leer(_backend_con_datos(), Consulta(TABLA, TIPOS).en_fecha(date(2024, 5, 2)))
+    assert df['UNIC_ID'].tolist() == ['b']
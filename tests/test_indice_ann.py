@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+
+import common.indice_ann as indice_ann
+from common.busqueda import top_k
+from common.indice_ann import IndiceIVF
+
+
+class _Modelo:
+    """codificar de mentira: un vector fijo por texto, y registro de qué textos se codificaron."""
+
+    def __init__(self, dim=16):
+        self.dim = dim
+        self.llamadas = []
+
+    def vector(self, texto):
+        return np.random.default_rng(int(texto.split('_')[-1])).standard_normal(self.dim)
+
+    def __call__(self, textos):
+        self.llamadas.append(list(textos))
+        return np.stack([self.vector(t) for t in textos])
+
+
+def _candidatos(n, desde=0):
+    claves = [f"TO{i}|OFS_NAME" for i in range(desde, desde + n)]
+    return claves, [f"texto_{i}" for i in range(desde, desde + n)]
+
+
+@pytest.fixture
+def ivf_chico(monkeypatch):
+    # Con pocos vectores el índice usa una sola lista; se baja el mínimo para probar varias listas
+    monkeypatch.setattr(indice_ann, 'MIN_VECTORES_IVF', 50)
+
+
+def test_nprobe_todas_las_listas_es_exacto(tmp_path, ivf_chico):
+    modelo = _Modelo()
+    indice = IndiceIVF("meli", dir_indice=str(tmp_path))
+    indice.sincronizar(*_candidatos(400), modelo)
+    assert len(indice.centroides) == int(4 * np.sqrt(400))
+
+    consultas = np.random.default_rng(99).standard_normal((30, modelo.dim))
+    indices, scores = indice.buscar(consultas, k=5, nprobe=len(indice.centroides))
+    esperado_idx, esperado_scores = top_k(consultas, indice.vectores, k=5)
+    np.testing.assert_array_equal(indices, esperado_idx)
+    np.testing.assert_allclose(scores, esperado_scores, atol=1e-5)
+
+    # Con menos listas puede perder recall, pero nunca devuelve algo mejor que lo exacto
+    _, aproximado = indice.buscar(consultas, k=5, nprobe=2)
+    assert (aproximado[:, 0] <= esperado_scores[:, 0] + 1e-5).all()
+
+
+def test_una_sola_lista_es_exacta(tmp_path):
+    modelo = _Modelo()
+    indice = IndiceIVF("meli", dir_indice=str(tmp_path))
+    indice.sincronizar(*_candidatos(40), modelo)
+    assert len(indice.centroides) == 1
+
+    consultas = np.random.default_rng(7).standard_normal((10, modelo.dim))
+    indices, _ = indice.buscar(consultas, k=50, nprobe=1)
+    np.testing.assert_array_equal(indices[:, :40], top_k(consultas, indice.vectores, k=40)[0])
+    assert (indices[:, 40:] == -1).all()
+
+
+def test_sincronizar_codifica_solo_lo_nuevo_y_persiste(tmp_path, ivf_chico):
+    modelo = _Modelo()
+    claves, textos = _candidatos(100)
+    indice = IndiceIVF("meli", dir_indice=str(tmp_path))
+    indice.sincronizar(claves, textos, modelo)
+
+    # Otra corrida con el índice de disco: sin cambios no codifica nada
+    indice = IndiceIVF("meli", dir_indice=str(tmp_path))
+    indice.sincronizar(claves, textos, modelo)
+    assert len(modelo.llamadas) == 1
+
+    # Un texto cambiado, uno borrado y uno nuevo
+    textos[3] = "texto_1003"
+    nuevas_claves, nuevos_textos = _candidatos(1, desde=500)
+    indice.sincronizar(claves[:-1] + nuevas_claves, textos[:-1] + nuevos_textos, modelo)
+    assert modelo.llamadas[-1] == ["texto_1003", "texto_500"]
+    assert sorted(indice.claves) == sorted(claves[:-1] + nuevas_claves)
+    fila = indice.claves.index(claves[3])
+    vector = modelo.vector("texto_1003")
+    np.testing.assert_allclose(indice.vectores[fila], vector / np.linalg.norm(vector), atol=1e-6)
+
+    recargado = IndiceIVF("meli", dir_indice=str(tmp_path))
+    assert recargado.claves == indice.claves
+    np.testing.assert_array_equal(recargado.vectores, indice.vectores)
+    np.testing.assert_array_equal(recargado.listas, indice.listas)
+
+
+def test_reentrena_al_pasar_el_umbral(tmp_path, ivf_chico, monkeypatch):
+    entrenamientos = []
+    entrenar = IndiceIVF._entrenar
+    monkeypatch.setattr(IndiceIVF, '_entrenar', lambda self: (entrenamientos.append(len(self)), entrenar(self)))
+
+    modelo = _Modelo()
+    claves, textos = _candidatos(100)
+    indice = IndiceIVF("meli", dir_indice=str(tmp_path))
+    indice.sincronizar(claves, textos, modelo)
+    assert entrenamientos == [100]
+
+    # 20 cambios sobre 110: por debajo del 20%, los vectores nuevos van a la lista más cercana
+    mas_claves, mas_textos = _candidatos(10, desde=100)
+    claves, textos = claves[10:] + mas_claves, textos[10:] + mas_textos
+    indice.sincronizar(claves, textos, modelo)
+    assert entrenamientos == [100]
+    assert indice.cambios_desde_entrenamiento == 20
+    centroides = indice.centroides
+    np.testing.assert_array_equal(indice.listas, top_k(indice.vectores, centroides, k=1, normalizados=True)[0][:, 0])
+
+    # Los cambios se acumulan entre corridas: 20 + 3 > 0.2 * 103
+    mas_claves, mas_textos = _candidatos(3, desde=200)
+    indice = IndiceIVF("meli", dir_indice=str(tmp_path))
+    indice.sincronizar(claves + mas_claves, textos + mas_textos, modelo)
+    assert entrenamientos == [100, 103]
+    assert indice.cambios_desde_entrenamiento == 0
+
+
+def test_claves_repetidas_fallan(tmp_path):
+    with pytest.raises(ValueError, match="únicas"):
+        IndiceIVF("meli", dir_indice=str(tmp_path)).sincronizar(["A", "A"], ["x_1", "x_2"], _Modelo())
@@ -0,0 +1,132 @@
+import pandas as pd
+
+from common.match_exato import COLUNAS_MELI, NAO_ENCONTRADO, aplicar_matches, match_exato
+
+
+def _meli(*filas):
+    """Filas (OFS_NAME, OFS_FANTASY_NAME); el resto de las columnas de Meli se arman a partir del id."""
+    df = pd.DataFrame(filas, columns=['OFS_NAME', 'OFS_FANTASY_NAME'])
+    df['OFS_OFFICIAL_STORE_ID'] = [f"TO{i}" for i in range(len(df))]
+    df['SIT_SITE_ID'] = 'MLB'
+    df['OFS_STATUS'] = 'active'
+    df['Category_ID'] = [f"C{i}" for i in range(len(df))]
+    df['CAT_CATEG_ID_L1'] = 'MLB1000'
+    df['CAT_CATEG_NAME_L1'] = 'Eletrônicos'
+    return df
+
+
+def _api(*filas):
+    return pd.DataFrame(filas, columns=['UNIC_ID', 'BRAND_NAME_SHOPEE', 'USERNAME_SHOPEE'])
+
+
+def _cascada_anterior(df_api, df_meli):
+    """La cascada de cuatro merges de input_e_match.py que reemplazó match_exato."""
+    df_trabalho = df_api[['UNIC_ID', 'BRAND_NAME_SHOPEE', 'USERNAME_SHOPEE']].copy()
+    partes, resto = [], df_trabalho
+    for chave_busca, chave_meli in [
+        ('BRAND_NAME_SHOPEE', 'OFS_FANTASY_NAME'), ('BRAND_NAME_SHOPEE', 'OFS_NAME'),
+        ('USERNAME_SHOPEE', 'OFS_FANTASY_NAME'), ('USERNAME_SHOPEE', 'OFS_NAME'),
+    ]:
+        df_temp = resto.merge(df_meli, left_on=chave_busca, right_on=chave_meli, how='inner')
+        df_temp['VALOR_ENCONTRADO'] = chave_busca
+        df_temp['COLUNA_ENCONTRADA_EM'] = chave_meli
+        partes.append(df_temp)
+        resto = resto[~resto['UNIC_ID'].isin(df_temp['UNIC_ID'])]
+
+    resto = resto.copy()
+    resto['VALOR_ENCONTRADO'] = NAO_ENCONTRADO
+    resto['COLUNA_ENCONTRADA_EM'] = NAO_ENCONTRADO
+    for col in COLUNAS_MELI:
+        resto[col] = pd.NA
+    df_merged = pd.concat(partes + [resto], ignore_index=True)
+    df_resultado = df_api.merge(df_merged.drop(columns=['BRAND_NAME_SHOPEE', 'USERNAME_SHOPEE']), on='UNIC_ID', how='left')
+    return df_resultado[list(df_api.columns) + ['VALOR_ENCONTRADO', 'COLUNA_ENCONTRADA_EM'] + COLUNAS_MELI]
+
+
+def _normalizar(df):
+    return df.astype(object).where(df.notna(), None).sort_values('UNIC_ID').reset_index(drop=True)
+
+
+def test_match_exato_igual_a_la_cascada():
+    df_meli = _meli(
+        ('ACME LTDA', 'ACME'),
+        ('BETA', 'BETA STORE'),
+        ('GAMA OFICIAL', None),
+        ('DELTA', 'DELTA FANTASIA'),
+    )
+    df_api = _api(
+        ('u1', 'ACME', 'acme.br'),              # marca vs fantasía
+        ('u2', 'BETA', 'x'),                    # marca vs nombre oficial
+        ('u3', 'NADA', 'GAMA OFICIAL'),         # usuario vs nombre oficial
+        ('u4', 'OTRA', 'DELTA FANTASIA'),       # usuario vs fantasía
+        ('u5', 'SIN MATCH', 'sin.match'),
+        ('u6', 'BETA STORE', 'ACME'),           # marca gana sobre usuario
+    )
+    nuevo = match_exato(df_api, df_meli)
+    pd.testing.assert_frame_equal(_normalizar(nuevo), _normalizar(_cascada_anterior(df_api, df_meli)))
+
+
+def test_match_exato_prioridades():
+    df_meli = _meli(('ACME', 'OTRA COSA'), ('ZETA', 'ACME'))
+    resultado = match_exato(_api(('u1', 'ACME', 'y')), df_meli)
+
+    # El nombre de fantasía gana sobre el nombre oficial aunque esté en una fila posterior
+    fila = resultado.iloc[0]
+    assert fila['COLUNA_ENCONTRADA_EM'] == 'OFS_FANTASY_NAME'
+    assert fila['OFS_OFFICIAL_STORE_ID'] == 'TO1'
+
+
+def test_match_exato_resuelve_por_unic_id():
+    df_meli = _meli(('ACME', None), ('BETA', 'BETA FANTASIA'))
+    df_api = _api(
+        ('u1', 'NADA', 'ACME'),           # solo por usuario
+        ('u1', 'BETA FANTASIA', 'x'),     # mejor coincidencia del mismo UNIC_ID
+        ('u2', 'NADA', 'nada'),
+    )
+    resultado = match_exato(df_api, df_meli)
+
+    assert len(resultado) == 3
+    assert resultado['OFS_OFFICIAL_STORE_ID'].tolist()[:2] == ['TO1', 'TO1']
+    assert resultado['VALOR_ENCONTRADO'].tolist() == ['BRAND_NAME_SHOPEE', 'BRAND_NAME_SHOPEE', NAO_ENCONTRADO]
+    assert resultado['OFS_OFFICIAL_STORE_ID'].isna().tolist() == [False, False, True]
+
+
+def _aplicar_con_loop(df_resultado, df_matches):
+    """El loop fila por fila de input_e_match.py que reemplazó aplicar_matches."""
+    df_resultado = df_resultado.copy()
+    for _, row in df_matches.iterrows():
+        idx = df_resultado[
+            (df_resultado['USERNAME_SHOPEE'] == row['USERNAME_SHOPEE']) &
+            (df_resultado['VALOR_ENCONTRADO'] == NAO_ENCONTRADO) &
+            (df_resultado['COLUNA_ENCONTRADA_EM'] == NAO_ENCONTRADO)
+        ].index
+        if not idx.empty:
+            i = idx[0]
+            df_resultado.at[i, 'VALOR_ENCONTRADO'] = row['MATCH_MELI']
+            df_resultado.at[i, 'COLUNA_ENCONTRADA_EM'] = row['COLUNA_ENCONTRADA_EM']
+            for col in COLUNAS_MELI:
+                df_resultado.at[i, col] = row[col]
+    return df_resultado
+
+
+def test_aplicar_matches_igual_al_loop():
+    df_meli = _meli(('ACME', None), ('OUTRA', None))
+    df_resultado = match_exato(_api(
+        ('u1', 'X', 'loja.a'),
+        ('u2', 'Y', 'loja.a'),
+        ('u3', 'ACME', 'loja.b'),   # ya tiene coincidencia exacta: no se toca
+        ('u4', 'Z', 'loja.b'),
+        ('u5', 'W', 'loja.c'),
+    ), df_meli)
+
+    df_matches = pd.DataFrame({
+        'USERNAME_SHOPEE': ['loja.a', 'loja.b', 'loja.a', 'loja.a', 'loja.x'],
+        'MATCH_MELI': ['M1', 'M2', 'M3', 'M4', 'M5'],
+        'COLUNA_ENCONTRADA_EM': 'OFS_NAME',
+        **{col: [f"{col}_{i}" for i in range(5)] for col in COLUNAS_MELI},
+    })
+
+    nuevo = aplicar_matches(df_resultado, df_matches)
+    pd.testing.assert_frame_equal(_normalizar(nuevo), _normalizar(_aplicar_con_loop(df_resultado, df_matches)))
+    # La primera coincidencia de la tienda va a su primera fila pendiente, la segunda a la segunda
+    assert nuevo['VALOR_ENCONTRADO'].tolist() == ['M1', 'M3', 'BRAND_NAME_SHOPEE', 'M2', NAO_ENCONTRADO]
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from rapidfuzz import fuzz
+
+from common.match_fuzzy import CORTE_BLOQUE_FUZZY, CORTE_MATCH_FUZZY, clave_fuzzy, match_fuzzy
+
+
+def test_cortes_por_defecto():
+    assert (CORTE_MATCH_FUZZY, CORTE_BLOQUE_FUZZY) == (90, 70)
+
+
+def test_clave_fuzzy():
+    assert clave_fuzzy("LOJA XYZ KIT") == clave_fuzzy("X Y Z") == "XYZ"
+    assert clave_fuzzy("xyz oficial") == "XYZ"
+    # Un nombre que es solo sufijos no queda vacío
+    assert clave_fuzzy("LOJA OFICIAL") == "LOJAOFICIAL"
+    # Los sufijos se sacan como palabra entera, no adentro de otra
+    assert clave_fuzzy("BRAVO SHOPPING") == "BRAVOSHOPPING"
+
+
+@pytest.mark.parametrize("nome,candidato,score,aceptado,en_bloque", [
+    ("ABCDEFGHIJ", "ABCDEFGHIJ", 100, True, True),
+    ("ABCDEFGHIJ", "ABCDEFGHIX", 90, True, True),                    # justo en el corte de match
+    ("ABCDEFGHIJKLMNOPQRS", "ABCDEFGHIJKLMNOPQXY", 89, False, True),  # 89.47: queda para BERT
+    ("ABCDEFGHIJ", "ABCDEFGXYZ", 70, False, True),                   # justo en el corte del bloque
+    ("ABCDEFGHIJ", "ABCDEFWXYZ", 60, False, False),                  # fuera del bloque
+])
+def test_cortes_90_y_70(nome, candidato, score, aceptado, en_bloque):
+    assert round(fuzz.ratio(nome, candidato)) == score
+
+    pos, score_match, bloque = match_fuzzy([nome], ["ZZZZZZZZZZ", candidato])
+    assert pos.tolist() == ([1] if aceptado else [-1])
+    assert score_match.tolist() == ([score] if aceptado else [0])
+    assert bloque[0].tolist()[:2] == ([1, -1] if en_bloque else [-1, -1])
+
+
+def test_sufijos_y_espacios_no_cuentan():
+    pos, score_match, _ = match_fuzzy(["LOJA ACME KIT", "A C M E"], ["OTRA", "ACME OFICIAL"])
+    assert pos.tolist() == [1, 1]
+    assert score_match.tolist() == [100, 100]
+
+
+def test_empate_entre_tiendas_distintas_queda_para_bert():
+    textos = ["ACMEX", "ACMEY", "ACMEX"]
+    # Mismo score contra dos TOs distintas: no se decide acá
+    pos, _, bloque = match_fuzzy(["ACME"], textos[:2], grupos=["TO1", "TO2"])
+    assert pos.tolist() == [-1]
+    assert sorted(bloque[0][:2].tolist()) == [0, 1]
+    # Empate entre el nombre y la fantasía de la misma TO: se acepta
+    pos, _, _ = match_fuzzy(["ACMEX"], textos[::2], grupos=["TO1", "TO1"])
+    assert pos.tolist() in ([0], [1])
+    pos, _, _ = match_fuzzy(["ACME"], textos[:2], grupos=["TO1", "TO1"], corte_match=80)
+    assert pos.tolist() in ([0], [1])
+
+
+def _fuerza_bruta(nomes, textos, corte_bloque):
+    """fuzz.ratio de cada par sobre las claves compactas, redondeado como el uint8 de cdist."""
+    scores = np.array([[round(fuzz.ratio(clave_fuzzy(n), clave_fuzzy(t))) for t in textos] for n in nomes])
+    return np.where(scores >= corte_bloque, scores, 0)
+
+
+def test_bloques_igual_a_fuerza_bruta():
+    rng = np.random.default_rng(0)
+    bases = ["".join(rng.choice(list("ABCDEFGH"), 6)) for _ in range(40)]
+    textos = [b + rng.choice(["", " LOJA", " KIT", "X"]) for b in bases]
+    nomes = [b[:-1] + rng.choice(list("ABCZ")) for b in rng.choice(bases, 60)]
+
+    pos, score_match, bloque = match_fuzzy(nomes, textos, tamano_bloque=5)
+    esperado = _fuerza_bruta(nomes, textos, CORTE_BLOQUE_FUZZY)
+    for i in range(len(nomes)):
+        propios = bloque[i][bloque[i] >= 0]
+        scores = esperado[i, propios]
+        # Los mejores del bloque, de mayor a menor, todos por encima del corte
+        assert scores.tolist() == sorted(esperado[i][esperado[i] > 0], reverse=True)[:len(propios)]
+        assert len(propios) == min(5, (esperado[i] > 0).sum())
+        if pos[i] >= 0:
+            assert score_match[i] == esperado[i].max() >= CORTE_MATCH_FUZZY
+        else:
+            assert esperado[i].max() < CORTE_MATCH_FUZZY or (esperado[i] == esperado[i].max()).sum() > 1
+
+
+def test_sin_nombres_o_sin_candidatos():
+    pos, score_match, bloque = match_fuzzy([], ["ACME"])
+    assert pos.shape == score_match.shape == (0,) and bloque.shape == (0, 20)
+    pos, _, bloque = match_fuzzy(["ACME"], [])
+    assert pos.tolist() == [-1] and (bloque == -1).all()
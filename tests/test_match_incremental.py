@@ -0,0 +1,127 @@
+import pandas as pd
+
+from common.match_exato import COLUNAS_MELI, NAO_ENCONTRADO, match_exato
+from common.match_incremental import juntar_con_arrastrados, separar_arrastrados, ultimo_match
+
+
+def _meli(*filas):
+    """Filas (OFS_OFFICIAL_STORE_ID, OFS_NAME, OFS_FANTASY_NAME, OFS_STATUS); el resto de las columnas de Meli fijas."""
+    df = pd.DataFrame(filas, columns=['OFS_OFFICIAL_STORE_ID', 'OFS_NAME', 'OFS_FANTASY_NAME', 'OFS_STATUS'])
+    df['SIT_SITE_ID'] = 'MLB'
+    df['Category_ID'] = [f"C{i}" for i in range(len(df))]
+    df['CAT_CATEG_ID_L1'] = 'MLB1000'
+    df['CAT_CATEG_NAME_L1'] = 'Eletrônicos'
+    return df
+
+
+def _api(*filas):
+    return pd.DataFrame(filas, columns=['UNIC_ID', 'BRAND_NAME_SHOPEE', 'USERNAME_SHOPEE', 'CATEGORY_NAME'])
+
+
+def _anterior(df_resultado, aud_ins='2025-08-01'):
+    """Lo que una corrida deja en la tabla del match (con los nombres de columna de esa tabla)."""
+    df = df_resultado.rename(columns={
+        'UNIC_ID': 'UNIC_ID_SHOPEE', 'VALOR_ENCONTRADO': 'MATCH_VALUE_USED', 'COLUNA_ENCONTRADA_EM': 'MATCH_COLUMN_MELI',
+        'OFS_OFFICIAL_STORE_ID': 'OFFICIAL_STORE_ID_MELI', 'OFS_STATUS': 'OFS_STATUS_MELI',
+        'OFS_NAME': 'LOJA_OFICIAL_MELI', 'OFS_FANTASY_NAME': 'FANTASY_NAME_MELI',
+    })
+    df['FOUND_BY_AI'] = ~(
+        (df['MATCH_VALUE_USED'] == NAO_ENCONTRADO) | (df['MATCH_COLUMN_MELI'] == NAO_ENCONTRADO) |
+        (df['MATCH_VALUE_USED'] == 'ENCONTRADO_MANUAL')
+    )
+    df['AUD_INS_DTTM'] = pd.Timestamp(aud_ins)
+    return df
+
+
+def _normalizar(df):
+    return df.astype(object).where(df.notna(), None).reset_index(drop=True)
+
+
+MELI = _meli(
+    ('TO1', 'ACME', 'ACME FANTASIA', 'active'),
+    ('TO2', 'BETA', None, 'active'),
+    ('TO3', 'GAMA', None, 'active'),
+    ('TO4', 'DELTA', None, 'active'),
+)
+
+API = _api(
+    ('u1', 'ACME', 'acme.br', 'Casa'),
+    ('u1', 'ACME', 'acme.br', 'Moda'),   # la misma tienda en otra categoría
+    ('u2', 'BETA', 'beta.br', 'Casa'),
+    ('u3', 'GAMA', 'gama.br', 'Casa'),
+    ('u4', 'DELTA', 'delta.br', 'Casa'),
+    ('u5', 'NADA', 'nada.br', 'Casa'),
+)
+
+
+def test_sin_corrida_anterior_todo_pendiente():
+    df_arrastrado, pendientes = separar_arrastrados(API, None, MELI)
+    assert df_arrastrado.empty
+    assert pendientes.tolist() == list(range(len(API)))
+
+
+def test_sin_cambios_se_arrastra_lo_automatico_igual_que_el_match():
+    resultado = match_exato(API, MELI)
+    df_arrastrado, pendientes = separar_arrastrados(API, _anterior(resultado), MELI)
+
+    # Las que coincidieron se arrastran tal cual; la que no tenía coincidencia se vuelve a cruzar
+    assert pendientes.tolist() == [5]
+    pd.testing.assert_frame_equal(_normalizar(df_arrastrado), _normalizar(resultado.iloc[:5]))
+
+    # Juntando lo arrastrado con lo recién cruzado queda lo mismo que cruzar todo
+    recien = match_exato(API.iloc[pendientes].reset_index(drop=True), MELI)
+    pd.testing.assert_frame_equal(
+        _normalizar(juntar_con_arrastrados(recien, pendientes, df_arrastrado)), _normalizar(resultado)
+    )
+
+
+def test_solo_se_arrastra_si_nombres_y_to_siguen_iguales():
+    anterior = _anterior(match_exato(API, MELI))
+    api = API.copy()
+    api.loc[2, 'USERNAME_SHOPEE'] = 'beta.oficial'                  # u2 cambió de nombre en Shopee
+    meli = MELI.copy()
+    meli.loc[2, 'OFS_STATUS'] = 'inactive'                          # la TO de u3 cambió de estado
+    meli.loc[3, 'OFS_NAME'] = 'DELTA NUEVA'                         # la TO de u4 cambió de nombre
+    meli.loc[0, 'Category_ID'] = 'C99'                              # otra columna de la TO de u1: no importa
+
+    df_arrastrado, pendientes = separar_arrastrados(api, anterior, meli)
+    assert df_arrastrado['UNIC_ID'].tolist() == ['u1', 'u1']
+    assert pendientes.tolist() == [2, 3, 4, 5]
+    # Las columnas de Meli salen del df_meli actual
+    assert df_arrastrado['Category_ID'].tolist() == ['C99', 'C99']
+
+
+def test_to_borrada_o_tienda_con_otras_filas_no_se_arrastra():
+    anterior = _anterior(match_exato(API, MELI))
+    meli = MELI[MELI['OFS_OFFICIAL_STORE_ID'] != 'TO2'].reset_index(drop=True)
+    api = API.drop(index=1).reset_index(drop=True)                  # u1 ya no está en 'Moda'
+
+    df_arrastrado, pendientes = separar_arrastrados(api, anterior, meli)
+    assert sorted(df_arrastrado['UNIC_ID'].unique()) == ['u3', 'u4']
+    assert api.loc[pendientes, 'UNIC_ID'].tolist() == ['u1', 'u2', 'u5']
+
+
+def test_manual_y_sin_match_no_se_arrastran():
+    resultado = match_exato(API, MELI)
+    resultado.loc[resultado['UNIC_ID'] == 'u2', 'VALOR_ENCONTRADO'] = 'ENCONTRADO_MANUAL'
+    df_arrastrado, pendientes = separar_arrastrados(API, _anterior(resultado), MELI)
+    assert 'u2' not in set(df_arrastrado['UNIC_ID'])
+    assert API.loc[pendientes, 'UNIC_ID'].tolist() == ['u2', 'u5']
+
+
+def test_vale_solo_la_ultima_corrida():
+    resultado = match_exato(API, MELI)
+    sin_match = resultado.copy()
+    sin_match.loc[sin_match['UNIC_ID'] == 'u3', ['VALOR_ENCONTRADO', 'COLUNA_ENCONTRADA_EM']] = NAO_ENCONTRADO
+    sin_match.loc[sin_match['UNIC_ID'] == 'u3', COLUNAS_MELI] = None
+    # u3 coincidió hace dos corridas pero no en la última; u4 al revés
+    anterior = pd.concat([
+        _anterior(resultado[resultado['UNIC_ID'] == 'u3'], '2025-07-01'),
+        _anterior(sin_match[sin_match['UNIC_ID'].isin(['u3', 'u4'])], '2025-08-01'),
+        _anterior(resultado[resultado['UNIC_ID'] == 'u4'], '2025-08-02'),
+    ], ignore_index=True)
+    assert ultimo_match(anterior)['AUD_INS_DTTM'].tolist() == [pd.Timestamp('2025-08-01'), pd.Timestamp('2025-08-02')]
+
+    df_arrastrado, pendientes = separar_arrastrados(API, anterior, MELI)
+    assert df_arrastrado['UNIC_ID'].tolist() == ['u4']
+    assert API.loc[pendientes, 'UNIC_ID'].tolist() == ['u1', 'u1', 'u2', 'u3', 'u5']
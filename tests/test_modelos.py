@@ -0,0 +1,110 @@
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from common import modelos
+
+
+class ModeloFalso:
+    """Hace de SentenceTransformer: un vector fijo por texto (más `ruido` en la primera coordenada)."""
+
+    def __init__(self, ruido=0.0):
+        self.ruido = ruido
+        self.llamadas = 0
+
+    def encode(self, textos, batch_size=32):
+        self.llamadas += 1
+        vectores = np.array([[len(t), 1.0, 2.0] for t in textos], dtype=np.float32)
+        vectores[:, 0] += self.ruido
+        return vectores
+
+
+@pytest.fixture(autouse=True)
+def modelos_cargados():
+    # Los modelos ya "cargados" se ponen a mano en el registro, así no se importa sentence_transformers
+    modelos._MODELOS.clear()
+    yield modelos._MODELOS
+    modelos._MODELOS.clear()
+
+
+def test_verificar_paridad(modelos_cargados):
+    modelos_cargados[('m', 'torch')] = ModeloFalso()
+    modelos_cargados[('m', 'int8')] = ModeloFalso(ruido=0.01)
+    modelos_cargados[('m', 'onnx')] = ModeloFalso(ruido=50.0)
+
+    minimo, ok = modelos.verificar_paridad('m', 'int8', ['ab', 'abcd'], min_coseno=0.99)
+    assert ok and minimo > 0.99
+    minimo, ok = modelos.verificar_paridad('m', 'onnx', ['ab', 'abcd'], min_coseno=0.99)
+    assert not ok and minimo < 0.99
+
+
+def test_codificador_sigue_con_el_backend_si_pasa(modelos_cargados):
+    torch, int8 = ModeloFalso(), ModeloFalso(ruido=0.01)
+    modelos_cargados.update({('m', 'torch'): torch, ('m', 'int8'): int8})
+
+    codificar = modelos.Codificador('m', backend='int8', procesos=1)
+    codificar(['ab', 'abc'])
+    codificar(['abcd'])
+
+    assert codificar.backend == 'int8'
+    assert codificar.clave == 'm@int8'
+    # La paridad se verifica una sola vez: torch solo se usó para la muestra
+    assert torch.llamadas == 1
+    assert int8.llamadas == 3
+
+
+def test_codificador_vuelve_a_torch_si_no_pasa(modelos_cargados):
+    torch, onnx = ModeloFalso(), ModeloFalso(ruido=50.0)
+    modelos_cargados.update({('m', 'torch'): torch, ('m', 'onnx'): onnx})
+
+    codificar = modelos.Codificador('m', backend='onnx', procesos=1)
+    embeddings = codificar(['ab', 'abc'])
+
+    assert codificar.backend == 'torch'
+    assert codificar.clave == 'm'
+    np.testing.assert_array_equal(embeddings, torch.encode(['ab', 'abc']))
+
+
+
+def test_preparar_fija_la_clave_antes_del_primer_encode(modelos_cargados):
+    torch, onnx = ModeloFalso(), ModeloFalso(ruido=50.0)
+    modelos_cargados.update({('m', 'torch'): torch, ('m', 'onnx'): onnx})
+
+    codificar = modelos.Codificador('m', backend='onnx', procesos=1).preparar(['ab', 'abc'])
+    # La clave con la que se abren el caché y el índice ya es la del backend que se va a usar
+    assert codificar.clave == 'm'
+    codificar(['abcd'])
+    assert onnx.llamadas == 1  # solo la muestra de paridad
+
+
+def test_preparar_con_torch_no_carga_nada(modelos_cargados):
+    assert modelos.Codificador('m', backend='torch').preparar(['ab']).clave == 'm'
+    assert modelos_cargados == {}
+
+
+def test_varios_procesos_no_cargan_el_modelo_en_este_proceso(modelos_cargados, monkeypatch):
+    # Lo que hereda cada proceso del pool con el fork: el modelo falso y un torch de mentira
+    monkeypatch.setattr(modelos, '_cargar', lambda nombre, backend: ModeloFalso(ruido=0.01 if backend == 'int8' else 0.0))
+    monkeypatch.setitem(sys.modules, 'torch', types.SimpleNamespace(set_num_threads=lambda n: None))
+    monkeypatch.setattr(modelos, 'MIN_TEXTOS_PARALELO', 4)
+
+    codificar = modelos.Codificador('m', backend='int8', procesos=2)
+    try:
+        textos = ['a' * n for n in range(1, 10)]
+        np.testing.assert_allclose(codificar(textos), ModeloFalso(ruido=0.01).encode(textos))
+        np.testing.assert_allclose(codificar(['ab']), ModeloFalso(ruido=0.01).encode(['ab']))
+    finally:
+        modelos.cerrar_pools('m', 'int8')
+
+    # La paridad y los dos encodes corrieron en el pool
+    assert codificar.backend == 'int8'
+    assert modelos_cargados == {}
+
+
+def test_hilos_por_proceso():
+    assert modelos.hilos_por_proceso(2, hilos=3) == 3
+    assert modelos.hilos_por_proceso(os.cpu_count() * 2, hilos=0) == 1
+    assert modelos.hilos_por_proceso(1, hilos=0) == os.cpu_count()
@@ -0,0 +1,101 @@
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.normalizacion import limpiar_cache, limpiar_nome_marca, normalizar_nomes
+
+
+def _limpiar_shopee(nome):
+    """limpiar_nome_marca de input_tabla_scraper.py, tal como era antes del normalizador compartido."""
+    if pd.isna(nome):
+        return nome
+    nome = nome.replace('!', '')
+    nome = nome.replace('(', '').replace(')', '')
+    nome = nome.replace('_', ' ')
+    nome = nome.replace("'", '')
+    nome = nome.replace('|', '')
+    nome = nome.replace(',', '')
+    nome = nome.replace('/', '')
+    nome = nome.replace('=', '')
+    nome = nome.replace('>', '')
+    nome = nome.replace('<', '')
+    nome = re.sub(r'\s*&\s*', ' E ', nome)
+    nome = unicodedata.normalize('NFKD', nome).encode('ASCII', 'ignore').decode('utf-8')
+    nome = re.sub(r'\s+', ' ', nome)
+    return nome.strip().upper()
+
+
+def _limpiar_meli(nome):
+    """limpiar_nombre_marca de input_e_match.py, tal como era antes del normalizador compartido."""
+    if pd.isna(nome):
+        return nome
+    nome = nome.replace('!', '')
+    nome = nome.replace('?', '')
+    nome = nome.replace('+', ' ')
+    nome = nome.replace('@', '')
+    nome = nome.replace('#', ' ')
+    nome = nome.replace('(', '').replace(')', '')
+    nome = nome.replace('_', ' ')
+    nome = nome.replace("'", '')
+    nome = nome.replace('|', '')
+    nome = nome.replace(',', '')
+    nome = nome.replace('/', '')
+    nome = nome.replace('=', '')
+    nome = re.sub(r'\s*&\s*', ' E ', nome)
+    nome = unicodedata.normalize('NFKD', nome).encode('ASCII', 'ignore').decode('utf-8')
+    nome = re.sub(r'\s+', ' ', nome)
+    return nome.strip().upper()
+
+
+ORIGINALES = {'shopee': _limpiar_shopee, 'meli': _limpiar_meli}
+
+CASOS = [
+    "Loja da Conceição", "  Café & Cia  ", "P&P", "A &B", "Straße", "ﬁne ﬂowers", "Æsop Œuvre",
+    "tab\tseparado\t", "linea\nnueva", "Ação!? (oficial)", "a_b|c,d/e=f", "<Marca> +Plus #1 @home",
+    "ＦＵＬＬ　ＷＩＤＴＨ", "x²", "naïve résumé", "", "   ", "&", "O'Reilly", None, np.nan,
+]
+
+
+@pytest.fixture(autouse=True)
+def cache_limpio():
+    limpiar_cache()
+    yield
+    limpiar_cache()
+
+
+def _aleatorios(n, semilla):
+    rng = np.random.default_rng(semilla)
+    alfabeto = list("abcXYZ áéíõçÇßæﬁ&!?+@#()_'|,/=<>.\t-") + ["  ", " & "]
+    return ["".join(rng.choice(alfabeto, rng.integers(0, 15))) for _ in range(n)]
+
+
+@pytest.mark.parametrize("variante", ["shopee", "meli"])
+def test_normalizar_nomes_igual_al_original(variante):
+    original = ORIGINALES[variante]
+    serie = pd.Series(CASOS + _aleatorios(3000, semilla=len(variante)), dtype=object)
+
+    resultado = normalizar_nomes(serie, variante=variante)
+    esperado = serie.map(original, na_action='ignore')
+    assert resultado.isna().tolist() == esperado.isna().tolist()
+    assert resultado[esperado.notna()].tolist() == esperado[esperado.notna()].tolist()
+
+
+@pytest.mark.parametrize("variante", ["shopee", "meli"])
+def test_limpiar_nome_marca_igual_al_original(variante):
+    original = ORIGINALES[variante]
+    for nome in CASOS:
+        if pd.isna(nome):
+            assert pd.isna(limpiar_nome_marca(nome, variante))
+        else:
+            assert limpiar_nome_marca(nome, variante) == original(nome), nome
+
+
+def test_normalizar_nomes_mantiene_indice_y_nulos():
+    serie = pd.Series(["café", None, "café"], index=[10, 20, 30], name="BRAND")
+    resultado = normalizar_nomes(serie)
+    assert resultado.index.tolist() == [10, 20, 30]
+    assert resultado.name == "BRAND"
+    assert resultado.tolist() == ["CAFE", None, "CAFE"]
@@ -0,0 +1,99 @@
+import pandas as pd
+import pytest
+
+from common.consultas import TABLA_BRANDS, BackendLocal
+from common.primera_aparicion import IndicePrimeraAparicion, preparar_indice, sincronizar_tabla_lateral
+
+
+@pytest.fixture
+def indice(tmp_path):
+    indice = IndicePrimeraAparicion(str(tmp_path / "registro.sqlite"))
+    yield indice
+    indice.cerrar()
+
+
+def _scraping(*filas):
+    return pd.DataFrame(filas, columns=['UNIC_ID', 'DATE_SCRAPING']).assign(
+        DATE_SCRAPING=lambda df: pd.to_datetime(df['DATE_SCRAPING'])
+    )
+
+
+def test_sin_historico_no_se_siembra_ni_se_estampa(indice):
+    # Backend sin la tabla lateral ni el histórico: la semilla falla
+    with pytest.raises(Exception):
+        preparar_indice(BackendLocal(), indice)
+
+    assert not indice.sembrado()
+    with pytest.raises(RuntimeError, match="no está sembrado"):
+        indice.estampar(_scraping(('A', '2024-06-01')))
+    assert indice.vacio()
+
+
+def test_semilla_desde_el_historico(indice):
+    backend = BackendLocal()
+    backend.cargar_tabla(TABLA_BRANDS, pd.DataFrame({
+        'UNIC_ID': ['A', 'A', 'B'],
+        'FIRST_APPEARENCE': [None, None, None],
+        'DATE_SCRAPING': pd.to_datetime(['2024-01-01', '2024-02-01', '2024-03-01']),
+    }))
+
+    preparar_indice(backend, indice)
+    assert indice.sembrado()
+
+    first, cambios = indice.estampar(_scraping(('A', '2024-06-01'), ('C', '2024-06-01')))
+    assert first.tolist() == [pd.Timestamp('2024-01-01'), pd.Timestamp('2024-06-01')]
+    assert cambios['UNIC_ID'].tolist() == ['C']
+
+
+def test_indice_con_filas_pero_sin_semilla_se_vuelve_a_sembrar(indice):
+    # Lo que dejaba una corrida en la que falló la semilla: fechas de ese scraping, sin marca de sembrado
+    indice.registrar(pd.DataFrame({'UNIC_ID': ['A'], 'FIRST_APPEARENCE': ['2024-06-01']}))
+    backend = BackendLocal()
+    backend.cargar_tabla(TABLA_BRANDS, pd.DataFrame({
+        'UNIC_ID': ['A'], 'FIRST_APPEARENCE': [None], 'DATE_SCRAPING': pd.to_datetime(['2024-01-01']),
+    }))
+
+    preparar_indice(backend, indice)
+    assert indice.buscar(['A'])['A'] == pd.Timestamp('2024-01-01', tz='UTC')
+
+
+def _sembrado(indice):
+    backend = BackendLocal()
+    backend.cargar_tabla(TABLA_BRANDS, pd.DataFrame({
+        'UNIC_ID': ['A'], 'FIRST_APPEARENCE': [None], 'DATE_SCRAPING': pd.to_datetime(['2024-01-01']),
+    }))
+    preparar_indice(backend, indice)
+    return backend
+
+
+def test_estampar_no_guarda_hasta_registrar(indice):
+    _sembrado(indice)
+    _, cambios = indice.estampar(_scraping(('C', '2024-06-01')))
+
+    # Si la carga falla antes de registrar, la próxima corrida vuelve a ver a C como nuevo
+    assert indice.buscar(['C']).empty
+    assert indice.estampar(_scraping(('C', '2024-06-01')))[1]['UNIC_ID'].tolist() == ['C']
+
+    indice.registrar(cambios)
+    assert indice.pendientes()['UNIC_ID'].tolist() == ['C']
+    assert indice.estampar(_scraping(('C', '2024-06-01')))[1].empty
+
+
+def test_sincronizacion_fallida_queda_pendiente(indice):
+    backend = _sembrado(indice)
+    indice.registrar(indice.estampar(_scraping(('C', '2024-06-01')))[1])
+
+    def caido(sql):
+        raise RuntimeError("BigQuery caído")
+
+    ejecutar, backend.ejecutar = backend.ejecutar, caido
+    with pytest.raises(RuntimeError):
+        sincronizar_tabla_lateral(backend, indice)
+    assert indice.pendientes()['UNIC_ID'].tolist() == ['C']
+
+    # La corrida siguiente no trae cambios nuevos, pero manda igual lo que quedó pendiente
+    backend.ejecutar = ejecutar
+    assert sincronizar_tabla_lateral(backend, indice) == {'insertados': 1, 'actualizados': 0}
+    assert indice.pendientes().empty
+    lateral = backend.consultar("SELECT * FROM DM_SHOPEE_OFFICIAL_BRANDS_FIRST_APPEARENCE ORDER BY UNIC_ID")
+    assert lateral['UNIC_ID'].tolist() == ['A', 'C']
@@ -0,0 +1,91 @@
+import pandas as pd
+import pytest
+
+import common.unic_id as unic_id
+from common.registro_unic_ids import RegistroUnicIds
+from common.unic_id import atribuir_unic_ids, gerar_unic_ids, numero_deterministico, numeros_a_ids
+
+
+def _id(brand, intento=0):
+    return numeros_a_ids([numero_deterministico(brand, intento)])[0]
+
+
+def _historico(*filas):
+    return pd.DataFrame(filas, columns=['BRAND_NAME_SHOPEE', 'SHOPID', 'UNIC_ID', 'DATE_SCRAPING'])
+
+
+@pytest.fixture
+def registro(tmp_path):
+    registro = RegistroUnicIds(str(tmp_path / "registro.sqlite3"))
+    yield registro
+    registro.cerrar()
+
+
+def test_ids_deterministicos(tmp_path):
+    ids = []
+    for nombre in ("a", "b"):
+        registro = RegistroUnicIds(str(tmp_path / f"{nombre}.sqlite3"))
+        ids.append(atribuir_unic_ids(pd.DataFrame({'BRAND_NAME_SHOPEE': ['ACME', 'BETA'], 'SHOPID': [1, 2]}), registro)[0])
+        registro.cerrar()
+
+    assert ids[0].tolist() == ids[1].tolist() == [_id('ACME'), _id('BETA')]
+    assert all(len(i) == 5 and i.isalnum() and i == i.upper() for i in ids[0])
+    # Con otra clave, otros IDs
+    assert gerar_unic_ids(['ACME'], lambda candidatos: set(), clave=b'otra') != [_id('ACME')]
+
+
+def test_probing_si_el_id_esta_ocupado(registro):
+    registro.registrar(['OTRA'], [_id('ACME')], [1])
+    assert gerar_unic_ids(['ACME'], registro.ocupados) == [_id('ACME', 1)]
+
+
+def test_probing_entre_marcas_de_la_misma_ronda(monkeypatch):
+    # Todas las marcas caen en el mismo ID en cada intento: se van repartiendo uno por ronda
+    monkeypatch.setattr(unic_id, 'numero_deterministico', lambda brand, intento=0, clave=None: intento)
+    assert gerar_unic_ids(['A', 'B', 'C'], lambda candidatos: set()) == numeros_a_ids([0, 1, 2]).tolist()
+
+
+def test_corta_despues_de_max_intentos(monkeypatch):
+    monkeypatch.setattr(unic_id, 'MAX_INTENTOS', 3)
+    llamadas = []
+
+    def todo_ocupado(candidatos):
+        llamadas.append(candidatos)
+        return set(candidatos)
+
+    with pytest.raises(ValueError, match="3 intentos"):
+        gerar_unic_ids(['ACME'], todo_ocupado)
+    assert len(llamadas) == 3
+
+
+def test_sembrar_gana_el_id_mas_reciente_y_todos_quedan_ocupados(registro):
+    df_historico = _historico(
+        ('ACME', 1, 'NUEVO', '2025-08-01'),
+        ('ACME', 1, 'VIEJO', '2025-07-01'),
+        ('BETA', 2, 'BBBBB', '2025-07-15'),
+    )
+    # Igual que el script: ordenado por DATE_SCRAPING para que gane el último
+    registro.sembrar(df_historico.sort_values('DATE_SCRAPING', kind='stable'))
+
+    assert registro.buscar(['ACME', 'BETA']).to_dict() == {'ACME': 'NUEVO', 'BETA': 'BBBBB'}
+    assert registro.ocupados({'NUEVO', 'VIEJO', 'BBBBB', 'LIBRE'}) == {'NUEVO', 'VIEJO', 'BBBBB'}
+
+    unic_ids, novas = atribuir_unic_ids(pd.DataFrame({'BRAND_NAME_SHOPEE': ['ACME'], 'SHOPID': [1]}), registro)
+    assert unic_ids.tolist() == ['NUEVO']
+    assert novas.empty
+
+
+def test_registro_viejo_sin_historico_se_vuelve_a_sembrar(registro):
+    assert registro.necesita_semilla()
+
+    # Registro de antes de que se guardaran los IDs del histórico: tiene marcas pero no el histórico
+    registro.registrar(['ACME', 'NUEVA'], ['NUEVO', 'NNNNN'], [1, 5])
+    assert not registro.vacio()
+    assert registro.necesita_semilla()
+    assert registro.ocupados({'VIEJO'}) == set()
+
+    registro.sembrar(_historico(('ACME', 1, 'VIEJO', '2025-07-01'), ('ACME', 1, 'NUEVO', '2025-08-01')))
+    assert not registro.necesita_semilla()
+    assert registro.ocupados({'VIEJO', 'NUEVO', 'NNNNN'}) == {'VIEJO', 'NUEVO', 'NNNNN'}
+    # Las marcas registradas después del histórico siguen ahí
+    assert registro.buscar(['ACME', 'NUEVA']).to_dict() == {'ACME': 'NUEVO', 'NUEVA': 'NNNNN'}
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from common.tiendas_meli import deduplicar_tiendas
+
+
+def _dos_sorts(df_meli):
+    """La versión anterior: sort por fecha, drop_duplicates y otro sort por nombre."""
+    df = df_meli[df_meli['OFS_FANTASY_NAME'].notna()]
+    df = df.sort_values('AUD_UPD_DTTM', ascending=False, kind='stable')
+    df = df.drop_duplicates(subset=['OFS_FANTASY_NAME', 'OFS_STATUS'], keep='first')
+    return df.sort_values('OFS_FANTASY_NAME', kind='stable').reset_index(drop=True)
+
+
+def test_deduplicar_igual_a_la_version_con_dos_sorts():
+    rng = np.random.default_rng(7)
+    n = 2000
+    fechas = pd.to_datetime('2024-01-01') + pd.to_timedelta(rng.integers(0, 30, n), unit='D')
+    df_meli = pd.DataFrame({
+        'OFS_OFFICIAL_STORE_ID': np.arange(n),
+        'OFS_FANTASY_NAME': rng.choice(['ACME', 'BETA', 'GAMA', 'DELTA', None], n),
+        'OFS_STATUS': rng.choice(['active', 'inactive'], n),
+        # Fechas repetidas (empates) y alguna vacía
+        'AUD_UPD_DTTM': pd.Series(fechas).where(rng.random(n) > 0.05),
+    })
+    pd.testing.assert_frame_equal(deduplicar_tiendas(df_meli), _dos_sorts(df_meli))
+
+
+def test_deduplicar_se_queda_con_la_mas_reciente():
+    df_meli = pd.DataFrame({
+        'OFS_FANTASY_NAME': ['B', 'A', 'A', 'A', None],
+        'OFS_STATUS': ['active', 'active', 'active', 'inactive', 'active'],
+        'AUD_UPD_DTTM': pd.to_datetime(['2024-01-01', '2024-01-01', '2024-03-01', '2024-02-01', '2024-05-01']),
+        'ID': [1, 2, 3, 4, 5],
+    })
+    assert deduplicar_tiendas(df_meli)['ID'].tolist() == [3, 4, 1]
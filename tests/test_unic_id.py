@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from common.registro_unic_ids import RegistroUnicIds
+from common.unic_id import atribuir_unic_ids
+
+
+def _shopee(*filas):
+    return pd.DataFrame(filas, columns=['BRAND_NAME_SHOPEE', 'SHOPID'])
+
+
+def _loop_anterior(df_shopee, df_dme):
+    """
+    El loop fila por fila de input_tabla_scraper.py que reemplazó atribuir_unic_ids. Los IDs nuevos eran
+    aleatorios, así que acá se numeran en orden de aparición: lo que se compara es qué filas comparten ID y qué
+    marcas reutilizan el del histórico.
+    """
+    brand_to_id = dict(zip(df_dme['BRAND_NAME_SHOPEE'], df_dme['UNIC_ID']))
+    novas_linhas_dme, unic_ids_shopee = [], []
+    for _, row in df_shopee.iterrows():
+        brand = row['BRAND_NAME_SHOPEE']
+        if brand in brand_to_id:
+            unic_id = brand_to_id[brand]
+        else:
+            unic_id = f"NOVO{len(novas_linhas_dme)}"
+            brand_to_id[brand] = unic_id
+            novas_linhas_dme.append({'BRAND_NAME_SHOPEE': brand, 'SHOPID': row['SHOPID'], 'UNIC_ID': unic_id})
+        unic_ids_shopee.append(unic_id)
+    return pd.Series(unic_ids_shopee, index=df_shopee.index), pd.DataFrame(novas_linhas_dme)
+
+
+def _grupos(unic_ids):
+    """Partición de las filas por ID (qué filas comparten UNIC_ID), sin importar el valor del ID."""
+    return sorted(sorted(g) for g in pd.Series(range(len(unic_ids))).groupby(np.asarray(unic_ids)).groups.values())
+
+
+def test_igual_al_loop_anterior(tmp_path):
+    df_dme = pd.DataFrame({
+        'BRAND_NAME_SHOPEE': ['ACME', 'BETA', 'GAMA'],
+        'SHOPID': [1, 2, 3],
+        'UNIC_ID': ['AAAAA', 'BBBBB', 'CCCCC'],
+    })
+    rng = np.random.default_rng(0)
+    marcas = ['ACME', 'BETA', 'GAMA', 'DELTA', 'EPSILON', 'ZETA', None]
+    df_shopee = _shopee(*[(marcas[i], 100 + n) for n, i in enumerate(rng.integers(0, len(marcas), 300))])
+
+    registro = RegistroUnicIds(str(tmp_path / "registro.sqlite3"))
+    registro.sembrar(df_dme)
+    unic_ids, novas = atribuir_unic_ids(df_shopee, registro)
+    esperado, novas_esperado = _loop_anterior(df_shopee, df_dme)
+
+    assert _grupos(unic_ids) == _grupos(esperado)
+    conocidas = df_shopee['BRAND_NAME_SHOPEE'].isin(df_dme['BRAND_NAME_SHOPEE'])
+    assert unic_ids[conocidas].tolist() == esperado[conocidas].tolist()
+    # Nuevas marcas: mismas filas (orden de aparición y SHOPID de la primera fila) con el ID asignado
+    assert novas[['BRAND_NAME_SHOPEE', 'SHOPID']].equals(novas_esperado[['BRAND_NAME_SHOPEE', 'SHOPID']])
+    assert novas['UNIC_ID'].tolist() == unic_ids[~conocidas].drop_duplicates().tolist()
+
+
+def test_marcas_nuevas_quedan_registradas(tmp_path):
+    ruta = str(tmp_path / "registro.sqlite3")
+    registro = RegistroUnicIds(ruta)
+    df_shopee = _shopee(('ACME', 1), ('BETA', 2), ('ACME', 3))
+    unic_ids, novas = atribuir_unic_ids(df_shopee, registro)
+    registro.cerrar()
+
+    assert unic_ids[0] == unic_ids[2] != unic_ids[1]
+    assert novas['SHOPID'].tolist() == [1, 2]
+
+    # La corrida siguiente reutiliza los IDs y no hay marcas nuevas
+    registro = RegistroUnicIds(ruta)
+    otra_vez, novas = atribuir_unic_ids(_shopee(('BETA', 9), ('ACME', 8)), registro)
+    assert otra_vez.tolist() == [unic_ids[1], unic_ids[0]]
+    assert novas.empty
+
+
+def test_marcas_sin_nombre_comparten_id(tmp_path):
+    registro = RegistroUnicIds(str(tmp_path / "registro.sqlite3"))
+    unic_ids, novas = atribuir_unic_ids(_shopee((None, 1), ('ACME', 2), (np.nan, 3)), registro)
+    assert unic_ids[0] == unic_ids[2] != unic_ids[1]
+    assert len(novas) == 2
@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+
+from common.consultas import BackendLocal
+from common.upsert import upsert
+
+TABLA = 'proyecto.dataset.BRANDS'
+CLAVES = ('UNIC_ID', 'DATE_SCRAPING')
+
+
+def _filas(*filas):
+    df = pd.DataFrame(filas, columns=['UNIC_ID', 'DATE_SCRAPING', 'BRAND_NAME_SHOPEE', 'SHOPID'])
+    return df.assign(DATE_SCRAPING=pd.to_datetime(df['DATE_SCRAPING']))
+
+
+@pytest.fixture
+def backend():
+    backend = BackendLocal()
+    backend.cargar_tabla(TABLA, _filas(('a', '2024-05-01', 'MARCA A', 1)))
+    return backend
+
+
+def _tabla(backend):
+    return backend.consultar("SELECT * FROM BRANDS ORDER BY UNIC_ID, DATE_SCRAPING")
+
+
+def test_upsert_inserta_y_actualiza(backend):
+    df = _filas(
+        ('a', '2024-05-01', 'MARCA A NUEVA', 1),  # cambia
+        ('b', '2024-05-01', 'MARCA B', 2),        # nueva
+    )
+    assert upsert(backend, df, TABLA, claves=CLAVES) == {'insertados': 1, 'actualizados': 1}
+
+    tabla = _tabla(backend)
+    assert tabla['UNIC_ID'].tolist() == ['a', 'b']
+    assert tabla['BRAND_NAME_SHOPEE'].tolist() == ['MARCA A NUEVA', 'MARCA B']
+    # La tabla de staging no queda
+    assert backend.consultar("SELECT name FROM sqlite_master WHERE name = 'BRANDS_STAGING'").empty
+
+
+def test_upsert_repetido_no_cuenta_nada(backend):
+    df = _filas(('a', '2024-05-01', 'MARCA A', 1), ('b', '2024-05-01', 'MARCA B', None))
+    upsert(backend, df, TABLA, claves=CLAVES)
+    # Las filas iguales (también con NULL en el mismo lugar) no cuentan como cambio
+    assert upsert(backend, df, TABLA, claves=CLAVES) == {'insertados': 0, 'actualizados': 0}
+    assert len(_tabla(backend)) == 2
+
+
+def test_upsert_solo_columnas_enviadas(backend):
+    df = pd.DataFrame({
+        'UNIC_ID': ['a', 'c'], 'DATE_SCRAPING': pd.to_datetime(['2024-05-01', '2024-05-01']), 'SHOPID': [9, 3],
+    })
+    assert upsert(backend, df, TABLA, claves=CLAVES, insertar=False) == {'insertados': 0, 'actualizados': 1}
+
+    tabla = _tabla(backend)
+    assert tabla['UNIC_ID'].tolist() == ['a']
+    assert tabla['SHOPID'].tolist() == [9]
+    assert tabla['BRAND_NAME_SHOPEE'].tolist() == ['MARCA A']
+
+
+def test_upsert_castea_staging_a_los_tipos_de_la_tabla(backend):
+    subidos = []
+    escribir = backend.escribir
+    backend.escribir = lambda df, tabla, **kw: (subidos.append(df), escribir(df, tabla, **kw))
+
+    df = _filas(('a', '2024-05-01', 'MARCA A', 1.0))
+    df['DATE_SCRAPING'] = df['DATE_SCRAPING'].dt.tz_localize('UTC')
+    # Misma fila que la de la tabla: con los tipos de la tabla, la clave coincide y no hay nada nuevo
+    assert upsert(backend, df, TABLA, claves=CLAVES) == {'insertados': 0, 'actualizados': 0}
+
+    assert str(subidos[0]['DATE_SCRAPING'].dtype) == 'datetime64[ns]'
+    assert subidos[0]['SHOPID'].dtype == 'Int64'
+
+
+def test_upsert_vacio(backend):
+    assert upsert(backend, _filas(), TABLA, claves=CLAVES) == {'insertados': 0, 'actualizados': 0}
+
+
+def test_upsert_clave_repetida(backend):
+    df = _filas(('a', '2024-05-01', 'X', 1), ('a', '2024-05-01', 'Y', 1))
+    with pytest.raises(ValueError, match="repetida"):
+        upsert(backend, df, TABLA, claves=CLAVES)